@@ -1,24 +1,25 @@
-from fastapi import FastAPI
+import os
+import threading
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv, find_dotenv
 
-# Internal imports
+# Internal imports (routers are imported per profile further down)
 from app.store import db
-from app.routers import (
-    triage,
-    webhook,
-    ai as ai_router,
-    logs as logs_router,
-    labeler as labeler_router,
-    triage_dyn,
-    chat,
-)
+from app import metrics
+from app.services import jobs
 
 # ------------------------------------------------------------------
 # 🌟 Environment + App setup
 # ------------------------------------------------------------------
 load_dotenv(find_dotenv())
 
+# full   -> every router (default)
+# ingest -> only /webhook and /logs; no triage/LLM modules are imported
+APP_PROFILE = os.getenv("APP_PROFILE", "full").strip().lower()
+
 app = FastAPI(title="AI Triage POC", version="0.1.0")
 
 # ------------------------------------------------------------------
@@ -33,12 +34,66 @@ app.add_middleware(
     max_age=86400,
 )
 
+# ------------------------------------------------------------------
+# 📈 Request latency metrics
+# ------------------------------------------------------------------
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # label by route template (/triage-dyn/{session_id}/answer), not raw path
+        route = request.scope.get("route")
+        metrics.HTTP_REQUESTS.observe(
+            time.perf_counter() - t0,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status),
+        )
+
 # ------------------------------------------------------------------
 # 🗄️ DB Initialization
 # ------------------------------------------------------------------
 @app.on_event("startup")
 def on_startup():
     db.init()
+    # Optionally import the LLM SDK + build the model off the request path
+    if APP_PROFILE != "ingest" and os.getenv("LLM_WARM_ON_STARTUP", "0").lower() in ("1", "true", "yes"):
+        from app.services import llm_client
+        threading.Thread(target=llm_client.warm, name="llm-warmup", daemon=True).start()
+    # Load the similar-incidents index off the request path (the first lookup would otherwise pay for it)
+    if APP_PROFILE != "ingest":
+        from app.services import similar_incidents
+        threading.Thread(target=similar_incidents.warm, name="similar-warmup", daemon=True).start()
+        # LLM labels for rows the inline rules could not place
+        from app.services import labeler
+        labeler.start_async()
+    jobs.start()
+
+def register_jobs():
+    """Background job types of this profile (see app/services/jobs.py) and their schedules."""
+    # Hot -> cold tiering + retention of old logs (LOG_ARCHIVE_AFTER_DAYS / *_RETENTION_DAYS)
+    from app.store import archive
+    if archive.ARCHIVE_AFTER_DAYS > 0 or archive.ARCHIVE_RETENTION_DAYS > 0 or archive.HOT_RETENTION_DAYS > 0:
+        jobs.register("archive", archive.run_once, concurrency=1, priority=-10)
+        jobs.schedule("archive", archive.ARCHIVE_INTERVAL_SEC)
+    if APP_PROFILE == "ingest":
+        return
+    from app.services import analysis, labeler
+    from app.store import columnar
+    # Columnar snapshots behind /analytics (ANALYTICS_REFRESH_SEC)
+    jobs.register("analytics_refresh", columnar.store.refresh, concurrency=1, priority=-5)
+    jobs.schedule("analytics_refresh", columnar.REFRESH_SEC)
+    # On-demand LLM work that used to run inside the request
+    jobs.register("label_recent", labeler.label_recent_job, concurrency=1, priority=0)
+    jobs.register("summarize_window", analysis.summarize_window_job, concurrency=2, priority=10)
+
+# registered at import so /jobs knows every type before the dispatcher starts
+register_jobs()
 
 # ------------------------------------------------------------------
 # 🧠 Health & Root
@@ -47,6 +102,10 @@ def on_startup():
 def health():
     return {"ok": True}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def root():
     return {"message": "AI Triage API. See /docs"}
@@ -54,13 +113,35 @@ def root():
 # ------------------------------------------------------------------
 # 🧩 Routers
 # ------------------------------------------------------------------
-# Classic components
+# Ingest + log query components (every profile)
+from app.routers import webhook, logs as logs_router, jobs as jobs_router
 app.include_router(webhook.router)
-app.include_router(triage.router)
-app.include_router(ai_router.router)
 app.include_router(logs_router.router)
-app.include_router(labeler_router.router)
+app.include_router(jobs_router.router)
+
+if APP_PROFILE != "ingest":
+    from app.routers import (
+        triage,
+        ai as ai_router,
+        labeler as labeler_router,
+        triage_dyn,
+        chat,
+        analytics as analytics_router,
+    )
+    # Classic components
+    app.include_router(triage.router)
+    app.include_router(ai_router.router)
+    app.include_router(labeler_router.router)
+
+    # New dynamic triage + Gemini chat modules
+    app.include_router(triage_dyn.router)
+    app.include_router(chat.router)
+
+    # Aggregates over columnar snapshots
+    app.include_router(analytics_router.router)
 
-# New dynamic triage + Gemini chat modules
-app.include_router(triage_dyn.router)
-app.include_router(chat.router)
+# Admin profiling surface: not mounted at all unless enabled
+from app.services import profiler
+if profiler.PROFILING_ENABLED:
+    from app.routers import admin
+    app.include_router(admin.router)
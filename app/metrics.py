@@ -0,0 +1,269 @@
+# app/metrics.py
+"""
+Dependency-free metrics registry rendered in Prometheus text format (/metrics).
+
+  REQUESTS = histogram("triage_http_request_seconds", "...", ["method", "route", "status"])
+  REQUESTS.observe(0.012, method="GET", route="/logs/window", status="200")
+
+Also hosts the timing helpers used around DB helpers (timed_db) and LLM calls
+(InstrumentedBackend), including the slow-query / slow-LLM log:
+  SLOW_DB_MS   (default 200)   log DB helpers slower than this
+  SLOW_LLM_MS  (default 5000)  log LLM calls slower than this
+"""
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+logger = logging.getLogger("app.slow")
+
+SLOW_DB_MS = float(os.getenv("SLOW_DB_MS", "200"))
+SLOW_LLM_MS = float(os.getenv("SLOW_LLM_MS", "5000"))
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, kw: Dict[str, str]) -> LabelKey:
+        return tuple(str(kw.get(l, "")) for l in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        out = super().render()
+        with self._lock:
+            items = list(self._values.items())
+        for key, v in items:
+            out.append(f"{self.name}{_fmt_labels(self.labels, key)} {v:g}")
+        return out
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, List[float]] = {}  # bucket counts..., +Inf count, sum
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    s[i] += 1
+                    break
+            else:
+                s[len(self.buckets)] += 1
+            s[-1] += value
+
+    def render(self) -> List[str]:
+        out = super().render()
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for key, s in items:
+            cum = 0.0
+            for i, b in enumerate(self.buckets):
+                cum += s[i]
+                le = 'le="%g"' % b
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {cum:g}")
+            cum += s[len(self.buckets)]
+            le = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {cum:g}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {s[-1]:.6f}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {cum:g}")
+        return out
+
+
+_registry: Dict[str, _Metric] = {}
+_registry_lock = threading.Lock()
+_collectors: List[Callable[[], None]] = []
+
+
+def _register(metric: _Metric) -> _Metric:
+    with _registry_lock:
+        existing = _registry.get(metric.name)
+        if existing is not None:
+            return existing
+        _registry[metric.name] = metric
+        return metric
+
+
+def counter(name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+    return _register(Counter(name, help_text, labels))  # type: ignore[return-value]
+
+
+def gauge(name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+    return _register(Gauge(name, help_text, labels))  # type: ignore[return-value]
+
+
+def histogram(name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help_text, labels, buckets))  # type: ignore[return-value]
+
+
+def add_collector(fn: Callable[[], None]) -> None:
+    """Callback run before each render (to refresh gauges from live state)."""
+    _collectors.append(fn)
+
+
+def render() -> str:
+    for fn in list(_collectors):
+        try:
+            fn()
+        except Exception:
+            logger.exception("metrics collector failed")
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines: List[str] = []
+    for m in metrics:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------------ shared metrics --------------------------------
+
+HTTP_REQUESTS = histogram(
+    "triage_http_request_seconds", "HTTP request latency by route template", ["method", "route", "status"]
+)
+DB_CALLS = histogram("triage_db_seconds", "Latency of app.store.db helpers", ["op", "outcome"])
+LLM_CALLS = histogram(
+    "triage_llm_seconds", "Latency of LLM calls", ["backend", "model", "outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0),
+)
+LLM_TOKENS = counter("triage_llm_tokens_total", "LLM tokens by direction", ["backend", "model", "direction"])
+CACHE = counter("triage_cache_total", "Cache lookups by cache and result", ["cache", "result"])
+INGEST_ROWS = counter("triage_ingest_rows_total", "Rows accepted by the ingest path")
+INGEST_BATCHES = histogram("triage_ingest_batch_seconds", "End-to-end ingest batch latency")
+INGEST_DUPLICATES = counter("triage_ingest_duplicates_total", "Rejected duplicates (kind=row: repeated row, batch: replayed Idempotency-Key)", ["kind"])
+LABELER_ROWS = counter("triage_labeler_rows_total", "Rows labeled, by how the label was decided", ["via"])
+LABELER_INLINE = histogram(
+    "triage_labeler_inline_seconds", "Inline labeling time per ingest batch",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+LABELER_QUEUE = gauge("triage_labeler_queue_rows", "Rows waiting for async LLM labeling")
+
+
+# set while a timed DB helper runs: helpers called from inside another one are not
+# recorded again, so each call shows up once in triage_db_seconds
+_db_span: contextvars.ContextVar[bool] = contextvars.ContextVar("db_span", default=False)
+
+
+def timed_db(fn: Callable) -> Callable:
+    """Decorator for DB helpers: latency histogram + slow-query log (outermost helper only)."""
+    op = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _db_span.get():
+            return fn(*args, **kwargs)
+        token = _db_span.set(True)
+        t0 = time.perf_counter()
+        outcome = "ok"
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            _db_span.reset(token)
+            dt = time.perf_counter() - t0
+            DB_CALLS.observe(dt, op=op, outcome=outcome)
+            if dt * 1000.0 >= SLOW_DB_MS:
+                logger.warning("slow db op=%s ms=%.1f outcome=%s", op, dt * 1000.0, outcome)
+
+    return wrapper
+
+
+class InstrumentedBackend:
+    """Wraps an LLM backend: latency, token counts, outcome and slow-call log."""
+
+    def __init__(self, backend):
+        self._backend = backend
+        self.name = getattr(backend, "name", "gemini")
+        self.model_id = getattr(backend, "model_id", "")
+
+    def __getattr__(self, item):
+        return getattr(self._backend, item)
+
+    def generate_content(self, prompt: str):
+        t0 = time.perf_counter()
+        outcome = "ok"
+        resp = None
+        try:
+            resp = self._backend.generate_content(prompt)
+            return resp
+        except Exception as e:
+            outcome = "rate_limited" if "429" in str(e) or "exhausted" in str(e).lower() else "error"
+            raise
+        finally:
+            dt = time.perf_counter() - t0
+            LLM_CALLS.observe(dt, backend=self.name, model=self.model_id, outcome=outcome)
+            usage = getattr(resp, "usage_metadata", None)
+            p_tok = getattr(usage, "prompt_token_count", None) or (len(prompt) + 3) // 4
+            LLM_TOKENS.inc(p_tok, backend=self.name, model=self.model_id, direction="prompt")
+            if resp is not None:
+                o_tok = getattr(usage, "candidates_token_count", None)
+                if o_tok is None:
+                    o_tok = (len(getattr(resp, "text", "") or "") + 3) // 4
+                LLM_TOKENS.inc(o_tok, backend=self.name, model=self.model_id, direction="response")
+            if dt * 1000.0 >= SLOW_LLM_MS:
+                logger.warning(
+                    "slow llm backend=%s model=%s ms=%.1f outcome=%s prompt_tokens=%s",
+                    self.name, self.model_id, dt * 1000.0, outcome, p_tok,
+                )
+
+
+def track_cache(cache: str, hit: bool) -> None:
+    CACHE.inc(cache=cache, result="hit" if hit else "miss")
@@ -0,0 +1,61 @@
+# app/routers/admin.py
+# Mounted only when ADMIN_PROFILING_ENABLED=1 (see app/main.py).
+import hmac
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+from app.services import profiler
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not profiler.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="ADMIN_TOKEN is not configured")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, profiler.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="invalid admin token")
+
+router = APIRouter(prefix="/admin/profile", tags=["admin"], dependencies=[Depends(require_admin)])
+
+@router.get("/stacks", response_class=PlainTextResponse)
+def stacks(
+    seconds: float = Query(10.0, gt=0, le=300),
+    interval_ms: float = Query(5.0, ge=1, le=1000),
+    include_idle: bool = Query(False),
+):
+    """Collapsed-stack sample of all threads (feed to flamegraph.pl or speedscope)."""
+    try:
+        return profiler.sample_stacks(seconds, interval_ms, include_idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/allocations")
+def allocations(
+    seconds: float = Query(10.0, gt=0, le=300),
+    top: int = Query(25, ge=1, le=200),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+):
+    """Top allocators between two tracemalloc snapshots `seconds` apart."""
+    try:
+        return {"seconds": seconds, "top": profiler.allocation_diff(seconds, top, group_by)}
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.post("/route")
+def profile_route(
+    request: Request,
+    path: str = Query(..., description="Route template, e.g. /triage-dyn/{session_id}/answer"),
+    method: str = Query("GET"),
+    count: int = Query(1, ge=1, le=100),
+):
+    """cProfile the next `count` requests to one route."""
+    try:
+        return profiler.profile_route(request.app, path, method, count)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.delete("/route")
+def stop_profile_route():
+    profiler.stop_route_profile()
+    return {"stopped": True}
+
+@router.get("/route")
+def profile_route_results():
+    return profiler.route_profile_status()
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.services import analytics
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+_GROUP_PATTERN = "^(" + "|".join(analytics.GROUP_FIELDS) + ")$"
+
+
+def _window(start: Optional[str], end: Optional[str], hours: float) -> Tuple[Optional[str], Optional[str]]:
+    # explicit bounds win; otherwise the last `hours` up to now (UTC)
+    if start or end:
+        return start, end
+    return (datetime.utcnow() - timedelta(hours=hours)).isoformat(), None
+
+
+def _check_window(name: str, start: str, end: str) -> None:
+    lo, hi = analytics.to_ms(start), analytics.to_ms(end)
+    if analytics.NaT_MS in (lo, hi):
+        raise HTTPException(status_code=400, detail=f"{name} window: bad timestamp")
+    if hi <= lo:
+        raise HTTPException(status_code=400, detail=f"{name} window: end must be after start")
+
+
+@router.get("/error-rate")
+def error_rate(
+    by: str = Query("endpoint", pattern=_GROUP_PATTERN),
+    start: Optional[str] = Query(None, description="ISO timestamp start (inclusive)"),
+    end: Optional[str] = Query(None, description="ISO timestamp end (inclusive)"),
+    hours: float = Query(6, gt=0, le=24 * 90, description="Window ending now, if start/end are not given"),
+    limit: int = Query(20, ge=1, le=500),
+):
+    """Error rate per endpoint / source / account / template, e.g. /analytics/error-rate?by=endpoint&hours=6"""
+    return analytics.error_rate(*_window(start, end, hours), by=by, limit=limit)
+
+
+@router.get("/top-labels")
+def top_labels(
+    by: str = Query("source", pattern=_GROUP_PATTERN),
+    start: Optional[str] = Query(None),
+    end: Optional[str] = Query(None),
+    hours: float = Query(24, gt=0, le=24 * 90),
+    per_group: int = Query(5, ge=1, le=50),
+    limit: int = Query(20, ge=1, le=500),
+):
+    return analytics.top_labels(*_window(start, end, hours), by=by, per_group=per_group, limit=limit)
+
+
+@router.get("/bursts")
+def bursts(
+    start: Optional[str] = Query(None),
+    end: Optional[str] = Query(None),
+    hours: float = Query(6, gt=0, le=24 * 90),
+    bucket_sec: int = Query(60, ge=1, le=86400),
+    top: int = Query(10, ge=0, le=100),
+):
+    """Errors per bucket: p50/p95/p99/max burst size and the busiest buckets."""
+    return analytics.bursts(*_window(start, end, hours), bucket_sec=bucket_sec, top=top)
+
+
+@router.get("/diff")
+def diff(
+    incident_start: str = Query(..., description="ISO timestamp start of the incident window"),
+    incident_end: str = Query(..., description="ISO timestamp end of the incident window"),
+    baseline_start: Optional[str] = Query(None, description="Defaults to the same-length window before the incident"),
+    baseline_end: Optional[str] = Query(None),
+    errors_only: bool = Query(False, description="Compare error rows only"),
+    top: int = Query(10, ge=1, le=200),
+):
+    """
+    What changed: counts and per-minute rates by template / label / endpoint /
+    source in the incident vs the baseline window, largest rate change first.
+    """
+    _check_window("incident", incident_start, incident_end)
+    if not (baseline_start and baseline_end):
+        baseline_start, baseline_end = analytics.preceding_window(incident_start, incident_end)
+    else:
+        _check_window("baseline", baseline_start, baseline_end)
+    return analytics.window_diff(incident_start, incident_end, baseline_start, baseline_end,
+                                 top=top, errors_only=errors_only)
+
+
+@router.get("/status")
+def status():
+    return analytics.status()
@@ -29,7 +29,7 @@ async def chat(req: ChatRequest):
 
     except Exception as e:
         # Optional: auto fallback to REST API call if SDK fails
-        from app.services.llm_fallback import ask
+        from app.services.gemini import ask
         try:
             reply = ask(req.message)
             return {"reply": reply}
@@ -0,0 +1,66 @@
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+
+from app.services import jobs
+from app.store import db
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+_STATUS_PATTERN = "^(queued|running|done|failed|cancelled)$"
+
+
+class JobRequest(BaseModel):
+    type: str
+    params: Dict[str, Any] = Field(default_factory=dict)
+    priority: Optional[int] = None
+
+
+def job_response(job: Dict[str, Any]) -> JSONResponse:
+    """200 for a finished job, 202 while it is queued or running."""
+    return JSONResponse(job, status_code=200 if job["status"] in db.JOB_FINAL else 202)
+
+
+@router.post("")
+def submit(req: JobRequest, wait: float = Query(0, ge=0, le=60, description="Seconds to wait for the result")):
+    """Queue a job; an identical queued/running job is returned instead (`deduplicated`)."""
+    try:
+        job = jobs.submit(req.type, req.params, req.priority)
+    except jobs.UnknownJobType:
+        raise HTTPException(status_code=400, detail=f"unknown job type {req.type!r}; known: {sorted(jobs.scheduler.types)}")
+    if wait:
+        job = {**jobs.wait(job["id"], wait), "deduplicated": job["deduplicated"]}
+    return job_response(job)
+
+
+@router.get("")
+def list_jobs(
+    status: Optional[str] = Query(None, pattern=_STATUS_PATTERN),
+    job_type: Optional[str] = Query(None, alias="type"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Newest first."""
+    return {"jobs": jobs.list_jobs(status, job_type, limit)}
+
+
+@router.get("/stats")
+def stats():
+    return jobs.stats()
+
+
+@router.get("/{job_id}")
+def get_job(job_id: int, wait: float = Query(0, ge=0, le=60)):
+    job = jobs.wait(job_id, wait) if wait else jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="unknown job")
+    return job_response(job)
+
+
+@router.post("/{job_id}/cancel")
+def cancel(job_id: int):
+    job = jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="unknown job")
+    return job
@@ -1,11 +1,20 @@
 from fastapi import APIRouter, Query
-from app.services.labeler import label_recent_logs, label_stats
+from app.services import jobs
+from app.services.labeler import label_stats
+from app.routers.jobs import job_response
 
 router = APIRouter(prefix="/labeler", tags=["labeler"])
 
 @router.post("/analyze")
-def analyze(limit: int = Query(300, ge=1, le=2000)):
-    return {"labeled": label_recent_logs(limit)}
+def analyze(
+    limit: int = Query(300, ge=1, le=2000),
+    wait: float = Query(0, ge=0, le=60, description="Seconds to wait for the result"),
+):
+    """Queues a `label_recent` job; poll /jobs/{id} for result.labeled (202 until it finishes)."""
+    job = jobs.submit("label_recent", {"limit": limit})
+    if wait:
+        job = jobs.wait(job["id"], wait)
+    return job_response(job)
 
 @router.get("/stats")
 def stats():
@@ -1,8 +1,10 @@
 from fastapi import APIRouter
-from app.store import db
-from fastapi import APIRouter, Query
+from app.store import db, archive, sketches
+from fastapi import APIRouter, Query, Request, HTTPException
+from fastapi.responses import StreamingResponse
 from typing import Optional
-from app.services import analysis
+import json
+from app.services import jobs, log_stream
 
 router = APIRouter(prefix="/logs", tags=["logs"])
 
@@ -11,17 +13,141 @@ def by_correlation(corr_id: str):
     rows = db.search_correlation(corr_id)
     return {"count": len(rows), "logs": rows[:200]}  # cap for safety
 
+@router.get("/trace/{corr_id}")
+def trace(
+    corr_id: str,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    """Correlation summary plus its ordered event timeline, `limit` events per page."""
+    summary = db.get_correlation(corr_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="unknown correlation id")
+    after = None
+    if cursor:
+        ts, _, last_id = cursor.rpartition("|")
+        if not last_id.isdigit():
+            raise HTTPException(status_code=400, detail="bad cursor")
+        after = (ts, int(last_id))
+    events, nxt = db.correlation_timeline(corr_id, limit, after)
+    return {
+        "summary": summary,
+        "events": events,
+        "next_cursor": f"{nxt[0]}|{nxt[1]}" if nxt else None,
+    }
+
 @router.get("/window")
 def get_logs_window(
     start: Optional[str] = Query(None, description="ISO timestamp start (inclusive)"),
     end: Optional[str]   = Query(None, description="ISO timestamp end (inclusive)"),
     limit: int = Query(200, ge=1, le=10000),
-    summarize: bool = Query(False, description="If true, also return ai_summary/ai_label")
+    summarize: bool = Query(False, description="If true, also queue a summary job (ai_summary/ai_label)"),
+    wait: float = Query(0, ge=0, le=60, description="Seconds to wait for the summary"),
 ):
     """
     Fetch logs within a time window. Example:
       /logs/window?start=2025-10-29T09:30:00Z&end=2025-10-29T09:40:00Z&limit=200&summarize=true
+
+    The summary is a `summarize_window` job: ai_summary/ai_label stay null
+    until it finishes; poll /jobs/{summary_job.id} (or pass wait=seconds).
     """
-    if summarize:
-        return analysis.summarize_window(start, end, limit)
-    return {"logs": db.fetch_logs_window(start, end, limit)}
+    logs = db.fetch_logs_window(start, end, limit)
+    if not summarize:
+        return {"logs": logs}
+    try:
+        job = jobs.submit("summarize_window", {"start": start, "end": end, "limit": limit})
+    except jobs.UnknownJobType:
+        raise HTTPException(status_code=501, detail="window summaries are not served by this profile")
+    if wait:
+        job = jobs.wait(job["id"], wait)
+    summary = job["result"] if job["status"] == "done" else {}
+    return {
+        "logs": logs,
+        "ai_summary": summary.get("ai_summary"),
+        "ai_label": summary.get("ai_label"),
+        "summary_job": job,
+    }
+
+@router.get("/tail")
+async def tail_logs(
+    request: Request,
+    level: Optional[str] = Query(None, description="Comma-separated levels, e.g. ERROR,FATAL"),
+    label: Optional[str] = Query(None),
+    endpoint: Optional[str] = Query(None, description="Substring match on endpoint"),
+    correlation_id: Optional[str] = Query(None),
+):
+    """
+    Live tail of newly ingested logs as Server-Sent Events.
+    Events:
+      - `log`: one ingested row (JSON)
+      - `lag`: {"dropped": n} when this client fell behind and rows were discarded
+    """
+    levels = [l.strip() for l in level.split(",") if l.strip()] if level else None
+    try:
+        sub = log_stream.subscribe(levels, label, endpoint, correlation_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    async def events():
+        try:
+            yield ": connected\n\n"
+            while not await request.is_disconnected():
+                rows, dropped = await sub.next_batch()
+                if dropped:
+                    yield f"event: lag\ndata: {json.dumps({'dropped': dropped})}\n\n"
+                for r in rows:
+                    yield f"event: log\ndata: {json.dumps(r, default=str)}\n\n"
+                if not rows and not dropped:
+                    yield ": keep-alive\n\n"
+        finally:
+            log_stream.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/top")
+def top(
+    by: str = Query("endpoint", pattern="^(" + "|".join(sketches.DIMENSIONS) + ")$"),
+    level: Optional[str] = Query(None, description="Comma-separated levels, e.g. ERROR,FATAL"),
+    label: Optional[str] = Query(None, description="Comma-separated labels (as labeled at ingest)"),
+    minutes: float = Query(15, gt=0, le=sketches.BUCKETS * sketches.BUCKET_SEC / 60),
+    k: int = Query(10, ge=1, le=sketches.CAPACITY),
+    value: Optional[str] = Query(None, description="Only the estimated count of this value"),
+):
+    """
+    Heaviest endpoints / templates / correlation ids of the last `minutes`
+    of ingest, from streaming sketches (no query on the log tables):
+      /logs/top?by=endpoint&level=ERROR,FATAL&minutes=5
+
+    Counts are approximate: `count` is an upper and `min_count` a lower
+    bound. The sketches are per process and start empty on restart.
+    """
+    if not sketches.ENABLED:
+        raise HTTPException(status_code=503, detail="sketches are disabled (SKETCHES_ENABLED)")
+    levels = [l.strip() for l in (level or "").split(",") if l.strip()]
+    labels = [l.strip() for l in (label or "").split(",") if l.strip()]
+    if levels and labels:
+        raise HTTPException(status_code=400, detail="filter by level or by label, not both")
+    if value is not None:
+        return {
+            "by": by,
+            "value": value,
+            "minutes": minutes,
+            "count": sketches.sketches.estimate(by, value, levels, labels, minutes),
+        }
+    return sketches.sketches.top(by, levels, labels, minutes, k)
+
+@router.get("/top/stats")
+def top_stats():
+    return sketches.sketches.stats()
+
+@router.get("/tail/stats")
+def tail_stats():
+    return log_stream.stats()
+
+@router.get("/archive/stats")
+def archive_stats():
+    return archive.stats()
@@ -1,16 +1,20 @@
-import uuid
-from fastapi import APIRouter, HTTPException
+import os
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Header, Query
 from app.models import StartSessionRequest, AnswerRequest
-from app.store import db
-from app.services import analysis
+from app.store import session_cache
+from app.services import analysis, similar_incidents, summary_cache
+from app.services.resilience import latency_budget
 from app.services.formatter import format_snow
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, Response
 from app.services.llm_client import summarize_logs, label_issue
 
 
 
 router = APIRouter(prefix="/triage", tags=["triage"])
 
+SUMMARY_BUDGET_SEC = float(os.getenv("TRIAGE_SUMMARY_BUDGET_SEC", "12"))
+
 QUESTIONS = [
     "Hello! I'm here to help you with your issue today. Could you please start by providing your name or the name of the affected user?",
     "What is the front-end channel application that's displaying the error?",
@@ -35,43 +39,70 @@ def build_question(step: int):
 
 @router.post("/start")
 def start_session(req: StartSessionRequest):
-    sid = str(uuid.uuid4())
-    db.create_session(sid)
+    state = session_cache.create()
     q, _ = build_question(0)
-    db.put_answer(sid, 0, q, None)
-    return {"session_id": sid, "question": q, "step": 0}
+    state.put_answer(0, q, None)
+    session_cache.commit(state)
+    return {"session_id": state.id, "question": q, "step": 0}
 
 @router.post("/{session_id}/answer")
 def answer(session_id: str, req: AnswerRequest):
-    sess = db.get_session(session_id)
-    if not sess or sess["closed"] == 1:
+    state = session_cache.get(session_id)
+    if not state or state.closed:
         raise HTTPException(status_code=404, detail="Session not found or closed")
-    step = sess["step"]
-    # Save answer to current step question
-    curr = db.get_answers(session_id)[-1] if db.get_answers(session_id) else {"question": QUESTIONS[0]}
-    db.put_answer(session_id, step, curr["question"], req.answer)
-
-    # Advance
-    step += 1
-    if step >= len(QUESTIONS):
-        db.close_session(session_id)
-        return {"message": "Session complete. Retrieve summary.", "summary_url": f"/triage/{session_id}/summary"}
-
-    q, context = build_question(step)
-    db.update_step(session_id, step)
-    db.put_answer(session_id, step, q, None)
+    with state.lock:
+        step = state.step
+        # Save answer to current step question
+        curr = state.answers[-1] if state.answers else {"question": QUESTIONS[0]}
+        state.put_answer(step, curr["question"], req.answer)
+
+        # Advance
+        step += 1
+        if step >= len(QUESTIONS):
+            state.close()
+            session_cache.commit(state)
+            return {"message": "Session complete. Retrieve summary.", "summary_url": f"/triage/{session_id}/summary"}
+
+        q, context = build_question(step)
+        state.set_step(step)
+        state.put_answer(step, q, None)
+        session_cache.commit(state)
     return {"session_id": session_id, "question": q, "step": step, "context": context}
 
+@router.get("/{session_id}/similar")
+def similar(session_id: str, k: int = Query(5, ge=1, le=50)):
+    """Closed sessions that look like this one (answers, POF message, endpoint, label)."""
+    matches = similar_incidents.similar_to_session(session_id, k)
+    if matches is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"session_id": session_id, "similar": matches}
+
 @router.get("/{session_id}")
 def get_session(session_id: str):
-    s = db.get_session(session_id)
+    s = session_cache.get(session_id)
     if not s:
         raise HTTPException(status_code=404, detail="Session not found")
-    return {"session": s, "answers": db.get_answers(session_id)}
+    return {"session": s.as_dict(), "answers": s.get_answers()}
 
 @router.get("/{session_id}/summary", response_class=PlainTextResponse)
-def summary(session_id: str):
-    answers = db.get_answers(session_id)
+def summary(session_id: str, if_none_match: Optional[str] = Header(None)):
+    state = session_cache.get(session_id)
+    if state is None:
+        return _render_summary([])
+    # snapshot under the lock; the build (LLM calls) must not block answers on this session
+    with state.lock:
+        etag = summary_cache.etag_for("scripted", state)
+        # degraded (heuristic) summaries are not cached: rebuild those even on a matching ETag
+        if summary_cache.etag_matches(if_none_match, etag) and summary_cache.is_cached("scripted", session_id, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        answers = state.get_answers()
+    with latency_budget(SUMMARY_BUDGET_SEC):
+        etag, text = summary_cache.get_or_build(
+            "scripted", session_id, etag, lambda: _render_summary(answers, session_id)
+        )
+    return PlainTextResponse(text, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def _render_summary(answers: list, session_id: Optional[str] = None) -> str:
     summary_map = {
         "1. Affected User": answers[0]["answer"] if len(answers) > 0 else None,
         "2. Point of Failure (timestamp)": None,
@@ -91,6 +122,7 @@ def summary(session_id: str):
             summary_map["ai_summary"] = found["ai_summary"]   # consumed by formatter
         if found.get("ai_label"):
             summary_map["ai_label"] = found["ai_label"]       # consumed by formatter
+    summary_map["similar_incidents"] = similar_incidents.for_summary(answers, found or {}, session_id)
 
     text = format_snow(summary_map, answers)
-    return text
\ No newline at end of file
+    return text
@@ -1,19 +1,24 @@
 # app/routers/triage_dyn.py
-from fastapi import APIRouter
-from fastapi.responses import PlainTextResponse
+from fastapi import APIRouter, Header
+from fastapi.responses import PlainTextResponse, Response
 from pydantic import BaseModel
-from uuid import uuid4
 from typing import Optional, Tuple
 from datetime import datetime, timedelta, timezone
 import re
+import os
 from fastapi import Query
-from app.store import db
-from app.services import analysis
+from app.store import db, session_cache
+from app.services import analysis, jobs, similar_incidents, summary_cache
+from app.services.resilience import latency_budget
 from app.services.questioner import propose_next_question
 from app.services.formatter import format_snow
 
 router = APIRouter(prefix="/triage-dyn", tags=["triage-dyn"])
 
+# Wall-clock LLM budget per request; past it we fall back to scripted questions / heuristics
+TURN_BUDGET_SEC = float(os.getenv("TRIAGE_TURN_BUDGET_SEC", "8"))
+SUMMARY_BUDGET_SEC = float(os.getenv("TRIAGE_SUMMARY_BUDGET_SEC", "12"))
+
 
 # ---------- Models ----------
 class StartBody(BaseModel):
@@ -136,17 +141,20 @@ def parse_time_window(text: str) -> Tuple[Optional[str], Optional[str]]:
 # ---------- Routes ----------
 @router.post("/start")
 def start_dyn(body: StartBody):
-    sid = str(uuid4())
-    db.create_session(sid, initiator=body.initiator)
+    state = session_cache.create(initiator=body.initiator)
 
     # First (dynamic) question from the model
-    q = propose_next_question(sid)
+    with latency_budget(TURN_BUDGET_SEC):
+        q = propose_next_question(state.id, answers=[])
+    if q.get("fallback"):
+        q["question"] = _scripted_question(state)
 
-    # Store the question at step=0 (answer empty for now)
-    db.put_answer(sid, 0, q["question"], None)
+    # Store the question at step=0 (answer empty for now); session row + question in one transaction
+    state.put_answer(0, q["question"], None)
+    session_cache.commit(state)
 
     return {
-        "session_id": sid,
+        "session_id": state.id,
         "question": q["question"],
         "step": 0,
         "context": {},
@@ -155,17 +163,46 @@ def start_dyn(body: StartBody):
 
 @router.post("/{session_id}/answer")
 def answer_dyn(session_id: str, body: AnswerBody):
-    sess = db.get_session(session_id)
-    if not sess or sess.get("closed"):
+    state = session_cache.get(session_id)
+    if not state or state.closed:
         return {"detail": "session not found or closed"}
+    with state.lock, latency_budget(TURN_BUDGET_SEC):
+        try:
+            return _answer_turn(state, body)
+        finally:
+            # everything this turn changed goes out in one transaction
+            session_cache.commit(state)
+
+
+def _scripted_question(state: session_cache.SessionState) -> str:
+    """First scripted /triage question not asked yet (used when the LLM planner is unavailable)."""
+    from app.routers.triage import QUESTIONS
+
+    asked = {a["question"] for a in state.answers}
+    pof = None
+    for template in QUESTIONS[:-1]:
+        text = template
+        if "{POF_TS}" in text or "{CORR_ID}" in text:
+            if pof is None:
+                pof = db.find_pof_window(state.window_start, state.window_end) or {}
+            text = text.replace("{POF_TS}", str(pof.get("ts") or "-")).replace(
+                "{CORR_ID}", str(pof.get("correlation_id") or "-")
+            )
+        if text not in asked:
+            return text
+    return QUESTIONS[-1]
+
+
+def _answer_turn(state: session_cache.SessionState, body: AnswerBody) -> dict:
+    session_id = state.id
 
     # Determine current step (we already inserted step=0 as question)
-    answers = db.get_answers(session_id)
+    answers = state.answers
     cur_step = max(0, len(answers) - 1)
 
     # Fill the last question's answer
     last_q = answers[-1]["question"] if answers else "(no question)"
-    db.put_answer(session_id, cur_step, last_q, body.answer)
+    state.put_answer(cur_step, last_q, body.answer)
 
     # --- NEW: time-window trigger ---
     start_ts, end_ts = parse_time_window(body.answer or "")
@@ -195,8 +232,8 @@ def answer_dyn(session_id: str, body: AnswerBody):
             )
 
             next_step = cur_step + 1
-            db.put_answer(session_id, next_step, q_text, None)
-            db.update_step(session_id, next_step)
+            state.put_answer(next_step, q_text, None)
+            state.set_step(next_step)
             return {
                 "session_id": session_id,
                 "question": q_text,
@@ -210,8 +247,8 @@ def answer_dyn(session_id: str, body: AnswerBody):
                 f"I didn't see critical errors between {start_ts} and {end_ts}. "
                 "Do you have a correlation ID or endpoint I should focus on?"
             )
-            db.put_answer(session_id, next_step, q_text, None)
-            db.update_step(session_id, next_step)
+            state.put_answer(next_step, q_text, None)
+            state.set_step(next_step)
             return {
                 "session_id": session_id,
                 "question": q_text,
@@ -220,9 +257,11 @@ def answer_dyn(session_id: str, body: AnswerBody):
             }
 
     # --- Default dynamic planner path (no time-window detected) ---
-    q = propose_next_question(session_id)
+    q = propose_next_question(session_id, answers=state.get_answers())
+    if q.get("fallback"):
+        q = {"question": _scripted_question(state), "stop": False}
     if q.get("stop"):
-        db.close_session(session_id)
+        state.close()
         return {
             "session_id": session_id,
             "question": "Thanks. I have enough details. Fetch the summary when ready.",
@@ -231,8 +270,8 @@ def answer_dyn(session_id: str, body: AnswerBody):
         }
 
     next_step = cur_step + 1
-    db.put_answer(session_id, next_step, q["question"], None)
-    db.update_step(session_id, next_step)
+    state.put_answer(next_step, q["question"], None)
+    state.set_step(next_step)
 
     # Optionally surface hints from automated analysis like before
     found = analysis.find_pof_and_corr() or {}
@@ -255,9 +294,27 @@ def answer_dyn(session_id: str, body: AnswerBody):
 
 
 @router.get("/{session_id}/summary", response_class=PlainTextResponse)
-def summary_dyn(session_id: str):
-    answers = db.get_answers(session_id)
-    found = analysis.find_pof_and_corr() or {}
+def summary_dyn(session_id: str, if_none_match: Optional[str] = Header(None)):
+    state = session_cache.get(session_id)
+    if state is None:
+        return _render_summary([])
+    # snapshot under the lock; the build (LLM calls) must not block answers on this session
+    with state.lock:
+        etag = summary_cache.etag_for("dyn", state)
+        # degraded (heuristic) summaries are not cached: rebuild those even on a matching ETag
+        if summary_cache.etag_matches(if_none_match, etag) and summary_cache.is_cached("dyn", session_id, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        answers, start, end = state.get_answers(), state.window_start, state.window_end
+    with latency_budget(SUMMARY_BUDGET_SEC):
+        etag, text = summary_cache.get_or_build(
+            "dyn", session_id, etag, lambda: _render_summary(answers, start, end, session_id)
+        )
+    return PlainTextResponse(text, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def _render_summary(answers: list, start: Optional[str] = None, end: Optional[str] = None,
+                    session_id: Optional[str] = None) -> str:
+    found = analysis.find_pof_and_corr(start, end) or {}
 
     # heuristics to pick values from arbitrary dynamic questions
     def find_answer(substring: str) -> Optional[str]:
@@ -286,6 +343,7 @@ def summary_dyn(session_id: str):
         summary_map["ai_summary"] = found["ai_summary"]
     if found.get("ai_label"):
         summary_map["ai_label"] = found["ai_label"]
+    summary_map["similar_incidents"] = similar_incidents.for_summary(answers, found, session_id)
 
     text = format_snow(summary_map, answers)
     return text
@@ -293,19 +351,28 @@ def summary_dyn(session_id: str):
 def apply_window(session_id: str,
                  start: Optional[str] = Query(None),
                  end: Optional[str] = Query(None),
-                 limit: int = Query(200, ge=1, le=10000)):
+                 limit: int = Query(200, ge=1, le=10000),
+                 wait: float = Query(0, ge=0, le=60, description="Seconds to wait for the summary")):
     """
     Attach a time-window context to the session (doesn't change step count).
-    Returns summary so UI can show a hint block.
+    The summary for the UI hint block is a `summarize_window` job: context has
+    ai_summary once it finished, and summary_job to poll (/jobs/{id}) until then.
     """
-    sess = db.get_session(session_id)
-    if not sess or sess.get("closed"):
+    state = session_cache.get(session_id)
+    if not state or state.closed:
         return {"detail": "session not found or closed"}
 
-    result = analysis.summarize_window(start, end, limit)
+    job = jobs.submit("summarize_window", {"start": start, "end": end, "limit": limit})
+    logs = db.fetch_logs_window(start, end, limit)
     # record a synthetic 'question' entry so it appears in the transcript
     q = f"[Applied time window] start={start or '-'} end={end or '-'}"
-    db.add_answer(session_id, sess["step"], q, f"{len(result['logs'])} logs")
-
-    ctx = {"ai_summary": result.get("ai_summary"), "ai_label": result.get("ai_label")}
+    with state.lock:
+        state.put_answer(state.step, q, f"{len(logs)} logs")
+        state.set_window(start, end)
+        session_cache.commit(state)
+
+    if wait:
+        job = jobs.wait(job["id"], wait)
+    summary = job["result"] if job["status"] == "done" else {}
+    ctx = {"ai_summary": summary.get("ai_summary"), "ai_label": summary.get("ai_label"), "summary_job": job["id"]}
     return {"session_id": session_id, "applied": {"start": start, "end": end, "limit": limit}, "context": ctx}
@@ -1,11 +1,18 @@
-from fastapi import APIRouter
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from app.models import IngestRequest
-from app.services import log_ingestor
+from app.services import log_ingestor, log_parser
 
 router = APIRouter(prefix="/webhook", tags=["webhook"])
 
 @router.post("/logs")
-def webhook_logs(req: IngestRequest):
+def webhook_logs(req: IngestRequest, idempotency_key: Optional[str] = Header(None)):
+    """
+    Ingest a batch. Rows repeating a recently ingested row are dropped and
+    counted in `duplicates`; resending a batch with the same Idempotency-Key
+    header stores nothing and answers with the first result (`replayed`).
+    """
     payload = None
     if req.logs is not None:
         payload = [l.model_dump() for l in req.logs]
@@ -13,5 +20,23 @@ def webhook_logs(req: IngestRequest):
         payload = req.jsonl
     else:
         payload = []
-    count = log_ingestor.ingest(payload)
-    return {"ingested": count}
+    return log_ingestor.ingest_batch(payload, idempotency_key=idempotency_key)
+
+@router.post("/logs/bulk")
+async def webhook_logs_bulk(request: Request, idempotency_key: Optional[str] = Header(None)):
+    """
+    Bulk ingest for trusted shippers: the raw body goes straight to the batch
+    parser, with no per-record Pydantic model. NDJSON by default; with
+    Content-Type application/json the body is a JSON array of records.
+    Same response and Idempotency-Key handling as /webhook/logs.
+    """
+    body = await request.body()
+    payload = body
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            payload = log_parser.decode_json(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="body is not valid JSON")
+        if not isinstance(payload, list):
+            raise HTTPException(status_code=400, detail="expected a JSON array of records")
+    return await run_in_threadpool(log_ingestor.ingest_batch, payload, idempotency_key)
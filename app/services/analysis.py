@@ -3,6 +3,18 @@ from app.store import db
 from app.services.llm_client import summarize_logs, label_issue 
 from typing import Optional, Dict, Any, List
 from app.store import db
+from app.services.resilience import llm_available
+
+def _heuristic_summary(pof: Dict[str, Any]) -> str:
+    return "Heuristic: {} at {}: {}".format(
+        pof.get("level") or "ERROR",
+        pof.get("endpoint") or "unknown endpoint",
+        (pof.get("message") or "")[:160],
+    )
+
+def _heuristic_label(pof: Dict[str, Any]) -> str:
+    from app.services.labeler import _rule_label
+    return _rule_label(pof.get("message") or "") or "other"
 
 def find_pof_and_corr(start_ts: Optional[str] = None, end_ts: Optional[str] = None) -> Optional[Dict[str, Any]]:
     pof = db.find_pof_window(start_ts, end_ts)
@@ -16,67 +28,66 @@ def find_pof_and_corr(start_ts: Optional[str] = None, end_ts: Optional[str] = No
         "endpoint": pof.get("endpoint"),
     }
 
-    # AI bits
-    ai_summary = summarize_logs(
-        pof_message=pof.get("message") or "",
-        endpoint=pof.get("endpoint") or "",
-        corr_id=pof.get("correlation_id") or "",
-    )
-    if ai_summary:
-        result["ai_summary"] = ai_summary
+    # AI bits (heuristics when the LLM is down or the request budget is spent)
+    ai_summary = ""
+    if llm_available():
+        ai_summary = summarize_logs(
+            pof_message=pof.get("message") or "",
+            endpoint=pof.get("endpoint") or "",
+            corr_id=pof.get("correlation_id") or "",
+        )
+    result["ai_summary"] = ai_summary or _heuristic_summary(pof)
 
-    ai_label = label_issue(
-        pof_message=pof.get("message") or "",
-        endpoint=pof.get("endpoint") or "",
-        corr_id=pof.get("correlation_id") or "",
-    )
-    if ai_label:
-        result["ai_label"] = ai_label
+    ai_label = ""
+    if llm_available():
+        ai_label = label_issue(
+            pof_message=pof.get("message") or "",
+            endpoint=pof.get("endpoint") or "",
+            corr_id=pof.get("correlation_id") or "",
+        )
+    if not ai_label or ai_label.startswith("[label_error"):
+        ai_label = _heuristic_label(pof)
+    result["ai_label"] = ai_label
 
     return result
 from typing import Optional, Dict, Any, List
 from app.store import db
 
-try:
-    # you already call into llm_client elsewhere
-    from app.services.llm_client import summarize_logs as _summarize_logs
-except Exception:
-    _summarize_logs = None  # fallback later
-
-def summarize_window(start_ts: Optional[str], end_ts: Optional[str], limit: int = 200) -> Dict[str, Any]:
-    """
-    Fetch logs in [start_ts, end_ts] and produce an (ai_summary, ai_label) using LLM if available.
-    """
-    logs = db.fetch_logs_window(start_ts, end_ts, limit)
-    if not logs:
-        return {"logs": [], "ai_summary": "No logs found in this time window.", "ai_label": None}
-
-    # Prepare a compact text block for summarization
+def _window_summary(logs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """(ai_summary, ai_label) of a non-empty window; the LLM gets one compact line per log."""
     lines: List[str] = []
     for r in logs:
         parts = [r.get("ts") or "-", r.get("level") or "-", r.get("endpoint") or "-", r.get("correlation_id") or "-", r.get("message") or ""]
         lines.append(" | ".join(parts))
     text_block = "\n".join(lines)
 
-    ai_summary = None
-    ai_label = None
-
-    if _summarize_logs:
-        try:
-            out = _summarize_logs(text_block)  # your existing summarizer returns text; or dict if you made it so
-            if isinstance(out, dict):
-                ai_summary = out.get("summary") or out.get("text")
-                ai_label = out.get("label")
-            else:
-                ai_summary = str(out)
-        except Exception:
-            ai_summary = "Summary unavailable (LLM error)."
-    else:
+    ai_summary = ""
+    if llm_available():
+        # endpoint / correlation of the first error anchor the prompt
+        anchor = next((r for r in logs if (r.get("level") or "").upper() in db.POF_LEVELS), logs[0])
+        ai_summary = summarize_logs(
+            pof_message=text_block,
+            endpoint=anchor.get("endpoint") or "",
+            corr_id=anchor.get("correlation_id") or "",
+        )
+    if not ai_summary:
         # Fallback lightweight heuristic
         ai_summary = "Window summary (heuristic):\n- {} records\n- levels: {}".format(
             len(logs),
             ", ".join(sorted({r.get("level") or "-" for r in logs}))
         )
+    return {"ai_summary": ai_summary, "ai_label": None}
 
-    return {"logs": logs, "ai_summary": ai_summary, "ai_label": ai_label}
+def summarize_window(start_ts: Optional[str], end_ts: Optional[str], limit: int = 200) -> Dict[str, Any]:
+    """
+    Fetch logs in [start_ts, end_ts] and produce an (ai_summary, ai_label) using LLM if available.
+    """
+    logs = db.fetch_logs_window(start_ts, end_ts, limit)
+    if not logs:
+        return {"logs": [], "ai_summary": "No logs found in this time window.", "ai_label": None}
+    return {"logs": logs, **_window_summary(logs)}
 
+def summarize_window_job(start: Optional[str] = None, end: Optional[str] = None, limit: int = 200) -> Dict[str, Any]:
+    """`summarize_window` job: the summary only, callers read the logs themselves."""
+    result = summarize_window(start, end, limit)
+    return {"rows": len(result["logs"]), "ai_summary": result["ai_summary"], "ai_label": result["ai_label"]}
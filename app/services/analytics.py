@@ -0,0 +1,239 @@
+# app/services/analytics.py
+"""
+Aggregate queries over the columnar log snapshots (app.store.columnar).
+
+Everything is computed on dictionary ids with NumPy (bincount / unique over
+whole columns) and only the rows of the final answer are decoded back to
+strings. Results are as fresh as the last snapshot refresh
+(ANALYTICS_REFRESH_SEC), reported as `as_of`. Totals include rows dropped
+by ingest sampling (weighted snapshot entries); `rows` counts them too.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import ERROR_LEVELS
+from app.store import db
+from app.store.codec import readable_template
+from app.store.columnar import NaT_MS, store, to_ms
+
+GROUP_FIELDS = ("endpoint", "source", "account", "template", "level", "label")
+
+
+def _error_mask(levels: np.ndarray) -> np.ndarray:
+    return np.isin(levels, np.array(db.dictionary_ids("level", ERROR_LEVELS), dtype=np.int32))
+
+
+def _decode(ids) -> Dict[int, Optional[str]]:
+    # only template values contain holes
+    return {i: readable_template(v) for i, v in db.dictionary_values(int(i) for i in ids if i).items()}
+
+
+def _envelope(start: Optional[str], end: Optional[str], rows: int) -> Dict[str, Any]:
+    return {"start": start, "end": end, "rows": rows, "as_of": store.refreshed_at}
+
+
+def error_rate(start: Optional[str], end: Optional[str], by: str = "endpoint", limit: int = 20) -> Dict[str, Any]:
+    """Total rows, error rows and error rate per `by` value, most errors first."""
+    w = store.ensure_fresh().window(start, end, fields=(by, "level"), weighted=True)
+    weight = w["weight"]
+    err_weight = weight * _error_mask(w["level"])
+    keys, inv = np.unique(w[by], return_inverse=True)
+    totals = np.bincount(inv, weights=weight, minlength=len(keys)).astype(np.int64)
+    errors = np.bincount(inv, weights=err_weight, minlength=len(keys)).astype(np.int64)
+    order = np.lexsort((-totals, -errors))[:limit]
+    names = _decode(keys[order])
+    return {
+        **_envelope(start, end, int(weight.sum())),
+        "by": by,
+        "errors": int(err_weight.sum()),
+        "groups": [
+            {
+                by: names.get(int(keys[i])),
+                "total": int(totals[i]),
+                "errors": int(errors[i]),
+                "error_rate": round(errors[i] / totals[i], 4),
+            }
+            for i in order
+        ],
+    }
+
+
+def top_labels(start: Optional[str], end: Optional[str], by: str = "source", per_group: int = 5,
+               limit: int = 20) -> Dict[str, Any]:
+    """Most frequent labels per `by` value (unlabeled rows only count towards `unlabeled`)."""
+    w = store.ensure_fresh().window(start, end, fields=(by, "label"), weighted=True)
+    group, label, weight = w[by], w["label"], w["weight"]
+    g_keys, g_inv = np.unique(group, return_inverse=True)
+    g_totals = np.bincount(g_inv, weights=weight, minlength=len(g_keys)).astype(np.int64)
+    labeled = label != 0
+    # one int64 key per (group, label) pair
+    pairs, p_inv = np.unique((group[labeled].astype(np.int64) << 32) | label[labeled], return_inverse=True)
+    counts = np.bincount(p_inv, weights=weight[labeled], minlength=len(pairs)).astype(np.int64)
+    pair_group = pairs >> 32
+    pair_label = pairs & 0xFFFFFFFF
+    # pairs grouped by group id (unique keeps them sorted), largest count first inside each group
+    order = np.lexsort((-counts, pair_group))
+    top_groups = g_keys[np.argsort(-g_totals, kind="stable")[:limit]]
+    total_of = dict(zip(g_keys.tolist(), g_totals.tolist()))
+
+    picked: Dict[int, List[int]] = {int(g): [] for g in top_groups}
+    for i in order:
+        lst = picked.get(int(pair_group[i]))
+        if lst is not None and len(lst) < per_group:
+            lst.append(i)
+    names = _decode(list(top_groups) + [pair_label[i] for lst in picked.values() for i in lst])
+    groups = []
+    for g, lst in picked.items():
+        n_labeled = int(sum(counts[pair_group == g]))
+        groups.append({
+            by: names.get(g),
+            "total": total_of[g],
+            "unlabeled": total_of[g] - n_labeled,
+            "labels": [{"label": names.get(int(pair_label[i])), "count": int(counts[i])} for i in lst],
+        })
+    return {**_envelope(start, end, int(weight.sum())), "by": by, "groups": groups}
+
+
+def bursts(start: Optional[str], end: Optional[str], bucket_sec: int = 60, top: int = 10) -> Dict[str, Any]:
+    """
+    Error burst sizes: errors per `bucket_sec` bucket. Percentiles are over
+    buckets with at least one error; `busiest` lists the largest buckets.
+    """
+    w = store.ensure_fresh().window(start, end, fields=("level",))
+    ts = w["ts_ms"][_error_mask(w["level"])]
+    out = {**_envelope(start, end, len(w["ts_ms"])), "bucket_sec": bucket_sec, "errors": int(len(ts))}
+    if not len(ts):
+        return {**out, "buckets": 0, "buckets_with_errors": 0, "p50": 0, "p95": 0, "p99": 0, "max": 0, "busiest": []}
+    origin = to_ms(start) if start else NaT_MS
+    if origin == NaT_MS:
+        origin = int(ts.min())
+    width = bucket_sec * 1000
+    per_bucket = np.bincount((ts - origin) // width)
+    hit = per_bucket[per_bucket > 0]
+    p50, p95, p99 = np.percentile(hit, [50, 95, 99])
+    busiest = np.argsort(-per_bucket, kind="stable")[:top]
+    return {
+        **out,
+        "buckets": int(len(per_bucket)),
+        "buckets_with_errors": int(len(hit)),
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+        "max": int(hit.max()),
+        "busiest": [
+            {
+                "start": str(np.datetime64(origin + int(b) * width, "ms")),
+                "errors": int(per_bucket[b]),
+            }
+            for b in busiest if per_bucket[b]
+        ],
+    }
+
+
+# ------------------------- incident vs baseline diff --------------------------
+
+DIFF_FIELDS = ("template", "label", "endpoint", "source")
+
+
+def _iso_ms(ms: int) -> str:
+    return str(np.datetime64(int(ms), "ms"))
+
+
+def preceding_window(start: str, end: str) -> Tuple[str, str]:
+    """The window of the same length that ends right before `start`."""
+    lo, hi = to_ms(start), to_ms(end)
+    return _iso_ms(lo - (hi - lo) - 1), _iso_ms(lo - 1)
+
+
+def _minutes(start: str, end: str) -> float:
+    return max((to_ms(end) - to_ms(start)) / 60_000, 1 / 60)
+
+
+def window_diff(incident_start: str, incident_end: str, baseline_start: str, baseline_end: str,
+                fields=DIFF_FIELDS, top: int = 10, errors_only: bool = False) -> Dict[str, Any]:
+    """
+    Counts and rates (per minute) per value of each field in the incident and
+    the baseline window, ranked by the absolute rate change. `new` marks
+    values never seen in the baseline; `new_templates` lists those templates
+    by incident count. Dictionary ids are dense, so each field is two
+    bincounts over the id columns.
+    """
+    st = store.ensure_fresh()
+    cols = tuple(fields) + (("level",) if "level" not in fields else ())
+    inc = st.window(incident_start, incident_end, fields=cols, weighted=True)
+    base = st.window(baseline_start, baseline_end, fields=cols, weighted=True)
+    inc_err, base_err = _error_mask(inc["level"]), _error_mask(base["level"])
+    if errors_only:
+        inc = {k: v[inc_err] for k, v in inc.items()}
+        base = {k: v[base_err] for k, v in base.items()}
+    inc_min, base_min = _minutes(incident_start, incident_end), _minutes(baseline_start, baseline_end)
+
+    picked: Dict[str, tuple] = {}
+    for f in fields:
+        size = int(max(inc[f].max(initial=0), base[f].max(initial=0))) + 1
+        ci = np.bincount(inc[f], weights=inc["weight"], minlength=size)
+        cb = np.bincount(base[f], weights=base["weight"], minlength=size)
+        keys = np.flatnonzero(ci + cb)
+        ci, cb = ci[keys], cb[keys]
+        delta = ci / inc_min - cb / base_min
+        order = np.argsort(-np.abs(delta), kind="stable")[:top]
+        picked[f] = (keys[order], ci[order], cb[order], delta[order])
+        if f == "template":
+            fresh = cb == 0  # every key has a count in one of the windows
+            first = np.argsort(-ci[fresh], kind="stable")[:top]
+            new_templates = (keys[fresh][first], ci[fresh][first])
+    names = _decode([k for v in picked.values() for k in v[0]] + (list(new_templates[0]) if "template" in picked else []))
+
+    def side(start: str, end: str, w: Dict[str, np.ndarray], err: np.ndarray, minutes: float) -> Dict[str, Any]:
+        rows = int(w["weight"].sum())
+        errors = rows if errors_only else int(w["weight"][err].sum())
+        return {"start": start, "end": end, "minutes": round(minutes, 3), "rows": rows,
+                "errors": errors, "rate": round(rows / minutes, 3)}
+
+    out: Dict[str, Any] = {
+        "incident": side(incident_start, incident_end, inc, inc_err, inc_min),
+        "baseline": side(baseline_start, baseline_end, base, base_err, base_min),
+        "errors_only": errors_only,
+        "as_of": store.refreshed_at,
+        "fields": {},
+    }
+    for f, (keys, ci, cb, delta) in picked.items():
+        out["fields"][f] = [
+            {
+                "value": names.get(int(k)),
+                "incident": int(a),
+                "baseline": int(b),
+                "incident_rate": round(a / inc_min, 3),
+                "baseline_rate": round(b / base_min, 3),
+                "delta_rate": round(float(d), 3),
+                "ratio": round((a / inc_min) / (b / base_min), 2) if b else None,
+                "new": not b,
+            }
+            for k, a, b, d in zip(keys, ci, cb, delta)
+        ]
+    if "template" in picked:
+        out["new_templates"] = [{"template": names.get(int(k)), "incident": int(n)} for k, n in zip(*new_templates)]
+    return out
+
+
+def compact_diff(diff: Dict[str, Any], per_field: int = 3, chars: int = 120) -> List[Dict[str, Any]]:
+    """Prompt-sized view of window_diff: the largest increases per field, new values and largest first."""
+    picked = []
+    for f, entries in diff["fields"].items():
+        ups = sorted((e for e in entries if e["delta_rate"] > 0), key=lambda e: (not e["new"], -e["delta_rate"]))
+        picked.extend((f, e) for e in ups[:per_field])
+    picked.sort(key=lambda fe: (not fe[1]["new"], -fe[1]["delta_rate"]))
+    return [
+        {
+            "field": f,
+            "value": (e["value"] or "-")[:chars],
+            "per_min": f"{e['baseline_rate']:g} -> {e['incident_rate']:g}",
+            **({"new": True} if e["new"] else {}),
+        }
+        for f, e in picked
+    ]
+
+
+def status() -> Dict[str, Any]:
+    return store.stats()
@@ -2,8 +2,11 @@ from typing import Dict, Any, List
 
 def format_snow(summary: Dict[str, Any], qas: List[Dict[str, Any]]) -> str:
     # Remove AI fields from the top table so they don't print as header rows
+    # (work on a copy: callers may cache or reuse their map)
+    summary = dict(summary)
     ai = summary.pop("ai_summary", None)
     label = summary.pop("ai_label", None)
+    similar = summary.pop("similar_incidents", None)
 
     lines = []
     lines.append("AI Triage Summary")
@@ -18,6 +21,15 @@ def format_snow(summary: Dict[str, Any], qas: List[Dict[str, Any]]) -> str:
         lines.append("AI Brief:")
         lines.append(ai)
 
+    if similar:
+        lines.append("")
+        lines.append("Similar Past Incidents:")
+        for s in similar:
+            lines.append(
+                f"- {s['session_id']} (similarity {s['score']:.2f}): label={s.get('label') or '-'}, "
+                f"endpoint={s.get('endpoint') or '-'}, POF: {s.get('pof') or '-'}"
+            )
+
     lines.append("")
     lines.append("Conversation Details:")
     for qa in qas:
@@ -1,14 +1,35 @@
-import requests
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from app.services import http_client
 
-API_KEY = os.getenv("GEMINI_API_KEY")
+# Point at tools/fake_llm_server.py (e.g. http://127.0.0.1:8089) for offline runs
+API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
+MODEL = os.getenv("GEMINI_REST_MODEL", "gemini-2.0-flash")
+
+def _api_key() -> Optional[str]:
+    return os.getenv("GEMINI_API_KEY") or os.getenv("LLM_API_KEY")
 
 def ask(prompt: str) -> str:
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
-    headers = {"Content-Type": "application/json"}
+    if os.getenv("LLM_BACKEND", "gemini").lower() == "fake":
+        # in-process stand-in, same backend the SDK path uses
+        from app.services.llm_client import _init_model
+        return _init_model().generate_content(prompt).text
+    url = f"{API_BASE.rstrip('/')}/v1beta/models/{MODEL}:generateContent"
+    # key goes in a header, not the query string, so it never lands in access logs
+    headers = {"Content-Type": "application/json", "x-goog-api-key": _api_key() or ""}
     payload = {"contents": [{"parts": [{"text": prompt}]}]}
-    r = requests.post(f"{url}?key={API_KEY}", json=payload, headers=headers, timeout=30)
-    if r.status_code == 200:
-        data = r.json()
+    status, data = http_client.post_json(url, payload, headers)
+    if status == 200:
         return data["candidates"][0]["content"]["parts"][0]["text"]
-    return f"[error {r.status_code}] {r.text[:120]}"
+    body = data if isinstance(data, str) else json.dumps(data)
+    return f"[error {status}] {body[:120]}"
+
+def ask_many(prompts: List[str], max_concurrency: Optional[int] = None) -> List[str]:
+    """Run prompts concurrently over the shared pool; results keep input order."""
+    if not prompts:
+        return []
+    workers = max(1, min(max_concurrency or http_client.POOL_SIZE, http_client.POOL_SIZE, len(prompts)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gemini-rest") as pool:
+        return list(pool.map(ask, prompts))
@@ -0,0 +1,85 @@
+# app/services/http_client.py
+"""
+Shared keep-alive HTTP client for REST-based LLM calls.
+
+One process-wide connection pool, so repeated calls to the provider reuse
+TCP/TLS connections instead of handshaking per request. Uses httpx with
+HTTP/2 when `httpx` and `h2` are installed, otherwise a requests.Session
+with a sized HTTPAdapter.
+
+  LLM_HTTP_POOL_SIZE        max pooled connections per host (default 20)
+  LLM_HTTP_CONNECT_TIMEOUT  seconds (default 3.05)
+  LLM_HTTP_READ_TIMEOUT     seconds (default 30)
+  LLM_HTTP2                 set to 0 to force HTTP/1.1 (default 1)
+"""
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+POOL_SIZE = int(os.getenv("LLM_HTTP_POOL_SIZE", "20"))
+CONNECT_TIMEOUT = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("LLM_HTTP_READ_TIMEOUT", "30"))
+WANT_HTTP2 = os.getenv("LLM_HTTP2", "1").lower() not in ("0", "false", "no")
+
+_lock = threading.Lock()
+_client = None
+_kind = None  # "httpx-h2" | "requests"
+
+
+def _build():
+    if WANT_HTTP2:
+        try:
+            import h2  # noqa: F401  (httpx needs it for http2=True)
+            import httpx
+
+            client = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+                timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            )
+            return client, "httpx-h2"
+        except ImportError:
+            pass
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=0, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session, "requests"
+
+
+def get_client():
+    """Lazily create the shared client (thread-safe)."""
+    global _client, _kind
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client, _kind = _build()
+    return _client
+
+
+def client_kind() -> Optional[str]:
+    return _kind
+
+
+def post_json(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Tuple[int, Any]:
+    """POST JSON over the pool; returns (status_code, parsed JSON or raw text)."""
+    client = get_client()
+    if _kind == "httpx-h2":
+        r = client.post(url, json=payload, headers=headers)
+    else:
+        r = client.post(url, json=payload, headers=headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    try:
+        return r.status_code, r.json()
+    except ValueError:
+        return r.status_code, r.text
+
+
+def close() -> None:
+    global _client, _kind
+    with _lock:
+        if _client is not None:
+            _client.close()
+        _client, _kind = None, None
@@ -0,0 +1,286 @@
+# app/services/jobs.py
+"""
+In-process background jobs with their state in SQLite (`jobs` table).
+
+A job type is a plain function registered at startup (main.py):
+
+    jobs.register("summarize_window", analysis.summarize_window_job, concurrency=2, priority=10)
+
+submit(type, params) stores a queued row and returns it; the function runs
+later as fn(**params) on one of JOBS_WORKERS threads and its (JSON) return
+value becomes the job's `result`. Clients poll /jobs/{id}.
+
+  - priorities: higher first, then oldest first
+  - dedup: submitting a type + params that is already queued or running
+    returns that job (a unique index enforces it across workers)
+  - concurrency: at most `concurrency` running jobs per type and process
+  - cancel: queued jobs are dropped; running ones are flagged and end as
+    `cancelled` (functions that loop can stop early via cancel_requested())
+  - schedules: schedule(type, every_sec) submits the job periodically
+    (still deduplicated, so a slow run is never stacked)
+
+Workers share the queue through the DB: a job is claimed with a conditional
+UPDATE, and every worker only claims types it has registered. Running jobs
+heartbeat every JOBS_HEARTBEAT_SEC; a job whose worker stopped (crash,
+restart) goes back to the queue, or fails after JOBS_MAX_ATTEMPTS.
+Finished jobs are kept for JOBS_RETENTION_HOURS.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from app import metrics
+from app.store import db
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.getenv("JOBS_WORKERS", "4"))
+POLL_SEC = float(os.getenv("JOBS_POLL_SEC", "1"))
+HEARTBEAT_SEC = float(os.getenv("JOBS_HEARTBEAT_SEC", "10"))
+MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+RETENTION_SEC = float(os.getenv("JOBS_RETENTION_HOURS", "24")) * 3600
+
+JOBS = metrics.counter("triage_jobs_total", "Finished background jobs by type and status", ["type", "status"])
+JOB_SECONDS = metrics.histogram(
+    "triage_job_seconds", "Background job run time", ["type"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900),
+)
+JOBS_RUNNING = metrics.gauge("triage_jobs_running", "Background jobs running in this process", ["type"])
+
+
+class UnknownJobType(ValueError):
+    pass
+
+
+class JobType:
+    __slots__ = ("name", "fn", "concurrency", "priority")
+
+    def __init__(self, name: str, fn: Callable[..., Any], concurrency: int, priority: int):
+        self.name, self.fn, self.concurrency, self.priority = name, fn, concurrency, priority
+
+
+class _Schedule:
+    __slots__ = ("type", "every", "params", "priority", "next_at")
+
+    def __init__(self, job_type: str, every: float, params: Dict[str, Any], priority: Optional[int]):
+        self.type, self.every, self.params, self.priority = job_type, every, params, priority
+        self.next_at = 0.0  # first run as soon as the scheduler starts
+
+
+def _dedup_key(params: Dict[str, Any]) -> str:
+    return json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def _iso(t: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(t, timezone.utc).isoformat() if t else None
+
+
+def _public(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "type": row["type"],
+        "status": row["status"],
+        "priority": row["priority"],
+        "params": json.loads(row["params"]),
+        "attempts": row["attempts"],
+        "cancel_requested": bool(row["cancel_requested"]),
+        "result": json.loads(row["result"]) if row["result"] is not None else None,
+        "error": row["error"],
+        "created_at": _iso(row["created_at"]),
+        "started_at": _iso(row["started_at"]),
+        "finished_at": _iso(row["finished_at"]),
+    }
+
+
+class Scheduler:
+    def __init__(self, workers: int = WORKERS):
+        self.workers = workers
+        self.types: Dict[str, JobType] = {}
+        self.schedules: List[_Schedule] = []
+        self._running: Dict[int, str] = {}  # job id -> type, this process only
+        self._cancelled: set = set()
+        self._lock = threading.Lock()
+        self._finished = threading.Condition(self._lock)
+        self._wake = threading.Event()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._local = threading.local()
+        self._housekept = 0.0
+
+    # ----------------------------- registration -------------------------------
+
+    def register(self, name: str, fn: Callable[..., Any], concurrency: int = 1, priority: int = 0) -> None:
+        self.types[name] = JobType(name, fn, max(1, concurrency), priority)
+
+    def schedule(self, name: str, every_sec: float, params: Optional[Dict[str, Any]] = None,
+                 priority: Optional[int] = None) -> None:
+        if name not in self.types:
+            raise UnknownJobType(name)
+        params = params or {}
+        # registering the same schedule again (app restarted in-process) replaces it
+        self.schedules = [s for s in self.schedules if (s.type, s.params) != (name, params)]
+        self.schedules.append(_Schedule(name, every_sec, params, priority))
+        self._wake.set()
+
+    # -------------------------------- clients ---------------------------------
+
+    def submit(self, name: str, params: Optional[Dict[str, Any]] = None, priority: Optional[int] = None) -> Dict[str, Any]:
+        """Queue a job (or find the identical pending one); the job dict has `deduplicated`."""
+        jt = self.types.get(name)
+        if jt is None:
+            raise UnknownJobType(name)
+        params = params or {}
+        key = _dedup_key(params)
+        job_id, created = db.insert_job(name, key, key, jt.priority if priority is None else priority, time.time())
+        self._wake.set()
+        return {**self.get(job_id), "deduplicated": not created}
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        row = db.get_job(job_id)
+        return _public(row) if row else None
+
+    def list(self, status: Optional[str] = None, job_type: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        return [_public(r) for r in db.list_jobs(status, job_type, limit)]
+
+    def cancel(self, job_id: int) -> Optional[Dict[str, Any]]:
+        status = db.cancel_job(job_id, time.time())
+        if status is None:
+            return None
+        with self._lock:
+            if job_id in self._running:
+                self._cancelled.add(job_id)
+        return self.get(job_id)
+
+    def wait(self, job_id: int, timeout: float) -> Optional[Dict[str, Any]]:
+        """The job once finished, or as it is after `timeout` seconds."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            left = deadline - time.monotonic()
+            if job is None or job["status"] in db.JOB_FINAL or left <= 0:
+                return job
+            with self._finished:
+                # woken by local jobs; jobs run by another worker are seen on the next poll
+                self._finished.wait(min(left, 0.25))
+
+    def cancel_requested(self) -> bool:
+        """True inside a job that has been cancelled (for functions that can stop early)."""
+        job_id = getattr(self._local, "job_id", None)
+        return job_id is not None and job_id in self._cancelled
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            running = list(self._running.values())
+        return {
+            "workers": self.workers,
+            "running": {t: running.count(t) for t in set(running)},
+            "types": {t.name: {"concurrency": t.concurrency, "priority": t.priority} for t in self.types.values()},
+            "schedules": [{"type": s.type, "every_sec": s.every, "params": s.params} for s in self.schedules],
+        }
+
+    # -------------------------------- workers ---------------------------------
+
+    def start(self) -> None:
+        """Start the dispatcher (once per process)."""
+        if self._thread is not None:
+            return
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        self._thread = threading.Thread(target=self._loop, name="job-dispatcher", daemon=True)
+        self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                self._tick()
+            except Exception:
+                logger.exception("job dispatcher round failed")
+            self._wake.wait(POLL_SEC)
+            self._wake.clear()
+
+    def _tick(self) -> None:
+        now = time.time()
+        for s in self.schedules:
+            if now >= s.next_at:
+                s.next_at = now + s.every
+                self.submit(s.type, s.params, s.priority)
+        if now - self._housekept >= HEARTBEAT_SEC:
+            self._housekept = now
+            self._housekeep(now)
+        self._dispatch()
+
+    def _housekeep(self, now: float) -> None:
+        with self._lock:
+            ids = list(self._running)
+        db.heartbeat_jobs(ids, now)
+        flagged = db.job_cancel_requested(ids)  # cancels sent to another worker
+        if flagged:
+            with self._lock:
+                self._cancelled.update(flagged)
+        requeued, failed = db.requeue_stale_jobs(now - 3 * HEARTBEAT_SEC, MAX_ATTEMPTS, now)
+        if requeued or failed:
+            logger.warning("jobs of a lost worker: %d requeued, %d failed", requeued, failed)
+        db.prune_jobs(now - RETENTION_SEC)
+
+    def _dispatch(self) -> None:
+        with self._lock:
+            free = self.workers - len(self._running)
+            busy = list(self._running.values())
+        if free <= 0:
+            return
+        open_types = [t.name for t in self.types.values() if busy.count(t.name) < t.concurrency]
+        for job in db.queued_jobs(open_types, limit=free * 4):
+            jt = self.types[job["type"]]
+            with self._lock:
+                if len(self._running) >= self.workers:
+                    return
+                if sum(1 for t in self._running.values() if t == jt.name) >= jt.concurrency:
+                    continue
+                if not db.claim_job(job["id"], time.time()):
+                    continue  # another worker, or cancelled meanwhile
+                self._running[job["id"]] = jt.name
+                JOBS_RUNNING.set(sum(1 for t in self._running.values() if t == jt.name), type=jt.name)
+            self._pool.submit(self._run, job["id"], jt, job["params"])
+
+    def _run(self, job_id: int, jt: JobType, params: str) -> None:
+        self._local.job_id = job_id
+        t0 = time.perf_counter()
+        result = error = None
+        status = "done"
+        try:
+            result = json.dumps(jt.fn(**json.loads(params)), default=str)
+        except Exception as e:
+            logger.exception("job %s (%s) failed", job_id, jt.name)
+            status, error = "failed", f"{type(e).__name__}: {e}"
+        finally:
+            self._local.job_id = None
+        try:
+            status = db.finish_job(job_id, status, result, error, time.time())
+        except Exception:
+            logger.exception("could not record the outcome of job %s", job_id)  # requeued once stale
+        JOBS.inc(type=jt.name, status=status)
+        JOB_SECONDS.observe(time.perf_counter() - t0, type=jt.name)
+        with self._finished:
+            self._running.pop(job_id, None)
+            self._cancelled.discard(job_id)
+            JOBS_RUNNING.set(sum(1 for t in self._running.values() if t == jt.name), type=jt.name)
+            self._finished.notify_all()
+        self._wake.set()
+
+
+scheduler = Scheduler()
+
+register = scheduler.register
+schedule = scheduler.schedule
+submit = scheduler.submit
+get = scheduler.get
+cancel = scheduler.cancel
+wait = scheduler.wait
+cancel_requested = scheduler.cancel_requested
+start = scheduler.start
+list_jobs = scheduler.list
+stats = scheduler.stats
@@ -1,10 +1,32 @@
 # app/services/labeler.py
-from typing import List, Dict, Any
+"""
+Log labeling: keyword rules, then the LLM for what the rules miss.
+
+Two entry points:
+  - label_inline(rows): the ingest stage, run on every parsed batch before
+    insert. Rules, labels already learned for the message template, then
+    the majority label of the row's correlation within the batch; anything
+    left gets a provisional "other" and is returned so the ingestor can
+    queue it (submit) once the rows have ids.
+  - label_recent_logs(limit): the on-demand pass behind /labeler/analyze,
+    run as a `label_recent` background job.
+
+The async queue is drained by one background thread (start_async, from
+main.py): one LLM call per distinct template, the answer is remembered for
+that template and written back with db.upsert_log_labels.
+"""
+from collections import Counter, deque
+from typing import Callable, List, Dict, Any, Optional
 from app.store import db
-from app.services.llm_client import _init_model
+from app.services import recent_logs
+from app.services.log_parser import message_template
+from app.metrics import LABELER_ROWS, LABELER_INLINE, LABELER_QUEUE, track_cache
+import logging
+import threading
 import time
 import os
-from collections import defaultdict, Counter
+
+logger = logging.getLogger(__name__)
 
 # Supported labels
 CANDIDATE_LABELS = [
@@ -42,19 +64,37 @@ def ai_label_for_message(message: str, endpoint: str = "", corr_id: str = "", _a
     # 1) rules
     rule = _rule_label(message)
     if rule:
+        LABELER_ROWS.inc(via="rule")
         return rule
 
     # 2) memoize by normalized message
     key = (message or "").strip().lower()
-    if key in _LABEL_CACHE:
+    hit = key in _LABEL_CACHE
+    track_cache("label", hit)
+    if hit:
+        LABELER_ROWS.inc(via="cache")
         return _LABEL_CACHE[key]
 
     # 3) guardrail
     if _ai_calls[0] >= MAX_AI_CALLS_PER_RUN:
+        LABELER_ROWS.inc(via="budget_exhausted")
         return "other"
 
     # 4) Gemini fallback
+    _ai_calls[0] += 1
+    label = _llm_label(message, endpoint, corr_id)
+    if label is None:
+        LABELER_ROWS.inc(via="ai_error")
+        return "other"
+    _LABEL_CACHE[key] = label
+    LABELER_ROWS.inc(via="ai")
+    return label
+
+def _llm_label(message: str, endpoint: str = "", corr_id: str = "") -> Optional[str]:
+    """One LLM classification (normalized to CANDIDATE_LABELS); None if the call failed."""
     try:
+        # imported here: the ingest profile uses the rules without loading the LLM client
+        from app.services.llm_client import _init_model
         model = _init_model()
         prompt = (
             "Classify the issue message into ONE label from this list: "
@@ -62,29 +102,24 @@ def ai_label_for_message(message: str, endpoint: str = "", corr_id: str = "", _a
             "Return only the label.\n\n"
             f"Message: {message}\nEndpoint: {endpoint}\nCorrelationID: {corr_id}"
         )
-        _ai_calls[0] += 1
         resp = model.generate_content(prompt)
         time.sleep(SLEEP_BETWEEN_AI_CALLS)
-        label = (resp.text or "").strip().lower().replace(" ", "_")
-        if label not in CANDIDATE_LABELS:
-            label = "other"
-        _LABEL_CACHE[key] = label
-        return label
     except Exception:
-        return "other"
+        return None
+    label = (resp.text or "").strip().lower().replace(" ", "_")
+    return label if label in CANDIDATE_LABELS else "other"
 
-def _majority_label(items: List[Dict[str, Any]]) -> str:
-    counts = Counter([i["label"] for i in items])
-    # prefer non-"other" on ties
-    majority = max(counts.items(), key=lambda kv: (kv[0] != "other", kv[1]))[0]
-    return majority
-
-def label_recent_logs(limit: int = 500) -> List[Dict[str, Any]]:
-    """Label recent logs; apply correlation_id majority; persist labels."""
+def label_recent_logs(limit: int = 500, should_stop: Optional[Callable[[], bool]] = None) -> List[Dict[str, Any]]:
+    """
+    Label recent logs; apply correlation_id majority; persist labels.
+    should_stop() is checked between rows; rows labeled so far are still saved.
+    """
     rows = db.fetch_recent_logs(limit=limit)
     provisional = []
     ai_counter = [0]
     for r in rows:
+        if should_stop is not None and should_stop():
+            break
         lbl = ai_label_for_message(
             r.get("message", ""),
             r.get("endpoint", ""),
@@ -93,28 +128,172 @@ def label_recent_logs(limit: int = 500) -> List[Dict[str, Any]]:
         )
         provisional.append({**r, "label": lbl})
 
-    # group by correlation_id and apply majority vote
-    by_corr: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    # persist provisional labels; this also updates each correlation's label counts
+    db.upsert_log_labels(provisional)
+
+    # majority vote per correlation_id is maintained by the store: one read per id
+    majorities = db.correlation_majorities([i["correlation_id"] for i in provisional if i.get("correlation_id")])
+    relabel = []
     for item in provisional:
-        by_corr[item.get("correlation_id")].append(item)
+        majority = majorities.get(item.get("correlation_id"))
+        if majority and majority != item["label"]:
+            item["label"] = majority
+            relabel.append(item)
+    db.upsert_log_labels(relabel)
 
-    resolved: List[Dict[str, Any]] = []
-    for corr_id, items in by_corr.items():
-        if not corr_id:  # no corr id: keep as-is
-            resolved.extend(items)
-            continue
-        majority = _majority_label(items)
-        for i in items:
-            i["label"] = majority
-        resolved.extend(items)
-
-    # persist
-    out = []
-    for item in resolved:
-        db.upsert_log_label(item["id"], item["label"])
-        out.append({"id": item["id"], "label": item["label"]})
+    out = [{"id": item["id"], "label": item["label"]} for item in provisional]
+    recent_logs.update_labels(out)
     return out
 
+def label_recent_job(limit: int = 300) -> Dict[str, Any]:
+    """`label_recent` job (see app/services/jobs.py); stops early when cancelled."""
+    from app.services import jobs
+    return {"labeled": label_recent_logs(limit, should_stop=jobs.cancel_requested)}
+
+# ------------------------- inline (ingest) stage ------------------------------
+
+INLINE_ENABLED = os.getenv("LABELER_INLINE", "1").lower() in ("1", "true", "yes")
+INLINE_BUDGET_MS = float(os.getenv("LABELER_INLINE_BUDGET_MS", "20"))  # per batch; the rest goes to the queue
+PROVISIONAL_LABEL = "other"
+
+# template -> label learned from the LLM (the async worker fills it)
+_TEMPLATE_LABELS: Dict[str, str] = {}
+TEMPLATE_LABELS_MAX = int(os.getenv("LABELER_TEMPLATE_CACHE", "50000"))
+
+def label_inline(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Give every row of a parsed batch a label in place; returns the rows that
+    only got the provisional one (to submit() after insert). Rules win over
+    everything; the per-batch time budget caps the cost of huge batches.
+    """
+    if not INLINE_ENABLED or not rows:
+        return []
+    t0 = time.perf_counter()
+    deadline = t0 + INLINE_BUDGET_MS / 1000.0
+    via: Counter = Counter()
+    unresolved: List[Dict[str, Any]] = []
+    votes: Dict[str, Counter] = {}
+    for i, r in enumerate(rows):
+        if r.get("label"):
+            continue
+        if i & 255 == 0 and time.perf_counter() > deadline:
+            unresolved.extend(x for x in rows[i:] if not x.get("label"))
+            via["over_budget"] += len(rows) - i
+            break
+        msg = r.get("message") or ""
+        label = _rule_label(msg)
+        if label:
+            via["rule"] += 1
+        elif _TEMPLATE_LABELS:
+            label = _TEMPLATE_LABELS.get(message_template(msg))
+            if label:
+                via["template"] += 1
+        if label is None:
+            unresolved.append(r)
+            continue
+        r["label"] = label
+        cid = r.get("correlation_id")
+        if cid:
+            votes.setdefault(cid, Counter())[label] += 1
+
+    pending = []
+    for r in unresolved:
+        ballot = votes.get(r.get("correlation_id"))
+        if ballot:
+            r["label"] = ballot.most_common(1)[0][0]
+            via["correlation"] += 1
+        else:
+            r["label"] = PROVISIONAL_LABEL
+            pending.append(r)
+    via["pending"] += len(pending)
+    for k, n in via.items():
+        LABELER_ROWS.inc(n, via=k)
+    LABELER_INLINE.observe(time.perf_counter() - t0)
+    return pending
+
+# ------------------------------ async LLM queue -------------------------------
+
+QUEUE_MAX = int(os.getenv("LABELER_QUEUE_MAX", "10000"))
+ASYNC_INTERVAL_SEC = float(os.getenv("LABELER_ASYNC_INTERVAL_SEC", "2"))
+ASYNC_MAX_CALLS = int(os.getenv("LABELER_ASYNC_MAX_CALLS", "20"))  # LLM calls per round
+
+_queue: deque = deque()
+_queue_lock = threading.Lock()
+_wakeup = threading.Event()
+_worker: Optional[threading.Thread] = None
+
+def submit(rows: List[Dict[str, Any]]) -> None:
+    """Queue inserted rows (with ids) for LLM labeling; no-op unless start_async() ran."""
+    if _worker is None or not rows:
+        return
+    dropped = 0
+    with _queue_lock:
+        for r in rows:
+            if r.get("id") is None:
+                continue
+            if len(_queue) >= QUEUE_MAX:
+                dropped += 1
+                continue
+            _queue.append((r["id"], r.get("message") or "", r.get("endpoint") or "", r.get("correlation_id") or ""))
+        LABELER_QUEUE.set(len(_queue))
+    if dropped:
+        LABELER_ROWS.inc(dropped, via="queue_full")
+    _wakeup.set()
+
+def drain_once(max_calls: int = ASYNC_MAX_CALLS) -> int:
+    """Label queued rows, one LLM call per template; returns rows labeled."""
+    with _queue_lock:
+        batch = list(_queue)
+        _queue.clear()
+    if not batch:
+        return 0
+    by_template: Dict[str, list] = {}
+    for item in batch:
+        by_template.setdefault(message_template(item[1]), []).append(item)
+    updates, leftover, calls = [], [], 0
+    for tpl, items in by_template.items():
+        label = _TEMPLATE_LABELS.get(tpl)
+        if label is None:
+            if calls >= max_calls:
+                leftover.extend(items)
+                continue
+            calls += 1
+            _, message, endpoint, corr = items[0]
+            label = _llm_label(message, endpoint, corr)
+            if label is None:
+                LABELER_ROWS.inc(len(items), via="ai_error")
+                continue  # these keep the provisional label
+            if len(_TEMPLATE_LABELS) < TEMPLATE_LABELS_MAX:
+                _TEMPLATE_LABELS[tpl] = label
+        LABELER_ROWS.inc(len(items), via="ai_async")
+        if label != PROVISIONAL_LABEL:
+            updates.extend({"id": i[0], "label": label} for i in items)
+    with _queue_lock:
+        # over this round's call budget: back to the front, ahead of newer rows
+        _queue.extendleft(reversed(leftover))
+        LABELER_QUEUE.set(len(_queue))
+    if updates:
+        db.upsert_log_labels(updates)
+        recent_logs.update_labels(updates)
+    return len(updates)
+
+def _run() -> None:
+    while True:
+        _wakeup.wait(ASYNC_INTERVAL_SEC)
+        _wakeup.clear()
+        try:
+            drain_once()
+        except Exception:
+            logger.exception("async labeling round failed")
+        time.sleep(ASYNC_INTERVAL_SEC)  # at most one round per interval
+
+def start_async() -> None:
+    """Start the queue worker (once per process)."""
+    global _worker
+    if _worker is None:
+        _worker = threading.Thread(target=_run, name="labeler-async", daemon=True)
+        _worker.start()
+
 def label_stats() -> Dict[str, int]:
     """Return histogram of labels from DB."""
     return db.count_labels()
@@ -0,0 +1,191 @@
+# app/services/llm_backends.py
+"""
+LLM backends behind llm_client._init_model().
+
+Every backend exposes the slice of the Gemini SDK model the app uses:
+`generate_content(prompt)` returning an object with `.text` and
+`.usage_metadata` (prompt_token_count / candidates_token_count).
+
+  LLM_BACKEND=gemini  (default) google.generativeai model
+  LLM_BACKEND=fake    deterministic local stand-in for load tests / CI
+
+Fake backend knobs (env):
+  FAKE_LLM_LATENCY_MS      median latency (default 0)
+  FAKE_LLM_LATENCY_SIGMA   lognormal spread, 0 = fixed (default 0.5)
+  FAKE_LLM_ERROR_RATE      fraction of calls raising LLMError (default 0)
+  FAKE_LLM_429_RATE        fraction of calls raising RateLimitError (default 0)
+  FAKE_LLM_SEED            RNG seed for latency/fault injection (default 0)
+"""
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+
+class LLMError(RuntimeError):
+    """Provider call failed."""
+
+
+class RateLimitError(LLMError):
+    """Provider answered 429 / resource exhausted."""
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text or "") + 3) // 4
+
+
+class UsageMetadata:
+    __slots__ = ("prompt_token_count", "candidates_token_count", "total_token_count")
+
+    def __init__(self, prompt_tokens: int, output_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class LLMResponse:
+    __slots__ = ("text", "usage_metadata")
+
+    def __init__(self, text: str, usage_metadata: Optional[UsageMetadata] = None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+# ------------------------------- Gemini SDK ----------------------------------
+
+class GeminiBackend:
+    name = "gemini"
+
+    def __init__(self, api_key: str, model_id: str):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model_id = model_id
+        self._model = genai.GenerativeModel(model_id)
+
+    def generate_content(self, prompt: str):
+        return self._model.generate_content(prompt)
+
+
+# ------------------------------- local fake ----------------------------------
+
+FAKE_QUESTIONS = [
+    "What endpoint or URL were you calling when the error occurred?",
+    "Do you have a correlation ID from the error screen or response headers?",
+    "When did this last work for you?",
+    "Are you using a personal or a corporate account?",
+    "Does it reproduce on another machine or with another account?",
+    "Roughly what time did the failure happen (HH:MM)?",
+]
+
+_MESSAGE_LINE = re.compile(r"(?:POF )?Message:\s*(.*)")
+_ENDPOINT_LINE = re.compile(r"Endpoint:\s*(.*)")
+
+
+class FakeBackend:
+    """Deterministic, rule-derived answers with configurable latency and faults."""
+
+    name = "fake"
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        latency_sigma: float = 0.5,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.model_id = "fake-llm"
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "errors": 0, "rate_limited": 0, "prompt_tokens": 0, "output_tokens": 0}
+
+    @classmethod
+    def from_env(cls) -> "FakeBackend":
+        return cls(
+            latency_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", "0")),
+            latency_sigma=float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.5")),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.getenv("FAKE_LLM_429_RATE", "0")),
+            seed=int(os.getenv("FAKE_LLM_SEED", "0")),
+        )
+
+    def _draw(self):
+        with self._lock:
+            self.counters["calls"] += 1
+            roll = self._rng.random()
+            if self.latency_ms > 0 and self.latency_sigma > 0:
+                delay = self.latency_ms * math.exp(self._rng.gauss(0.0, self.latency_sigma))
+            else:
+                delay = self.latency_ms
+        return roll, delay / 1000.0
+
+    def generate_content(self, prompt: str) -> LLMResponse:
+        roll, delay = self._draw()
+        if delay:
+            time.sleep(delay)
+        if roll < self.rate_limit_rate:
+            with self._lock:
+                self.counters["rate_limited"] += 1
+            raise RateLimitError("429 Resource has been exhausted (fake backend)")
+        if roll < self.rate_limit_rate + self.error_rate:
+            with self._lock:
+                self.counters["errors"] += 1
+            raise LLMError("500 Internal error (fake backend)")
+
+        text = self.answer(prompt)
+        usage = UsageMetadata(estimate_tokens(prompt), estimate_tokens(text))
+        with self._lock:
+            self.counters["prompt_tokens"] += usage.prompt_token_count
+            self.counters["output_tokens"] += usage.candidates_token_count
+        return LLMResponse(text, usage)
+
+    @staticmethod
+    def answer(prompt: str) -> str:
+        """Pure function of the prompt, so runs are reproducible."""
+        m = _MESSAGE_LINE.search(prompt)
+        message = m.group(1).strip() if m else ""
+        m = _ENDPOINT_LINE.search(prompt)
+        endpoint = m.group(1).strip() if m else ""
+
+        if '"question"' in prompt:
+            idx = zlib.crc32(prompt.encode("utf-8")) % len(FAKE_QUESTIONS)
+            return json.dumps({"question": FAKE_QUESTIONS[idx], "stop": False})
+        if prompt.lstrip().startswith("Classify"):
+            from app.services.labeler import _rule_label  # lazy: labeler imports llm_client
+
+            return _rule_label(message) or "other"
+        if prompt.lstrip().startswith("Summarize"):
+            from app.services.labeler import _rule_label
+
+            label = _rule_label(message) or "unclassified error"
+            return f"{label.replace('_', ' ')} on {endpoint or 'unknown endpoint'}.\nFirst seen: {message[:80] or '-'}"
+        if prompt.strip().lower() == "ping":
+            return "pong"
+        return "[fake] " + " ".join(prompt.split())[:120]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counters)
+
+
+def create_backend(kind: Optional[str] = None):
+    """Build the backend selected by LLM_BACKEND (or `kind`)."""
+    kind = (kind or os.getenv("LLM_BACKEND", "gemini")).strip().lower()
+    if kind == "fake":
+        return FakeBackend.from_env()
+    if kind == "gemini":
+        api_key = os.getenv("GEMINI_API_KEY") or os.getenv("LLM_API_KEY")
+        if not api_key:
+            raise RuntimeError("Set GEMINI_API_KEY (or LLM_API_KEY) in your .env")
+        return GeminiBackend(api_key, os.getenv("GEMINI_MODEL", "gemini-2.5-flash"))
+    raise RuntimeError(f"Unknown LLM_BACKEND '{kind}' (expected gemini|fake)")
@@ -2,12 +2,17 @@
 import os
 from typing import Optional
 from dotenv import load_dotenv, find_dotenv
-import google.generativeai as genai
+from app.services.llm_backends import create_backend
+from app.metrics import InstrumentedBackend
+from app.services.resilience import GuardedBackend
 
 _model = None  # cached model instance
 
 def _init_model():
-    """Load .env and initialize the Gemini model once."""
+    """
+    Load .env and initialize the configured LLM backend once
+    (LLM_BACKEND=gemini|fake, see app/services/llm_backends.py).
+    """
     global _model
     if _model is not None:
         return _model
@@ -15,21 +20,30 @@ def _init_model():
     # Load .env from project root (works with reloader/spawn too)
     load_dotenv(find_dotenv())
 
-    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("LLM_API_KEY")
-    if not api_key:
-        raise RuntimeError("Set GEMINI_API_KEY (or LLM_API_KEY) in your .env")
-
-    genai.configure(api_key=api_key)
-    model_id = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
-    _model = genai.GenerativeModel(model_id)
+    # breaker + latency budget outside, provider metrics inside
+    _model = GuardedBackend(InstrumentedBackend(create_backend()))
     return _model
 
+def warm() -> bool:
+    """Import the SDK and build the model ahead of the first request; never raises."""
+    try:
+        _init_model()
+        return True
+    except Exception:
+        return False
+
 def ping_gemini():
     """Simple health check."""
     try:
         model = _init_model()
         resp = model.generate_content("ping")
-        return {"ok": True, "model": os.getenv("GEMINI_MODEL", "gemini-2.5-flash"), "response": resp.text[:200]}
+        model_id = getattr(model, "model_id", None) or os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+        return {
+            "ok": True,
+            "backend": getattr(model, "name", "gemini"),
+            "model": model_id,
+            "response": resp.text[:200],
+        }
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
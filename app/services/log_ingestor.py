@@ -1,7 +1,42 @@
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Optional
 from app.services.log_parser import parse_payload
+from app.services import labeler, log_stream, recent_logs
+from app.metrics import INGEST_ROWS, INGEST_BATCHES, INGEST_DUPLICATES
 from app.store import db
 
 def ingest(payload) -> int:
+    return ingest_batch(payload)["ingested"]
+
+def ingest_batch(payload, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Parse + store one batch. Returns {ingested, duplicates, sampled, replayed}
+    (sampled: low-severity rows dropped by ingest sampling, counted but not
+    stored); a replayed Idempotency-Key writes nothing and reports the first
+    batch's numbers.
+    """
+    t0 = time.perf_counter()
     rows = parse_payload(payload)
-    return db.insert_logs(rows)
+    # every row leaves here labeled; rule misses carry a provisional label until the LLM queue gets to them
+    pending = labeler.label_inline(rows)
+    stored: List[Dict[str, Any]] = []
+    try:
+        count = db.insert_logs(rows, idempotency_key=idempotency_key, stored=stored)
+    except db.DuplicateBatch as dup:
+        INGEST_DUPLICATES.inc(kind="batch")
+        return {"ingested": dup.rows, "duplicates": dup.duplicates, "sampled": dup.sampled, "replayed": True}
+    sampled = sum(1 for r in rows if r.get("sampled"))
+    duplicates = sum(1 for r in rows if r.get("id") is None) - sampled
+    if duplicates:
+        INGEST_DUPLICATES.inc(duplicates, kind="row")
+    # parked rows of earlier batches rescued by sampling: queued for the LLM only now
+    # (they had no id when their batch was labeled), and shown in the ring / tail
+    batch = {id(r) for r in rows}
+    rescued = [r for r in stored if id(r) not in batch and r.get("label") == labeler.PROVISIONAL_LABEL]
+    labeler.submit(pending + rescued)
+    recent_logs.record(stored)
+    # push to live tail subscribers (in-memory fan-out, no DB reads)
+    log_stream.publish(stored)
+    INGEST_ROWS.inc(count)
+    INGEST_BATCHES.observe(time.perf_counter() - t0)
+    return {"ingested": count, "duplicates": duplicates, "sampled": sampled, "replayed": False}
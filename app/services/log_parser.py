@@ -1,17 +1,40 @@
 import re
 import json
 from typing import Dict, Any, List, Optional
-from dateutil import parser as dtp
+from datetime import datetime
 from app.config import CORRELATION_ID_REGEX, ENDPOINT_REGEX, ACCOUNT_HINT_REGEX, ERROR_LEVELS
+from app.store.codec import readable_template, split_message
+
+# orjson when installed (several times faster on bulk JSONL); the stdlib otherwise
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
 
 CID = re.compile(CORRELATION_ID_REGEX)
 URL = re.compile(ENDPOINT_REGEX)
 ACC = re.compile(ACCOUNT_HINT_REGEX, re.IGNORECASE)
 
+def message_template(msg: Optional[str]) -> str:
+    """
+    Collapse ids, URLs and numbers so repeated log lines share one template:
+    the storage template of app.store.codec, shown with <*> holes, so the
+    labeler, prompts and analytics all group by the same template.
+    """
+    template, params = split_message(msg or "")
+    return readable_template(template) if template is not None else params
+
 def normalize_ts(ts: Optional[str]) -> Optional[str]:
     if not ts:
         return None
+    # ISO-8601 (what shippers send) parses natively; dateutil is the slow fallback
+    try:
+        return datetime.fromisoformat(ts).isoformat()
+    except (TypeError, ValueError):
+        pass
     try:
+        from dateutil import parser as dtp
         return dtp.parse(ts).isoformat()
     except Exception:
         return None
@@ -29,51 +52,87 @@ def level_from_message(level: Optional[str], msg: Optional[str]) -> Optional[str
                 return e
     return level or "INFO"
 
+# Parsed row layout (tuples from parse_rows; parse_payload zips them into dicts)
+ROW_FIELDS = ("source", "ts", "level", "message", "correlation_id", "endpoint", "account")
+
+def parse_row(raw: Dict[str, Any]) -> tuple:
+    """One decoded record -> ROW_FIELDS tuple."""
+    get = raw.get
+    msg = get("message") or get("msg") or get("log") or ""
+    cid, endpoint, account = get("correlation_id"), get("endpoint"), get("account")
+    text = None
+    # the id / URL / account search over the whole record only runs for fields the record lacks
+    if not (msg and cid and endpoint and account):
+        text = json.dumps(raw, default=str) + " " + (msg or "")
+        if not cid:
+            m = CID.search(text)
+            cid = m.group(0) if m else None
+        if not endpoint:
+            m = URL.search(text)
+            endpoint = m.group(0) if m else None
+        if not account:
+            m = ACC.search(text)
+            account = m.group(0).lower() if m else None
+    return (
+        get("source") or get("logger") or get("service"),
+        normalize_ts(get("timestamp") or get("@timestamp") or get("time") or get("ts")),
+        level_from_message(get("level"), msg),
+        msg or text[:512],
+        cid,
+        endpoint,
+        account,
+    )
+
 def parse_one(raw: Dict[str, Any]) -> Dict[str, Any]:
-    msg = raw.get("message") or raw.get("msg") or raw.get("log") or ""
-    text = json.dumps(raw, default=str) + " " + (msg or "")
-    found_cid = None
-    m = CID.search(text)
-    if m:
-        found_cid = m.group(0)
-    found_url = None
-    m2 = URL.search(text)
-    if m2:
-        found_url = m2.group(0)
-    found_acc = None
-    m3 = ACC.search(text)
-    if m3:
-        found_acc = m3.group(0).lower()
-    ts = normalize_ts(raw.get("timestamp") or raw.get("@timestamp") or raw.get("time") or raw.get("ts"))
-    level = level_from_message(raw.get("level"), msg)
-    return {
-        "source": raw.get("source") or raw.get("logger") or raw.get("service"),
-        "ts": ts,
-        "level": level,
-        "message": msg or text[:512],
-        "correlation_id": raw.get("correlation_id") or found_cid,
-        "endpoint": raw.get("endpoint") or found_url,
-        "account": raw.get("account") or found_acc,
-    }
+    return dict(zip(ROW_FIELDS, parse_row(raw)))
 
-def parse_payload(payload: Any) -> List[Dict[str, Any]]:
-    rows: List[Dict[str, Any]] = []
+def decode_json(data) -> Any:
+    return _loads(data)
+
+def decode_lines(data) -> List[Any]:
+    """
+    JSONL (str or bytes) -> decoded records, the whole batch in one decoder
+    call when every line is a JSON object; otherwise line by line, and lines
+    that are not a JSON object become {"message": line}.
+    """
+    body = data.strip()
+    if not body:
+        return []
+    # one line per array element; blank or broken lines make the array invalid
+    if isinstance(body, bytes):
+        wrapped, lines = b"[" + body.replace(b"\n", b",") + b"]", body.count(b"\n") + 1
+    else:
+        wrapped, lines = "[" + body.replace("\n", ",") + "]", body.count("\n") + 1
+    try:
+        objs = _loads(wrapped)
+    except ValueError:
+        objs = None
+    # a line holding several comma-separated values would shift the count
+    if objs is not None and len(objs) == lines and all(type(o) is dict for o in objs):
+        return objs
+    out = []
+    for line in body.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = _loads(line)
+        except ValueError:
+            obj = None
+        if not isinstance(obj, dict):
+            obj = {"message": line.decode(errors="replace") if isinstance(line, bytes) else line}
+        out.append(obj)
+    return out
+
+def parse_rows(payload: Any) -> List[tuple]:
+    """Payload (JSONL str/bytes, list of records, or one record) -> ROW_FIELDS tuples."""
+    if isinstance(payload, (str, bytes)):
+        return [parse_row(obj) for obj in decode_lines(payload)]
     if isinstance(payload, list):
-        for item in payload:
-            rows.append(parse_one(dict(item)))
-        return rows
-    if isinstance(payload, str):
-        for line in payload.splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                obj = json.loads(line)
-            except Exception:
-                obj = {"message": line}
-            rows.append(parse_one(obj))
-        return rows
+        return [parse_row(item if isinstance(item, dict) else {"message": str(item)}) for item in payload]
     if isinstance(payload, dict):
-        rows.append(parse_one(payload))
-        return rows
-    return rows
+        return [parse_row(payload)]
+    return []
+
+def parse_payload(payload: Any) -> List[Dict[str, Any]]:
+    return [dict(zip(ROW_FIELDS, row)) for row in parse_rows(payload)]
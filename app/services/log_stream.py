@@ -0,0 +1,150 @@
+# app/services/log_stream.py
+"""
+In-memory fan-out of freshly ingested log rows to live tail subscribers.
+
+The ingest path calls publish() once per batch; each subscriber owns a
+bounded buffer, so a slow consumer drops its oldest rows (and is told how
+many) instead of growing memory or slowing ingest. Nothing here touches
+the DB.
+"""
+import asyncio
+import itertools
+import os
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from app import metrics
+
+TAIL_BUFFER_SIZE = int(os.getenv("LOG_TAIL_BUFFER", "1000"))
+MAX_SUBSCRIBERS = int(os.getenv("LOG_TAIL_MAX_SUBSCRIBERS", "500"))
+
+_ids = itertools.count(1)
+_lock = threading.Lock()
+_subscribers: Dict[int, "Subscriber"] = {}
+
+
+class Subscriber:
+    """One tail connection: its filters, bounded buffer and drop counter."""
+
+    def __init__(self, filters: Dict[str, Any], maxlen: int, loop: asyncio.AbstractEventLoop):
+        self.id = next(_ids)
+        self.levels = {l.upper() for l in filters.get("levels") or []}
+        self.label = filters.get("label")
+        self.endpoint = filters.get("endpoint")
+        self.correlation_id = filters.get("correlation_id")
+        self.buffer: Deque[Dict[str, Any]] = deque(maxlen=maxlen)
+        self.dropped = 0          # dropped since the last drain
+        self.dropped_total = 0
+        self.delivered_total = 0
+        self._loop = loop
+        self._event = asyncio.Event()
+        self._buf_lock = threading.Lock()
+
+    def matches(self, row: Dict[str, Any]) -> bool:
+        if self.levels and (row.get("level") or "").upper() not in self.levels:
+            return False
+        if self.label and row.get("label") != self.label:
+            return False
+        if self.endpoint and self.endpoint not in (row.get("endpoint") or ""):
+            return False
+        if self.correlation_id and row.get("correlation_id") != self.correlation_id:
+            return False
+        return True
+
+    def push(self, rows: List[Dict[str, Any]]) -> None:
+        """Called from the ingest thread; never blocks on the consumer."""
+        with self._buf_lock:
+            overflow = len(self.buffer) + len(rows) - self.buffer.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+                self.dropped_total += overflow
+            self.buffer.extend(rows)
+        try:
+            self._loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            # event loop already closed; the subscriber is going away
+            pass
+
+    async def next_batch(self, timeout: float = 15.0) -> Tuple[List[Dict[str, Any]], int]:
+        """Wait for rows (or timeout) and return (rows, dropped_since_last_batch)."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._event.clear()
+        with self._buf_lock:
+            rows = list(self.buffer)
+            self.buffer.clear()
+            dropped, self.dropped = self.dropped, 0
+        self.delivered_total += len(rows)
+        return rows, dropped
+
+
+def subscribe(
+    levels: Optional[Iterable[str]] = None,
+    label: Optional[str] = None,
+    endpoint: Optional[str] = None,
+    correlation_id: Optional[str] = None,
+    maxlen: int = TAIL_BUFFER_SIZE,
+) -> Subscriber:
+    """Register a subscriber bound to the running event loop."""
+    filters = {
+        "levels": list(levels or []),
+        "label": label,
+        "endpoint": endpoint,
+        "correlation_id": correlation_id,
+    }
+    sub = Subscriber(filters, maxlen, asyncio.get_running_loop())
+    with _lock:
+        if len(_subscribers) >= MAX_SUBSCRIBERS:
+            raise RuntimeError(f"too many tail subscribers (max {MAX_SUBSCRIBERS})")
+        _subscribers[sub.id] = sub
+    return sub
+
+
+def unsubscribe(sub: Subscriber) -> None:
+    with _lock:
+        _subscribers.pop(sub.id, None)
+
+
+def publish(rows: List[Dict[str, Any]]) -> int:
+    """Fan a freshly inserted batch out to matching subscribers; returns deliveries."""
+    if not rows or not _subscribers:
+        return 0
+    with _lock:
+        subs = list(_subscribers.values())
+    delivered = 0
+    for sub in subs:
+        matched = [r for r in rows if sub.matches(r)]
+        if matched:
+            sub.push(matched)
+            delivered += len(matched)
+    return delivered
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        subs = list(_subscribers.values())
+    return {
+        "subscribers": len(subs),
+        "buffer_size": TAIL_BUFFER_SIZE,
+        "delivered_total": sum(s.delivered_total for s in subs),
+        "dropped_total": sum(s.dropped_total for s in subs),
+    }
+
+
+_SUBSCRIBERS = metrics.gauge("triage_tail_subscribers", "Connected live tail subscribers")
+_BUFFERED = metrics.gauge("triage_tail_buffered_rows", "Rows waiting in tail subscriber buffers")
+_DROPPED = metrics.gauge("triage_tail_dropped_rows", "Rows dropped by connected tail subscribers (lag)")
+
+
+def _collect() -> None:
+    with _lock:
+        subs = list(_subscribers.values())
+    _SUBSCRIBERS.set(len(subs))
+    _BUFFERED.set(sum(len(s.buffer) for s in subs))
+    _DROPPED.set(sum(s.dropped_total for s in subs))
+
+
+metrics.add_collector(_collect)
@@ -0,0 +1,196 @@
+# app/services/profiler.py
+"""
+On-demand profiling for a running worker (mounted under /admin/profile only
+when ADMIN_PROFILING_ENABLED=1, so it costs nothing otherwise).
+
+  - sample_stacks(): wall-clock sampler over all threads, returned as
+    collapsed stacks ("a;b;c 42" per line) for flamegraph.pl / speedscope
+  - allocation_diff(): tracemalloc snapshot diff of the top allocators
+  - route profiling: wraps one route's endpoint with cProfile for the next
+    N requests, then puts the original endpoint back
+"""
+import asyncio
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List
+
+PROFILING_ENABLED = os.getenv("ADMIN_PROFILING_ENABLED", "0").lower() in ("1", "true", "yes")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+MAX_SAMPLE_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+
+_busy = threading.Lock()  # one sampler / tracemalloc run at a time
+
+
+# ------------------------------ stack sampling --------------------------------
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds: float = 10.0, interval_ms: float = 5.0, include_idle: bool = False) -> str:
+    """Sample every thread's stack for `seconds`; returns collapsed-stack text."""
+    seconds = min(max(seconds, 0.1), MAX_SAMPLE_SECONDS)
+    if not _busy.acquire(blocking=False):
+        raise RuntimeError("another profiling run is in progress")
+    try:
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        counts: Counter = Counter()
+        interval = interval_ms / 1000.0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack: List[str] = []
+                f = frame
+                while f is not None:
+                    stack.append(_frame_label(f))
+                    f = f.f_back
+                if not include_idle and stack and stack[0].split(" ", 1)[0] in ("wait", "select", "_wait_for_tstate_lock", "accept", "poll"):
+                    continue
+                stack.append(names.get(ident, f"thread-{ident}"))
+                counts[";".join(reversed(stack))] += 1
+            time.sleep(interval)
+        return "\n".join(f"{stack} {n}" for stack, n in counts.most_common())
+    finally:
+        _busy.release()
+
+
+# ------------------------------ allocations -----------------------------------
+
+def allocation_diff(seconds: float = 10.0, top: int = 25, group_by: str = "lineno") -> List[Dict[str, Any]]:
+    """tracemalloc diff between now and `seconds` later (tracing stops again if we started it)."""
+    seconds = min(max(seconds, 0.1), MAX_SAMPLE_SECONDS)
+    if not _busy.acquire(blocking=False):
+        raise RuntimeError("another profiling run is in progress")
+    started = False
+    try:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+            started = True
+        before = tracemalloc.take_snapshot()
+        time.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]
+        stats = after.filter_traces(filters).compare_to(before.filter_traces(filters), group_by)
+        out = []
+        for st in stats[:top]:
+            frame = st.traceback[0]
+            out.append({
+                "where": f"{frame.filename}:{frame.lineno}",
+                "size_diff_kb": round(st.size_diff / 1024, 1),
+                "size_kb": round(st.size / 1024, 1),
+                "count_diff": st.count_diff,
+                "count": st.count,
+            })
+        return out
+    finally:
+        if started:
+            tracemalloc.stop()
+        _busy.release()
+
+
+# ---------------------------- per-route cProfile ------------------------------
+
+_route_lock = threading.Lock()
+_active: Dict[str, Any] = {}  # {"route", "original", "remaining"}
+_results: Deque[Dict[str, Any]] = deque(maxlen=20)
+
+
+def _record(route_path: str, prof: cProfile.Profile, elapsed: float, top: int = 30) -> None:
+    buf = io.StringIO()
+    pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(top)
+    _results.append({
+        "route": route_path,
+        "at": datetime.utcnow().isoformat(),
+        "elapsed_ms": round(elapsed * 1000.0, 2),
+        "stats": buf.getvalue(),
+    })
+    with _route_lock:
+        if not _active:
+            return
+        _active["remaining"] -= 1
+        if _active["remaining"] <= 0:
+            _restore_locked()
+
+
+def _wrap(route_path: str, fn):
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def profiled(*args, **kwargs):
+            prof = cProfile.Profile()
+            t0 = time.perf_counter()
+            prof.enable()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                prof.disable()
+                _record(route_path, prof, time.perf_counter() - t0)
+    else:
+        @functools.wraps(fn)
+        def profiled(*args, **kwargs):
+            # sync endpoints run in a worker thread; profile that thread
+            prof = cProfile.Profile()
+            t0 = time.perf_counter()
+            prof.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                prof.disable()
+                _record(route_path, prof, time.perf_counter() - t0)
+    return profiled
+
+
+def _restore_locked() -> None:
+    route = _active.get("route")
+    if route is not None:
+        route.dependant.call = _active["original"]
+    _active.clear()
+
+
+def profile_route(app, path: str, method: str = "GET", count: int = 1) -> Dict[str, Any]:
+    """Profile the next `count` requests of the route with template `path`."""
+    method = method.upper()
+    target = None
+    for r in app.routes:
+        if getattr(r, "path", None) == path and method in (getattr(r, "methods", None) or ()):
+            target = r
+            break
+    if target is None or not hasattr(target, "dependant"):
+        raise LookupError(f"no route {method} {path}")
+    with _route_lock:
+        _restore_locked()
+        _active.update({
+            "route": target,
+            "original": target.dependant.call,
+            "remaining": max(1, count),
+            "path": path,
+            "method": method,
+        })
+        target.dependant.call = _wrap(path, target.dependant.call)
+    return {"route": path, "method": method, "count": max(1, count)}
+
+
+def stop_route_profile() -> None:
+    with _route_lock:
+        _restore_locked()
+
+
+def route_profile_status() -> Dict[str, Any]:
+    with _route_lock:
+        active = {k: _active[k] for k in ("path", "method", "remaining")} if _active else None
+    return {"active": active, "results": list(_results)}
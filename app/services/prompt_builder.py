@@ -0,0 +1,188 @@
+# app/services/prompt_builder.py
+"""
+Token-budgeted prompt assembly for the dynamic questioner.
+
+Layout is: static prefix (system hint + output contract, identical on every
+call so provider-side prompt caching can reuse it), then the dynamic part:
+a running summary of older Q&A turns, the last few turns verbatim, similar
+past incidents (closed sessions), what changed in the incident window
+against the window before it, and the recent logs collapsed into counted
+templates. Dynamic sections are trimmed until the estimated size fits the
+budget; the last resort is folding the oldest verbatim turns into the
+summary (the latest turn always stays). A prompt that still does not fit is
+reported as `over_budget` in the stats.
+"""
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.log_parser import message_template
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("QUESTIONER_PROMPT_TOKEN_BUDGET", "1500"))
+VERBATIM_TURNS = int(os.getenv("QUESTIONER_VERBATIM_TURNS", "4"))
+SUMMARY_FIELD_CHARS = 80
+VERBATIM_FIELD_CHARS = 600
+TEMPLATE_CHARS = 160
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap ~4 chars/token estimate (no tokenizer dependency)."""
+    return (len(text) + 3) // 4
+
+
+def _clip(text: Any, limit: int) -> str:
+    t = " ".join(str(text or "").split())
+    return t if len(t) <= limit else t[: limit - 1] + "…"
+
+
+def collapse_logs(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Group rows by (level, label, endpoint, message template), keeping the order
+    of first appearance (rows come most recent first).
+    """
+    groups: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+    for r in rows:
+        tpl = message_template(r.get("message"))
+        key = (r.get("level"), r.get("label"), r.get("endpoint"), tpl)
+        g = groups.get(key)
+        if g is None:
+            g = groups[key] = {
+                "count": 0,
+                "level": r.get("level"),
+                "label": r.get("label"),
+                "endpoint": r.get("endpoint"),
+                "template": _clip(tpl, TEMPLATE_CHARS),
+                "last_ts": r.get("ts"),
+                "correlation_ids": [],
+            }
+        g["count"] += 1
+        cid = r.get("correlation_id")
+        if cid and len(g["correlation_ids"]) < 3 and cid not in g["correlation_ids"]:
+            g["correlation_ids"].append(cid)
+    return list(groups.values())
+
+
+def summarize_turns(answers: List[Dict[str, Any]]) -> str:
+    """One compact line per older turn: 'Q<step>: question -> answer'."""
+    lines = []
+    for a in answers:
+        lines.append(
+            f"Q{a.get('step')}: {_clip(a.get('question'), SUMMARY_FIELD_CHARS)}"
+            f" -> {_clip(a.get('answer') or '-', SUMMARY_FIELD_CHARS)}"
+        )
+    return "\n".join(lines)
+
+
+def _verbatim_json(turns: List[Dict[str, Any]]) -> str:
+    return json.dumps(
+        [
+            {
+                "step": a.get("step"),
+                "question": _clip(a.get("question"), VERBATIM_FIELD_CHARS),
+                "answer": _clip(a.get("answer"), VERBATIM_FIELD_CHARS) if a.get("answer") is not None else None,
+            }
+            for a in turns
+        ],
+        ensure_ascii=False,
+    )
+
+
+def build_prompt(
+    static_prefix: str,
+    logs: List[Dict[str, Any]],
+    answers: List[Dict[str, Any]],
+    budget: int = PROMPT_TOKEN_BUDGET,
+    similar: Optional[List[Dict[str, Any]]] = None,
+    changes: Optional[List[Dict[str, Any]]] = None,
+    hot: Optional[List[Dict[str, Any]]] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """Return (prompt, stats) with the prompt kept under `budget` estimated tokens."""
+    if VERBATIM_TURNS > 0:
+        older, recent = answers[:-VERBATIM_TURNS], answers[-VERBATIM_TURNS:]
+    else:
+        older, recent = answers, []
+    recent_json = _verbatim_json(recent)
+    summary = summarize_turns(older)
+    templates = collapse_logs(logs)
+
+    similar = similar or []
+    changes = changes or []
+    hot = hot or []
+
+    def render(n_templates: int, summary_text: str, n_similar: int, n_changes: int, n_hot: int) -> str:
+        parts = [static_prefix]
+        if summary_text:
+            parts.append("Earlier turns (condensed):\n" + summary_text)
+        parts.append("Latest turns (in order):\n" + recent_json)
+        if n_similar:
+            parts.append(
+                "Similar past incidents (closed sessions, most similar first; score 0-1):\n"
+                + json.dumps(similar[:n_similar], ensure_ascii=False)
+            )
+        if n_changes:
+            parts.append(
+                "Largest increases in the incident window vs the window before it (per-minute rates):\n"
+                + json.dumps(changes[:n_changes], ensure_ascii=False)
+            )
+        if n_hot:
+            parts.append(
+                "Most frequent error endpoints and templates right now (approximate counts):\n"
+                + json.dumps(hot[:n_hot], ensure_ascii=False)
+            )
+        parts.append(
+            "Recent log templates (most recent first; count = repeats):\n"
+            + json.dumps(templates[:n_templates], ensure_ascii=False)
+        )
+        return "\n\n".join(parts)
+
+    n = len(templates)
+    n_similar = len(similar)
+    n_changes = len(changes)
+    n_hot = len(hot)
+    summary_lines = summary.splitlines()
+    prompt = render(n, summary, n_similar, n_changes, n_hot)
+    # 1) keep only the tail of the condensed history
+    while summary_lines and estimate_tokens(prompt) > budget:
+        summary_lines = summary_lines[1:]
+        prompt = render(n, "\n".join(summary_lines), n_similar, n_changes, n_hot)
+    # 2) then the least similar past incidents
+    while n_similar > 0 and estimate_tokens(prompt) > budget:
+        n_similar -= 1
+        prompt = render(n, "\n".join(summary_lines), n_similar, n_changes, n_hot)
+    # 3) then the smallest window changes
+    while n_changes > 0 and estimate_tokens(prompt) > budget:
+        n_changes -= 1
+        prompt = render(n, "\n".join(summary_lines), n_similar, n_changes, n_hot)
+    # 4) then the least frequent current error sources
+    while n_hot > 0 and estimate_tokens(prompt) > budget:
+        n_hot -= 1
+        prompt = render(n, "\n".join(summary_lines), n_similar, n_changes, n_hot)
+    # 5) then drop the least recent log templates
+    while n > 0 and estimate_tokens(prompt) > budget:
+        n -= 1
+        prompt = render(n, "\n".join(summary_lines), n_similar, n_changes, n_hot)
+    # 6) then fold the oldest verbatim turns into the condensed history, and trim that again
+    while len(recent) > 1 and estimate_tokens(prompt) > budget:
+        summary_lines.append(summarize_turns(recent[:1]))
+        recent = recent[1:]
+        recent_json = _verbatim_json(recent)
+        prompt = render(n, "\n".join(summary_lines), n_similar, n_changes, n_hot)
+    while summary_lines and estimate_tokens(prompt) > budget:
+        summary_lines = summary_lines[1:]
+        prompt = render(n, "\n".join(summary_lines), n_similar, n_changes, n_hot)
+
+    tokens = estimate_tokens(prompt)
+    stats = {
+        "prompt_tokens_est": tokens,
+        "budget": budget,
+        "over_budget": tokens > budget,
+        "log_rows": len(logs),
+        "log_templates": n,
+        "turns_verbatim": len(recent),
+        "turns_condensed": len(summary_lines),
+        "similar_incidents": n_similar,
+        "window_changes": n_changes,
+        "heavy_hitters": n_hot,
+        "static_prefix_tokens": estimate_tokens(static_prefix),
+    }
+    return prompt, stats
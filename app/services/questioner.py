@@ -1,8 +1,21 @@
 # app/services/questioner.py
+from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
-from app.store import db
+from app.config import ERROR_LEVELS
+from app.store import db, session_cache, sketches
+from app.services import analytics, recent_logs, similar_incidents
 from app.services.llm_client import _init_model
+from app.services.prompt_builder import build_prompt
 import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# incident window for the "what changed" context when the session has none applied
+DIFF_MINUTES = float(os.getenv("QUESTIONER_DIFF_MINUTES", "60"))
+# "what is failing right now": heavy hitters among errors of the last minutes of ingest
+TOP_MINUTES = float(os.getenv("QUESTIONER_TOP_MINUTES", "15"))
 
 SYSTEM_HINT = (
     "You are an incident triage copilot. Ask ONE best next question at a time, "
@@ -12,9 +25,15 @@ SYSTEM_HINT = (
     "Return JSON with keys: {\"question\": str, \"stop\": bool}. If enough info is gathered, set stop=true."
 )
 
+# Static prefix: identical on every call so provider-side prompt caching applies
+STATIC_PREFIX = (
+    SYSTEM_HINT
+    + "\nReturn ONLY a compact JSON object: {\"question\": str, \"stop\": bool}."
+)
+
 def _recent_labeled_context(limit: int = 25) -> List[Dict[str, Any]]:
-    # Use labeled rows so the model sees categories
-    rows = db.fetch_recent_logs(limit=limit)
+    # Use labeled rows so the model sees categories (served from the in-memory ring)
+    rows = recent_logs.recent(limit=limit)
     # Keep only concise fields to keep tokens down
     out = []
     for r in rows:
@@ -31,22 +50,70 @@ def _recent_labeled_context(limit: int = 25) -> List[Dict[str, Any]]:
 def _answers_so_far(session_id: str) -> List[Dict[str, Any]]:
     return db.get_answers(session_id)
 
-def propose_next_question(session_id: str) -> Dict[str, Any]:
-    model = _init_model()
-    context = {
-        "recent_logs": _recent_labeled_context(),
-        "answers_so_far": _answers_so_far(session_id),
-    }
-    prompt = (
-        SYSTEM_HINT
-        + "\n\nRecent labeled logs (most recent first):\n"
-        + json.dumps(context["recent_logs"], ensure_ascii=False) +
-        "\n\nAnswers so far (in order):\n"
-        + json.dumps(context["answers_so_far"], ensure_ascii=False) +
-        "\n\nReturn ONLY a compact JSON object: {\"question\": str, \"stop\": bool}."
+def _similar_incidents(session_id: str, answers: List[Dict[str, Any]], k: int = 3) -> List[Dict[str, Any]]:
+    # Past incidents matching the transcript so far (nothing to match before the first answer)
+    if not any(a.get("answer") for a in answers):
+        return []
+    try:
+        return similar_incidents.compact(similar_incidents.similar_to_answers(answers, k=k, exclude=session_id))
+    except Exception:
+        logger.exception("similar-incident lookup failed for session=%s", session_id)
+        return []
+
+def _window_changes(session_id: str) -> List[Dict[str, Any]]:
+    # The session's applied window (else the last DIFF_MINUTES) vs the same-length window before it
+    state = session_cache.get(session_id)
+    start, end = (state.window_start, state.window_end) if state else (None, None)
+    if not (start and end):
+        now = datetime.utcnow()
+        start, end = (now - timedelta(minutes=DIFF_MINUTES)).isoformat(), now.isoformat()
+    try:
+        lo, hi = analytics.to_ms(start), analytics.to_ms(end)
+        if analytics.NaT_MS in (lo, hi) or hi <= lo:
+            return []
+        diff = analytics.window_diff(start, end, *analytics.preceding_window(start, end), top=5)
+        return analytics.compact_diff(diff)
+    except Exception:
+        logger.exception("window diff failed for session=%s", session_id)
+        return []
+
+def _heavy_hitters(k: int = 3) -> List[Dict[str, Any]]:
+    # Top error endpoints and templates from the ingest sketches (no log query)
+    if not sketches.ENABLED:
+        return []
+    out = []
+    try:
+        for dim in ("endpoint", "template"):
+            top = sketches.sketches.top(dim, levels=ERROR_LEVELS, minutes=TOP_MINUTES, k=k)
+            out.extend({"by": dim, "value": (it["value"] or "-")[:120], "count": it["count"]} for it in top["items"])
+    except Exception:
+        logger.exception("heavy-hitter lookup failed")
+        return []
+    return out
+
+def propose_next_question(session_id: str, answers: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Ask the model for the next question; pass `answers` when the caller already has the transcript.
+    On any LLM failure (breaker open, budget spent, bad output) returns fallback=True.
+    """
+    if answers is None:
+        answers = _answers_so_far(session_id)
+    prompt, stats = build_prompt(
+        STATIC_PREFIX,
+        _recent_labeled_context(),
+        answers,
+        similar=_similar_incidents(session_id, answers),
+        changes=_window_changes(session_id),
+        hot=_heavy_hitters(),
     )
+    prompt_tokens = stats["prompt_tokens_est"]
+    fallback = False
     try:
+        model = _init_model()
         resp = model.generate_content(prompt)
+        usage = getattr(resp, "usage_metadata", None)
+        if usage is not None and getattr(usage, "prompt_token_count", None):
+            prompt_tokens = usage.prompt_token_count
         text = (resp.text or "").strip()
         # try to find a json object in the text
         start = text.find("{")
@@ -59,10 +126,19 @@ def propose_next_question(session_id: str) -> Dict[str, Any]:
         data = {}
     # Safe fallback
     if not isinstance(data, dict) or "question" not in data:
+        fallback = True
         data = {
             "question": "What endpoint or URL were you trying when the error occurred?",
             "stop": False,
         }
     # clamp stop to bool
     data["stop"] = bool(data.get("stop", False))
+    data["prompt_tokens"] = prompt_tokens
+    data["fallback"] = fallback
+    logger.info(
+        "questioner prompt session=%s tokens=%s est=%s templates=%s/%s turns=%s+%s similar=%s changes=%s hot=%s",
+        session_id, prompt_tokens, stats["prompt_tokens_est"], stats["log_templates"],
+        stats["log_rows"], stats["turns_condensed"], stats["turns_verbatim"], stats["similar_incidents"],
+        stats["window_changes"], stats["heavy_hitters"],
+    )
     return data
@@ -0,0 +1,125 @@
+# app/services/recent_logs.py
+"""
+Process-wide ring buffer of the most recent logs (and most recent errors).
+
+Fed by the ingest path (record) and the labeler (update_labels), read by the
+questioner instead of running ORDER BY ts DESC against SQLite on every turn.
+The first read or write primes the buffers from the DB, so a fresh worker
+still sees history; requests larger than the buffer go straight to the DB.
+"""
+import os
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List
+
+from app.config import ERROR_LEVELS
+from app.store import db
+
+RECENT_LOGS_CAPACITY = int(os.getenv("RECENT_LOGS_CAPACITY", "500"))
+RECENT_ERRORS_CAPACITY = int(os.getenv("RECENT_ERRORS_CAPACITY", "100"))
+
+_FIELDS = ("id", "source", "ts", "level", "message", "correlation_id", "endpoint", "account", "label")
+_ERROR_SET = set(ERROR_LEVELS)
+
+
+class RecentLog:
+    __slots__ = _FIELDS
+
+    def __init__(self, row: Dict[str, Any]):
+        for f in _FIELDS:
+            setattr(self, f, row.get(f))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {f: getattr(self, f) for f in _FIELDS}
+
+
+class _Ring:
+    """Bounded deque plus an id index so label updates are O(1)."""
+
+    def __init__(self, capacity: int):
+        self.items: Deque[RecentLog] = deque(maxlen=capacity)
+        self.by_id: Dict[int, RecentLog] = {}
+
+    def append(self, rec: RecentLog) -> None:
+        if len(self.items) == self.items.maxlen:
+            old = self.items[0]
+            if self.by_id.get(old.id) is old:
+                del self.by_id[old.id]
+        self.items.append(rec)
+        if rec.id is not None:
+            self.by_id[rec.id] = rec
+
+    def newest_first(self, limit: int) -> List[Dict[str, Any]]:
+        ordered = sorted(self.items, key=lambda r: r.ts or "", reverse=True)
+        return [r.as_dict() for r in ordered[:limit]]
+
+
+_lock = threading.Lock()
+_logs = _Ring(RECENT_LOGS_CAPACITY)
+_errors = _Ring(RECENT_ERRORS_CAPACITY)
+_primed = False
+
+
+def _prime_locked() -> None:
+    """Cold start: seed both rings from the DB (oldest first)."""
+    global _primed
+    if _primed:
+        return
+    for r in reversed(db.fetch_recent_logs(limit=RECENT_LOGS_CAPACITY)):
+        _logs.append(RecentLog(r))
+    for r in reversed(db.find_recent_errors(limit=RECENT_ERRORS_CAPACITY)):
+        # share the record object with _logs when present so labels stay in sync
+        _errors.append(_logs.by_id.get(r.get("id")) or RecentLog(r))
+    _primed = True
+
+
+def record(rows: Iterable[Dict[str, Any]]) -> None:
+    """Add freshly inserted rows (must already carry their DB id)."""
+    with _lock:
+        _prime_locked()
+        for r in rows:
+            if r.get("id") is not None and r["id"] in _logs.by_id:
+                continue  # already picked up by priming
+            rec = RecentLog(r)
+            _logs.append(rec)
+            if (rec.level or "").upper() in _ERROR_SET:
+                _errors.append(rec)
+
+
+def update_labels(items: Iterable[Dict[str, Any]]) -> None:
+    """Apply {id, label} updates coming from the labeler."""
+    with _lock:
+        for item in items:
+            for ring in (_logs, _errors):
+                rec = ring.by_id.get(item.get("id"))
+                if rec is not None:
+                    rec.label = item.get("label")
+
+
+def recent(limit: int = 25) -> List[Dict[str, Any]]:
+    """Most recent logs first, same shape as db.fetch_recent_logs (plus source/account)."""
+    if limit > RECENT_LOGS_CAPACITY:
+        return db.fetch_recent_logs(limit=limit)
+    with _lock:
+        _prime_locked()
+        return _logs.newest_first(limit)
+
+
+def recent_errors(limit: int = 20) -> List[Dict[str, Any]]:
+    """Buffered equivalent of db.find_recent_errors."""
+    if limit > RECENT_ERRORS_CAPACITY:
+        return db.find_recent_errors(limit=limit)
+    with _lock:
+        _prime_locked()
+        return _errors.newest_first(limit)
+
+
+def reset() -> None:
+    """Drop buffered rows; the next access re-primes from the DB."""
+    global _primed
+    with _lock:
+        _logs.items.clear()
+        _logs.by_id.clear()
+        _errors.items.clear()
+        _errors.by_id.clear()
+        _primed = False
@@ -0,0 +1,178 @@
+# app/services/resilience.py
+"""
+Circuit breaker + per-request latency budget for LLM calls.
+
+  with latency_budget(8.0) as budget:
+      ...            # every LLM call inside gets at most the remaining time
+      budget.degraded  # True if any call was skipped / timed out / failed
+
+GuardedBackend wraps the LLM backend: when the breaker is open or the
+budget is spent it raises LLMUnavailable immediately, so callers drop to
+their scripted / heuristic fallback instead of waiting on the provider.
+After LLM_BREAKER_COOLDOWN_SEC one trial call is let through (half-open);
+success closes the breaker again.
+
+  LLM_CALL_TIMEOUT_SEC       hard cap per call (default 20)
+  LLM_BREAKER_FAILURES       consecutive failures that open it (default 5)
+  LLM_BREAKER_COOLDOWN_SEC   open -> half-open delay (default 30)
+  LLM_MAX_INFLIGHT           concurrent provider calls (default 16)
+"""
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from app import metrics
+
+LLM_CALL_TIMEOUT_SEC = float(os.getenv("LLM_CALL_TIMEOUT_SEC", "20"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN_SEC = float(os.getenv("LLM_BREAKER_COOLDOWN_SEC", "30"))
+LLM_MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", "16"))
+
+_STATE_VALUE = {"closed": 0, "half_open": 1, "open": 2}
+BREAKER_STATE = metrics.gauge("triage_llm_breaker_state", "LLM circuit breaker (0 closed, 1 half-open, 2 open)")
+SHORT_CIRCUITS = metrics.counter("triage_llm_short_circuit_total", "LLM calls skipped without reaching the provider", ["reason"])
+
+
+class LLMUnavailable(RuntimeError):
+    """LLM call skipped or abandoned (breaker open, budget spent, timeout)."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, cooldown_sec: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_sec = cooldown_sec
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_inflight = False
+        self._lock = threading.Lock()
+
+    def _set(self, state: str) -> None:
+        self.state = state
+        BREAKER_STATE.set(_STATE_VALUE[state])
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown_sec:
+                self._set("half_open")
+                self._trial_inflight = False
+            if self.state == "half_open" and not self._trial_inflight:
+                self._trial_inflight = True  # exactly one probe at a time
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._trial_inflight = False
+            if self.state != "closed":
+                self._set("closed")
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_inflight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set("open")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "failures": self.failures}
+
+
+llm_breaker = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN_SEC)
+
+
+# ------------------------------ latency budget --------------------------------
+
+class Budget:
+    __slots__ = ("deadline", "degraded")
+
+    def __init__(self, seconds: float):
+        self.deadline = time.monotonic() + seconds
+        self.degraded = False
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+
+_budget: contextvars.ContextVar[Optional[Budget]] = contextvars.ContextVar("llm_budget", default=None)
+
+
+@contextmanager
+def latency_budget(seconds: float) -> Iterator[Budget]:
+    budget = Budget(seconds)
+    token = _budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _budget.reset(token)
+
+
+def current_budget() -> Optional[Budget]:
+    return _budget.get()
+
+
+def llm_available() -> bool:
+    """Cheap pre-check: breaker not open and budget not spent (does not take the half-open slot)."""
+    b = _budget.get()
+    if b is not None and b.remaining() <= 0:
+        return False
+    return llm_breaker.state != "open" or time.monotonic() - llm_breaker.opened_at >= llm_breaker.cooldown_sec
+
+
+# ------------------------------- guarded calls --------------------------------
+
+_executor = ThreadPoolExecutor(max_workers=LLM_MAX_INFLIGHT, thread_name_prefix="llm-call")
+
+
+def _short_circuit(reason: str, budget: Optional[Budget]) -> LLMUnavailable:
+    SHORT_CIRCUITS.inc(reason=reason)
+    if budget is not None:
+        budget.degraded = True
+    return LLMUnavailable(reason)
+
+
+class GuardedBackend:
+    """Breaker + timeout wrapper with the same generate_content() surface."""
+
+    def __init__(self, backend, breaker: CircuitBreaker = llm_breaker):
+        self._backend = backend
+        self._breaker = breaker
+        self.name = getattr(backend, "name", "gemini")
+        self.model_id = getattr(backend, "model_id", "")
+
+    def __getattr__(self, item):
+        return getattr(self._backend, item)
+
+    def generate_content(self, prompt: str):
+        budget = _budget.get()
+        timeout = LLM_CALL_TIMEOUT_SEC
+        if budget is not None:
+            timeout = min(timeout, budget.remaining())
+            if timeout <= 0:
+                raise _short_circuit("budget_exhausted", budget)
+        if not self._breaker.allow():
+            raise _short_circuit("breaker_open", budget)
+
+        future = _executor.submit(self._backend.generate_content, prompt)
+        try:
+            resp = future.result(timeout=timeout)
+        except FutureTimeout:
+            future.cancel()
+            self._breaker.record_failure()
+            raise _short_circuit("timeout", budget)
+        except Exception:
+            self._breaker.record_failure()
+            if budget is not None:
+                budget.degraded = True
+            raise
+        self._breaker.record_success()
+        return resp
@@ -0,0 +1,356 @@
+# app/services/similar_incidents.py
+"""
+"Similar past incidents" over closed triage sessions.
+
+Each closed session becomes one document (its answers, the POF message
+template, the endpoint and the AI label) and a MinHash signature of that
+document's word 1/2-grams. Signatures are banded for LSH:
+
+  SIMILAR_NUM_PERM = 64 hashes = SIMILAR_BANDS (16) x 4 rows
+
+so two sessions whose Jaccard similarity is ~0.5 or more share at least one
+band key with high probability. A lookup hashes the query, collects the
+rows sharing a band key and ranks only those by estimated Jaccard (fraction
+of equal MinHash values), all in NumPy.
+
+Band keys live in per-band sorted arrays (binary search) plus a small
+unsorted tail for sessions closed since the last merge; the tail is folded
+in once it holds SIMILAR_TAIL_MAX rows, so closing a session never re-sorts
+the whole index. Rows are persisted in `incident_index` (signature as a
+blob) and other workers' rows are picked up every SIMILAR_REFRESH_SEC.
+"""
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.config import ENDPOINT_REGEX
+from app.metrics import histogram
+from app.services.log_parser import message_template
+from app.store import db
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = int(os.getenv("SIMILAR_NUM_PERM", "64"))
+BANDS = int(os.getenv("SIMILAR_BANDS", "16"))
+ROWS_PER_BAND = NUM_PERM // BANDS
+MIN_SCORE = float(os.getenv("SIMILAR_MIN_SCORE", "0.2"))
+TAIL_MAX = int(os.getenv("SIMILAR_TAIL_MAX", "4096"))
+REFRESH_SEC = float(os.getenv("SIMILAR_REFRESH_SEC", "10"))
+FIELD_CHARS = 160
+
+LOOKUP_SECONDS = histogram("triage_similar_lookup_seconds", "Similar-incident lookups (signature + LSH + ranking)")
+
+_rng = np.random.default_rng(0x5EED)  # fixed: persisted signatures must stay comparable
+_SEEDS = _rng.integers(1, 1 << 63, NUM_PERM, dtype=np.uint64)
+_M1 = np.uint64(0xBF58476D1CE4E5B9)
+_M2 = np.uint64(0x94D049BB133111EB)
+_MIX = _rng.integers(1, 1 << 63, ROWS_PER_BAND, dtype=np.uint64) | np.uint64(1)
+_EMPTY = np.full(NUM_PERM, np.iinfo(np.uint32).max, dtype=np.uint32)
+
+_WORD = re.compile(r"[a-z0-9_<>][a-z0-9_<>.\-/]*")
+_URL = re.compile(ENDPOINT_REGEX)
+
+
+# ------------------------------- signatures -----------------------------------
+
+def features(text: str) -> List[int]:
+    """Word unigrams + bigrams of the templated text, as 32-bit hashes."""
+    words = _WORD.findall(message_template(text).lower())
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return [zlib.crc32(g.encode()) for g in set(grams)]
+
+
+def minhash(hashes: List[int]) -> np.ndarray:
+    if not hashes:
+        return _EMPTY.copy()
+    # one splitmix64 finalizer per permutation seed (uint64 products wrap, as intended)
+    h = np.asarray(hashes, dtype=np.uint64)[:, None] ^ _SEEDS
+    h = (h ^ (h >> np.uint64(30))) * _M1
+    h = (h ^ (h >> np.uint64(27))) * _M2
+    h ^= h >> np.uint64(31)
+    return (h.min(axis=0) >> np.uint64(32)).astype(np.uint32)
+
+
+def band_keys(sigs: np.ndarray) -> np.ndarray:
+    """(n, NUM_PERM) uint32 -> (n, BANDS) uint64, one mixed key per band."""
+    out = np.empty((len(sigs), BANDS), dtype=np.uint64)
+    for b in range(BANDS):  # band by band keeps the uint64 temporaries small
+        part = sigs[:, b * ROWS_PER_BAND:(b + 1) * ROWS_PER_BAND].astype(np.uint64)
+        out[:, b] = (part * _MIX).sum(axis=1)  # wraps mod 2^64, which is fine for a hash
+    return out
+
+
+def document(answers: List[Dict[str, Any]], pof_message: Optional[str] = None,
+             label: Optional[str] = None, endpoint: Optional[str] = None) -> str:
+    """
+    Text indexed for a session. Only answers are used (questions repeat across
+    sessions), minus the affected user's name, which says nothing about the issue.
+    """
+    parts = [
+        a["answer"] for a in answers
+        if a.get("answer") and "name" not in (a.get("question") or "").lower()
+    ]
+    if pof_message:
+        parts.append(message_template(pof_message))
+    if endpoint:
+        parts.append(endpoint)
+    if label:
+        parts.append(f"label_{label}")
+    return "\n".join(parts)
+
+
+# --------------------------------- index --------------------------------------
+
+class SimilarityIndex:
+    """Signatures + LSH band keys for every indexed session (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ids: List[str] = []
+        self.meta: List[Dict[str, Any]] = []
+        self.pos: Dict[str, int] = {}
+        self.sigs = np.empty((0, NUM_PERM), dtype=np.uint32)
+        # sorted part: per band, keys ascending and the row each key belongs to
+        self._keys = np.empty((BANDS, 0), dtype=np.uint64)
+        self._rows = np.empty((BANDS, 0), dtype=np.int64)
+        # unsorted tail (rows added since the last merge)
+        self._tail_keys = np.empty((TAIL_MAX, BANDS), dtype=np.uint64)
+        self._tail_rows = np.empty(TAIL_MAX, dtype=np.int64)
+        self._tail = 0
+        self.last_rowid = 0
+        self._refreshed = 0.0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add_many(self, items: List[Dict[str, Any]]) -> None:
+        """items: {session_id, signature (np.uint32[NUM_PERM]), meta...}; re-adding a session replaces it."""
+        if not items:
+            return
+        with self._lock:
+            n = len(self.ids)
+            need = n + sum(1 for it in items if it["session_id"] not in self.pos)
+            if need > len(self.sigs):
+                grown = np.empty((max(need, 2 * len(self.sigs), 1024), NUM_PERM), dtype=np.uint32)
+                grown[:n] = self.sigs[:n]
+                self.sigs = grown
+            touched = []
+            for it in items:
+                sid = it["session_id"]
+                row = self.pos.get(sid)
+                if row is None:
+                    row = self.pos[sid] = len(self.ids)
+                    self.ids.append(sid)
+                    self.meta.append({})
+                # a replaced row keeps its old band keys; ranking reads the current
+                # signature, so the stale keys only add a candidate
+                self.sigs[row] = it["signature"]
+                self.meta[row] = {k: v for k, v in it.items() if k != "signature"}
+                touched.append(row)
+            if len(touched) > TAIL_MAX - self._tail:
+                self._merge_locked(n_rows=len(self.ids))
+            else:
+                rows = np.asarray(touched, dtype=np.int64)
+                self._tail_keys[self._tail:self._tail + len(rows)] = band_keys(self.sigs[rows])
+                self._tail_rows[self._tail:self._tail + len(rows)] = rows
+                self._tail += len(rows)
+
+    def _merge_locked(self, n_rows: int) -> None:
+        keys = np.ascontiguousarray(band_keys(self.sigs[:n_rows]).T)  # (BANDS, n)
+        self._rows = np.argsort(keys, axis=1)
+        self._keys = np.take_along_axis(keys, self._rows, axis=1)
+        self._tail = 0
+
+    def query(self, sig: np.ndarray, k: int = 5, exclude: Optional[str] = None,
+              min_score: float = MIN_SCORE) -> List[Dict[str, Any]]:
+        qk = band_keys(sig[None, :])[0]
+        with self._lock:
+            if not self.ids:
+                return []
+            found = []
+            if self._keys.shape[1]:
+                lo = [np.searchsorted(self._keys[b], qk[b], "left") for b in range(BANDS)]
+                hi = [np.searchsorted(self._keys[b], qk[b], "right") for b in range(BANDS)]
+                found.extend(self._rows[b, lo[b]:hi[b]] for b in range(BANDS) if hi[b] > lo[b])
+            if self._tail:
+                hit = (self._tail_keys[: self._tail] == qk).any(axis=1)
+                found.append(self._tail_rows[: self._tail][hit])
+            if not found:
+                return []
+            cand = np.unique(np.concatenate(found))
+            scores = (self.sigs[cand] == sig).mean(axis=1)
+            keep = scores >= min_score
+            cand, scores = cand[keep], scores[keep]
+            if len(cand) > k + 1:
+                top = np.argpartition(-scores, k)[: k + 1]
+                cand, scores = cand[top], scores[top]
+            out = []
+            for i in np.argsort(-scores, kind="stable"):
+                sid = self.ids[cand[i]]
+                if sid == exclude:
+                    continue
+                out.append({**self.meta[cand[i]], "score": round(float(scores[i]), 3)})
+                if len(out) >= k:
+                    break
+            return out
+
+
+_index = SimilarityIndex()
+_load_lock = threading.Lock()
+
+
+def _item(row) -> Dict[str, Any]:
+    sig = np.frombuffer(row["signature"], dtype="<u4")
+    if len(sig) != NUM_PERM:  # written with another SIMILAR_NUM_PERM: re-hash the stored document
+        sig = minhash(features(row["document"]))
+    return {
+        "session_id": row["session_id"],
+        "closed_at": row["closed_at"],
+        "label": row["label"],
+        "endpoint": row["endpoint"],
+        "pof_message": row["pof_message"],
+        "signature": sig,
+    }
+
+
+def _refresh(force: bool = False) -> SimilarityIndex:
+    """Pull rows written since the last load (first call loads everything)."""
+    now = time.monotonic()
+    if not force and now - _index._refreshed < REFRESH_SEC:
+        return _index
+    with _load_lock:
+        if not force and now - _index._refreshed < REFRESH_SEC:
+            return _index
+        while True:
+            rows = db.incidents_since(_index.last_rowid)
+            if not rows:
+                break
+            _index.add_many([_item(r) for r in rows])
+            _index.last_rowid = rows[-1]["rowid"]
+        _index._refreshed = time.monotonic()
+    return _index
+
+
+def warm() -> None:
+    try:
+        _refresh(force=True)
+        logger.info("similar-incident index loaded: %s sessions", len(_index))
+    except Exception:
+        logger.exception("similar-incident index load failed")
+
+
+# -------------------------------- lookups -------------------------------------
+
+def similar_to_text(text: str, k: int = 5, exclude: Optional[str] = None) -> List[Dict[str, Any]]:
+    hashes = features(text)
+    if not hashes:
+        return []
+    t0 = time.perf_counter()
+    try:
+        return _refresh().query(minhash(hashes), k=k, exclude=exclude)
+    finally:
+        LOOKUP_SECONDS.observe(time.perf_counter() - t0)
+
+
+def similar_to_answers(answers: List[Dict[str, Any]], k: int = 3, exclude: Optional[str] = None,
+                       pof_message: Optional[str] = None, label: Optional[str] = None,
+                       endpoint: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Past incidents resembling a (possibly still open) session's transcript."""
+    return similar_to_text(document(answers, pof_message, label, endpoint), k=k, exclude=exclude)
+
+
+def for_summary(answers: List[Dict[str, Any]], found: Dict[str, Any], session_id: Optional[str] = None,
+                k: int = 3) -> List[Dict[str, Any]]:
+    """Top matches for a SNOW summary; `found` is analysis.find_pof_and_corr() output."""
+    if not any(a.get("answer") for a in answers):
+        return []
+    matches = similar_to_answers(
+        answers, k=k, exclude=session_id,
+        pof_message=found.get("pof_message"), label=found.get("ai_label"), endpoint=found.get("endpoint"),
+    )
+    return compact(matches)
+
+
+def compact(matches: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Prompt/summary-sized view of lookup results."""
+    return [
+        {
+            "session_id": m["session_id"],
+            "score": m["score"],
+            "label": m.get("label"),
+            "endpoint": m.get("endpoint"),
+            "pof": (m.get("pof_message") or "")[:FIELD_CHARS] or None,
+        }
+        for m in matches
+    ]
+
+
+# ------------------------------- indexing -------------------------------------
+
+def _describe(session: Dict[str, Any], answers: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """POF (session window), endpoint and label of a session, plus its document."""
+    pof = db.find_pof_window(session.get("window_start"), session.get("window_end")) or {}
+    urls = [m.group(0) for a in answers for m in [_URL.search(a.get("answer") or "")] if m]
+    endpoint = urls[0] if urls else pof.get("endpoint")
+    label = pof.get("label")
+    if not label and pof.get("correlation_id"):
+        label = (db.get_correlation(pof["correlation_id"]) or {}).get("majority_label")
+    return {
+        "label": label,
+        "endpoint": endpoint,
+        "pof_message": pof.get("message"),
+        "document": document(answers, pof.get("message"), label, endpoint),
+    }
+
+
+def similar_to_session(session_id: str, k: int = 5) -> Optional[List[Dict[str, Any]]]:
+    """Closest past incidents for a stored session (None if the session does not exist)."""
+    loaded = db.load_session(session_id)
+    if loaded is None:
+        return None
+    return similar_to_text(_describe(*loaded)["document"], k=k, exclude=session_id)
+
+
+def index_session(session_id: str) -> Optional[Dict[str, Any]]:
+    """Build and store the index row for one closed session."""
+    loaded = db.load_session(session_id)
+    if loaded is None:
+        return None
+    desc = _describe(*loaded)
+    sig = minhash(features(desc["document"]))
+    row = {
+        "session_id": session_id,
+        "closed_at": datetime.utcnow().isoformat(),
+        **desc,
+        "signature": sig.astype("<u4").tobytes(),
+    }
+    db.save_incident(row)
+    # this worker sees its own close right away; others on their next refresh
+    with _load_lock:
+        _index.add_many([{**{k: v for k, v in row.items() if k not in ("document", "signature")}, "signature": sig}])
+    return row
+
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="similar-index")
+
+
+def _index_quietly(session_id: str) -> None:
+    try:
+        index_session(session_id)
+    except Exception:
+        logger.exception("indexing closed session %s failed", session_id)
+
+
+def _on_closed(session_id: str) -> None:
+    _executor.submit(_index_quietly, session_id)
+
+
+db.on_session_closed(_on_closed)
@@ -0,0 +1,81 @@
+# app/services/summary_cache.py
+"""
+Per-session cache of rendered SNOW summaries.
+
+An entry is keyed by the transcript version (step, closed flag, applied POF
+window and a CRC of the Q&A rows), so it goes stale exactly when an answer is
+added or the window changes. The version also serves as the ETag, letting
+the UI poll with If-None-Match and get a 304 without any rebuild.
+Summaries built while the LLM was unavailable (heuristic fallbacks) are
+served but not cached, so the next poll tries the model again: a 304 is only
+sent while the cache holds the summary for that ETag (see is_cached).
+"""
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from app.metrics import track_cache
+from app.services.resilience import current_budget
+from app.store.session_cache import SessionState
+
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "1000"))
+
+_lock = threading.Lock()
+_cache: "OrderedDict[Tuple[str, str], Tuple[str, str]]" = OrderedDict()
+
+
+def version_of(state: SessionState) -> str:
+    """Stable transcript version: '<step>-<crc32>'."""
+    crc = zlib.crc32(repr((
+        state.closed,
+        state.window_start,
+        state.window_end,
+        [(a["step"], a["question"], a.get("answer")) for a in state.answers],
+    )).encode("utf-8"))
+    return f"{state.step}-{crc:08x}"
+
+
+def etag_for(kind: str, state: SessionState) -> str:
+    return f'W/"{kind}-{version_of(state)}"'
+
+
+def is_cached(kind: str, session_id: str, etag: str) -> bool:
+    """True when the cached summary is the one for `etag` (a 304 is safe)."""
+    with _lock:
+        hit = _cache.get((kind, session_id))
+        return hit is not None and hit[0] == etag
+
+
+def get_or_build(kind: str, session_id: str, etag: str, build: Callable[[], str]) -> Tuple[str, str]:
+    """
+    Return (etag, text); `build` only runs when the transcript version changed.
+    `etag` is taken with etag_for() under the session lock, and `build` renders
+    that same snapshot, so the (slow) build can run without holding the lock.
+    """
+    key = (kind, session_id)
+    with _lock:
+        hit = _cache.get(key)
+        if hit and hit[0] == etag:
+            _cache.move_to_end(key)
+            track_cache("summary", True)
+            return hit
+    track_cache("summary", False)
+    text = build()
+    budget = current_budget()
+    if budget is not None and budget.degraded:
+        return etag, text
+    with _lock:
+        _cache[key] = (etag, text)
+        _cache.move_to_end(key)
+        while len(_cache) > SUMMARY_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return etag, text
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or etag.removeprefix("W/") in tags
@@ -0,0 +1,513 @@
+# app/store/archive.py
+"""
+Cold tier for old logs: immutable, compressed, per-day segment files.
+
+Day partitions (see db "log partitions") entirely older than
+LOG_ARCHIVE_AFTER_DAYS are moved into `<LOG_ARCHIVE_DIR>/<YYYYMMDD>-<first_id>.seg`
+and their table is dropped. A segment is written once and never modified:
+
+  [block 0][block 1]...[bloom bits][footer json][u32 footer len][b"TSEG"]
+
+  - blocks: zlib-compressed JSON arrays of up to ARCHIVE_BLOCK_ROWS rows,
+    sorted by (ts, id)
+  - footer: per-block (offset, length, first_ts, last_ts) = sparse ts index,
+    plus segment min/max ts and the Bloom filter parameters
+  - bloom: correlation ids in the segment (ARCHIVE_BLOOM_FP false positives)
+
+Segments are registered in the `log_segments` table in the same transaction
+that drops the partition (or deletes the legacy rows), so a row is always in exactly one tier
+(a file not in the manifest is an interrupted run and is ignored). Reads go
+through mmap and only decompress blocks whose ts range / Bloom filter can
+match. db.fetch_logs_window / find_pof_window / search_correlation merge
+the cold results with the hot table.
+
+  LOG_ARCHIVE_DIR              segment directory (default <db dir>/archive)
+  LOG_ARCHIVE_AFTER_DAYS       move rows older than this; 0 disables (default 0)
+  LOG_ARCHIVE_RETENTION_DAYS   delete segments older than this; 0 keeps all
+  LOG_RETENTION_DAYS           drop hot partitions older than this without
+                               archiving them; 0 keeps all (default 0)
+  LOG_ARCHIVE_INTERVAL_SEC     background run interval (default 3600)
+
+Run once by hand with: python -m app.store.archive --older-than-days 7
+"""
+import argparse
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from itertools import groupby, islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app import metrics
+
+ARCHIVE_AFTER_DAYS = float(os.getenv("LOG_ARCHIVE_AFTER_DAYS", "0"))
+ARCHIVE_RETENTION_DAYS = float(os.getenv("LOG_ARCHIVE_RETENTION_DAYS", "0"))
+HOT_RETENTION_DAYS = float(os.getenv("LOG_RETENTION_DAYS", "0"))
+ARCHIVE_INTERVAL_SEC = float(os.getenv("LOG_ARCHIVE_INTERVAL_SEC", "3600"))
+ARCHIVE_BLOCK_ROWS = int(os.getenv("ARCHIVE_BLOCK_ROWS", "512"))
+ARCHIVE_BATCH_ROWS = int(os.getenv("ARCHIVE_BATCH_ROWS", "50000"))
+ARCHIVE_BLOOM_FP = float(os.getenv("ARCHIVE_BLOOM_FP", "0.01"))
+MANIFEST_TTL_SEC = float(os.getenv("ARCHIVE_MANIFEST_TTL_SEC", "30"))
+
+COLUMNS = ("id", "source", "ts", "level", "message", "correlation_id", "endpoint", "account", "label")
+_MAGIC = b"TSEG"
+_TAIL = struct.Struct("<I4s")
+
+ARCHIVED_ROWS = metrics.counter("triage_archive_rows_total", "Rows moved from the hot table into segments")
+SEGMENTS_SCANNED = metrics.counter(
+    "triage_archive_segments_total", "Cold segments considered by queries", ["result"]
+)
+
+
+def archive_dir() -> Path:
+    configured = os.getenv("LOG_ARCHIVE_DIR")
+    if configured:
+        return Path(configured)
+    from app.store import db
+    return Path(db.DB_PATH).resolve().parent / "archive"
+
+
+# ------------------------------- bloom filter ---------------------------------
+
+def _bloom_params(n: int, fp: float) -> tuple:
+    n = max(n, 1)
+    m = max(64, int(math.ceil(-n * math.log(fp) / (math.log(2) ** 2))))
+    k = max(1, int(round(m / n * math.log(2))))
+    return m, k
+
+
+def _bloom_positions(key: str, m: int, k: int) -> Iterator[int]:
+    # Kirsch-Mitzenmacher double hashing over one 128-bit digest
+    d = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+    h1, h2 = struct.unpack("<QQ", d)
+    for i in range(k):
+        yield (h1 + i * h2) % m
+
+
+def _bloom_build(keys: Sequence[str], fp: float) -> tuple:
+    m, k = _bloom_params(len(keys), fp)
+    bits = bytearray((m + 7) // 8)
+    for key in keys:
+        for p in _bloom_positions(key, m, k):
+            bits[p >> 3] |= 1 << (p & 7)
+    return bytes(bits), m, k
+
+
+# --------------------------------- segments -----------------------------------
+
+def write_segment(path: Path, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Write rows (any order) as one segment; returns its footer. Atomic via rename."""
+    rows = sorted(rows, key=lambda r: (r.get("ts") or "", r.get("id") or 0))
+    blocks = []
+    offset = 0
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        for i in range(0, len(rows), ARCHIVE_BLOCK_ROWS):
+            chunk = rows[i:i + ARCHIVE_BLOCK_ROWS]
+            raw = json.dumps([[r.get(c) for c in COLUMNS] for r in chunk], separators=(",", ":"))
+            data = zlib.compress(raw.encode("utf-8"), 6)
+            f.write(data)
+            blocks.append([offset, len(data), chunk[0].get("ts") or "", chunk[-1].get("ts") or "", len(chunk)])
+            offset += len(data)
+        corr_ids = sorted({r["correlation_id"] for r in rows if r.get("correlation_id")})
+        bits, m, k = _bloom_build(corr_ids, ARCHIVE_BLOOM_FP)
+        f.write(bits)
+        footer = {
+            "v": 1,
+            "columns": list(COLUMNS),
+            "rows": len(rows),
+            "min_ts": rows[0].get("ts") if rows else None,
+            "max_ts": rows[-1].get("ts") if rows else None,
+            "min_id": min((r.get("id") or 0) for r in rows) if rows else None,
+            "max_id": max((r.get("id") or 0) for r in rows) if rows else None,
+            "blocks": blocks,
+            "bloom": [offset, len(bits), m, k],
+        }
+        raw_footer = json.dumps(footer, separators=(",", ":")).encode("utf-8")
+        f.write(raw_footer)
+        f.write(_TAIL.pack(len(raw_footer), _MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    footer["bytes"] = path.stat().st_size
+    return footer
+
+
+class Segment:
+    """Read side of one segment file (footer parsed once, data read via mmap)."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        footer_len, magic = _TAIL.unpack(self._mm[-_TAIL.size:])
+        if magic != _MAGIC:
+            raise ValueError(f"not a log segment: {path}")
+        start = len(self._mm) - _TAIL.size - footer_len
+        self.footer = json.loads(self._mm[start:start + footer_len])
+        self.columns = tuple(self.footer["columns"])
+        self.min_ts = self.footer["min_ts"] or ""
+        self.max_ts = self.footer["max_ts"] or ""
+        self.blocks = self.footer["blocks"]
+        self._last_ts = [b[3] for b in self.blocks]
+        b_off, b_len, self._m, self._k = self.footer["bloom"]
+        self._bloom = self._mm[b_off:b_off + b_len]
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+    def overlaps(self, start_ts: Optional[str], end_ts: Optional[str]) -> bool:
+        if start_ts and self.max_ts < start_ts:
+            return False
+        if end_ts and self.min_ts > end_ts:
+            return False
+        return True
+
+    def might_contain(self, correlation_id: str) -> bool:
+        bits = self._bloom
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in _bloom_positions(correlation_id, self._m, self._k))
+
+    def _block(self, i: int) -> List[Dict[str, Any]]:
+        off, length = self.blocks[i][0], self.blocks[i][1]
+        rows = json.loads(zlib.decompress(self._mm[off:off + length]))
+        cols = self.columns
+        return [dict(zip(cols, r)) for r in rows]
+
+    def scan(self, start_ts: Optional[str], end_ts: Optional[str]) -> Iterator[Dict[str, Any]]:
+        """Rows with start_ts <= ts <= end_ts in ts order, decompressing only the blocks in range."""
+        i = bisect_left(self._last_ts, start_ts) if start_ts else 0
+        for bi in range(i, len(self.blocks)):
+            if end_ts and self.blocks[bi][2] > end_ts:
+                break
+            for r in self._block(bi):
+                ts = r.get("ts") or ""
+                if start_ts and ts < start_ts:
+                    continue
+                if end_ts and ts > end_ts:
+                    return
+                yield r
+
+    def rows_at(self, keys: Sequence[Tuple[str, int]]) -> List[Dict[str, Any]]:
+        """Rows with the given (ts, id), decompressing only the blocks whose ts range holds them."""
+        ids = {i for _, i in keys}
+        picked = set()
+        for ts in {ts for ts, _ in keys}:
+            bi = bisect_left(self._last_ts, ts)
+            while bi < len(self.blocks) and self.blocks[bi][2] <= ts:
+                picked.add(bi)
+                bi += 1
+        return [r for bi in sorted(picked) for r in self._block(bi) if r.get("id") in ids]
+
+    def rows_for_correlation(self, correlation_id: str) -> List[Dict[str, Any]]:
+        out = []
+        for bi in range(len(self.blocks)):
+            out.extend(r for r in self._block(bi) if r.get("correlation_id") == correlation_id)
+        return out
+
+
+# --------------------------------- manifest -----------------------------------
+
+_lock = threading.Lock()
+_segments: Dict[str, Segment] = {}
+_manifest: List[Dict[str, Any]] = []
+_loaded_at = 0.0
+
+
+def _refresh(force: bool = False) -> List[Dict[str, Any]]:
+    """Manifest rows ordered by min_ts (re-read at most every MANIFEST_TTL_SEC)."""
+    global _manifest, _loaded_at
+    now = time.monotonic()
+    if not force and now - _loaded_at < MANIFEST_TTL_SEC:
+        return _manifest
+    from app.store import db
+    conn = db._connect()
+    try:
+        rows = [dict(r) for r in db._fetchall(conn, "SELECT * FROM log_segments ORDER BY min_ts, min_id")]
+    except sqlite3.OperationalError:
+        rows = []  # db.init() not run yet
+    finally:
+        conn.close()
+    with _lock:
+        live = {r["path"] for r in rows}
+        for path in [p for p in _segments if p not in live]:
+            _segments.pop(path).close()
+        _manifest = rows
+        _loaded_at = now
+    return rows
+
+
+def _open(path: str) -> Optional[Segment]:
+    with _lock:
+        seg = _segments.get(path)
+        if seg is None:
+            try:
+                seg = _segments[path] = Segment(archive_dir() / path)
+            except (OSError, ValueError):
+                return None
+        return seg
+
+
+def _candidates(start_ts: Optional[str], end_ts: Optional[str]) -> List[Segment]:
+    out = []
+    for m in _refresh():
+        if (start_ts and (m["max_ts"] or "") < start_ts) or (end_ts and (m["min_ts"] or "") > end_ts):
+            SEGMENTS_SCANNED.inc(result="pruned_ts")
+            continue
+        seg = _open(m["path"])
+        if seg is not None:
+            out.append(seg)
+    return out
+
+
+def has_segments() -> bool:
+    return bool(_refresh())
+
+
+# ---------------------------------- queries -----------------------------------
+
+def _merged(segs: List[Segment], start_ts: Optional[str], end_ts: Optional[str],
+            where: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Iterator[Dict[str, Any]]:
+    for seg in segs:
+        SEGMENTS_SCANNED.inc(result="scanned")
+    streams = [seg.scan(start_ts, end_ts) for seg in segs]
+    rows = heapq.merge(*streams, key=lambda r: (r.get("ts") or "", r.get("id") or 0))
+    return (r for r in rows if where(r)) if where else rows
+
+
+def fetch_window(start_ts: Optional[str], end_ts: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    return list(islice(_merged(_candidates(start_ts, end_ts), start_ts, end_ts), limit))
+
+
+def find_first(start_ts: Optional[str], end_ts: Optional[str],
+               where: Callable[[Dict[str, Any]], bool]) -> Optional[Dict[str, Any]]:
+    return next(_merged(_candidates(start_ts, end_ts), start_ts, end_ts, where), None)
+
+
+def search_correlation(correlation_id: str, limit: int) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    for seg in _candidates(None, None):
+        if not seg.might_contain(correlation_id):
+            SEGMENTS_SCANNED.inc(result="pruned_bloom")
+            continue
+        SEGMENTS_SCANNED.inc(result="scanned")
+        out.extend(seg.rows_for_correlation(correlation_id))
+    out.sort(key=lambda r: (r.get("ts") or "", r.get("id") or 0))
+    return out[:limit]
+
+
+def fetch_rows(correlation_id: str, keys: Sequence[Tuple[str, int]]) -> List[Dict[str, Any]]:
+    """Archived rows of one correlation id by (ts, id), e.g. one trace page (ts and Bloom pruned)."""
+    if not keys:
+        return []
+    out: List[Dict[str, Any]] = []
+    for seg in _candidates(min(ts for ts, _ in keys), max(ts for ts, _ in keys)):
+        if not seg.might_contain(correlation_id):
+            SEGMENTS_SCANNED.inc(result="pruned_bloom")
+            continue
+        SEGMENTS_SCANNED.inc(result="scanned")
+        out.extend(seg.rows_at([k for k in keys if seg.min_ts <= k[0] <= seg.max_ts]))
+    return out
+
+
+def iter_rows() -> Iterator[Dict[str, Any]]:
+    """Every archived row, segment by segment (used for one-off backfills)."""
+    for seg in _candidates(None, None):
+        for bi in range(len(seg.blocks)):
+            yield from seg._block(bi)
+
+
+def merge_rows(hot: List[Dict[str, Any]], cold: List[Dict[str, Any]], limit: int,
+               columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    """Merge two ts-ordered row lists, projecting cold rows onto the hot query's columns."""
+    if columns:
+        cold = [{c: r.get(c) for c in columns} for r in cold]
+    return list(islice(heapq.merge(cold, hot, key=lambda r: (r.get("ts") or "", r.get("id") or 0)), limit))
+
+
+# ------------------------------ archive / retention ---------------------------
+
+def _write_day_segments(out_dir: Path, rows: List[Dict[str, Any]]) -> List[tuple]:
+    manifest = []
+    for day, group in groupby(rows, key=lambda r: (r["ts"] or "")[:10]):
+        group = list(group)
+        name = f"{day.replace('-', '')}-{group[0]['id']}.seg"
+        footer = write_segment(out_dir / name, group)
+        manifest.append((name, day, footer["min_ts"], footer["max_ts"], footer["min_id"],
+                         footer["max_id"], footer["rows"], footer["bytes"],
+                         datetime.utcnow().isoformat()))
+    return manifest
+
+
+_INSERT_MANIFEST = (
+    "INSERT INTO log_segments (path, day, min_ts, max_ts, min_id, max_id, rows, bytes, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def _archive_partition(conn, out_dir: Path, part: Dict[str, Any]) -> tuple:
+    """Whole day partition -> segments, then DROP TABLE (no row-level DELETE)."""
+    from app.store import db
+    name = part["name"]
+    manifest: List[tuple] = []
+    moved, last_id = 0, -1
+
+    def copy_new_rows() -> None:
+        nonlocal moved, last_id
+        while True:
+            rows = db.read_partition(conn, part, "id > ?", (last_id,), "id", ARCHIVE_BATCH_ROWS)
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            rows.sort(key=lambda r: (r["ts"] or "", r["id"]))
+            manifest.extend(_write_day_segments(out_dir, rows))
+            moved += len(rows)
+
+    # bulk of the day without blocking ingest
+    copy_new_rows()
+    # then, under the write lock, whatever ingest added meanwhile (late rows with
+    # an old ts), so the final read, the manifest and the drop commit together:
+    # a row is never in both tiers, nor in neither
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        copy_new_rows()
+        conn.executemany(_INSERT_MANIFEST, manifest)
+        conn.execute("UPDATE correlation_events SET part=? WHERE part=?", (db.COLD_PART, name))
+        conn.execute("DELETE FROM log_partitions WHERE name=?", (name,))
+        conn.execute(f"DROP TABLE IF EXISTS {name}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return moved, len(manifest)
+
+
+def _archive_rows(conn, out_dir: Path, part: Dict[str, Any], cutoff_ts: str) -> tuple:
+    """Row-level move for the legacy (unpartitioned) table."""
+    from app.store import db
+    name = part["name"]
+    moved = written = 0
+    while True:
+        rows = db.read_partition(conn, part, "ts < ?", (cutoff_ts,), "ts, id", ARCHIVE_BATCH_ROWS)
+        if not rows:
+            break
+        manifest = _write_day_segments(out_dir, rows)
+        conn.executemany(_INSERT_MANIFEST, manifest)
+        conn.executemany(f"DELETE FROM {name} WHERE id=?", [(r["id"],) for r in rows])
+        conn.executemany(
+            "UPDATE correlation_events SET part=? WHERE correlation_id=? AND ts=? AND log_id=?",
+            [(db.COLD_PART, r["correlation_id"], r["ts"] or "", r["id"]) for r in rows if r.get("correlation_id")],
+        )
+        conn.execute(
+            f"UPDATE log_partitions SET rows=(SELECT COUNT(1) FROM {name}), "
+            f"min_ts=(SELECT MIN(ts) FROM {name}) WHERE name=?",
+            (name,),
+        )
+        conn.commit()
+        moved += len(rows)
+        written += len(manifest)
+        if len(rows) < ARCHIVE_BATCH_ROWS:
+            break
+    return moved, written
+
+
+def archive_before(cutoff_ts: str) -> Dict[str, Any]:
+    """Move hot rows with ts < cutoff_ts into segments: whole day partitions, legacy rows one by one."""
+    from app.store import db
+    out_dir = archive_dir()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    moved = written = 0
+    for p in db.log_partitions():
+        if not p["min_ts"] or p["min_ts"] >= cutoff_ts:
+            continue
+        conn = db._connect()
+        try:
+            if p["name"] == db.LEGACY_PARTITION:
+                n, segs = _archive_rows(conn, out_dir, p, cutoff_ts)
+            elif p["max_ts"] < cutoff_ts:
+                n, segs = _archive_partition(conn, out_dir, p)
+            else:
+                continue  # the day straddling the cutoff waits for the next run
+        finally:
+            conn.close()
+        moved += n
+        written += segs
+        ARCHIVED_ROWS.inc(n)
+    _refresh(force=True)
+    return {"rows": moved, "segments": written, "cutoff": cutoff_ts}
+
+
+def drop_segments_before(day: str) -> int:
+    """Retention for the cold tier: delete whole segments whose day < `day` (YYYY-MM-DD)."""
+    from app.store import db
+    conn = db._connect()
+    try:
+        paths = [r["path"] for r in db._fetchall(conn, "SELECT path FROM log_segments WHERE day < ?", (day,))]
+        conn.execute("DELETE FROM log_segments WHERE day < ?", (day,))
+        db.forget_cold_correlation_events(conn, day)
+        conn.commit()
+    finally:
+        conn.close()
+    _refresh(force=True)
+    for p in paths:
+        try:
+            (archive_dir() / p).unlink()
+        except FileNotFoundError:
+            pass
+    return len(paths)
+
+
+def _cutoff(days: float) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(days=days)
+
+
+def run_once(
+    after_days: float = ARCHIVE_AFTER_DAYS,
+    retention_days: float = ARCHIVE_RETENTION_DAYS,
+    hot_retention_days: float = HOT_RETENTION_DAYS,
+) -> Dict[str, Any]:
+    from app.store import db
+    out: Dict[str, Any] = {}
+    if after_days > 0:
+        out.update(archive_before(_cutoff(after_days).isoformat()))
+    if hot_retention_days > 0:
+        out["dropped_partitions"] = db.drop_partitions_before(_cutoff(hot_retention_days).date().isoformat())
+    if retention_days > 0:
+        out["dropped_segments"] = drop_segments_before(_cutoff(retention_days).date().isoformat())
+    return out
+
+
+def stats() -> Dict[str, Any]:
+    rows = _refresh()
+    return {
+        "segments": len(rows),
+        "rows": sum(r["rows"] for r in rows),
+        "bytes": sum(r["bytes"] for r in rows),
+        "min_ts": rows[0]["min_ts"] if rows else None,
+        "max_ts": max((r["max_ts"] or "" for r in rows), default=None),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Move old logs into compressed cold segments.")
+    ap.add_argument("--older-than-days", type=float, default=ARCHIVE_AFTER_DAYS or 7)
+    ap.add_argument("--retention-days", type=float, default=ARCHIVE_RETENTION_DAYS)
+    args = ap.parse_args()
+    from app.store import db
+    db.init()
+    print(json.dumps(run_once(args.older_than_days, args.retention_days)))
+    print(json.dumps(stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# app/store/codec.py
+"""
+Dictionary encoding for log partitions.
+
+Low-cardinality fields (source, level, endpoint, account, label) and message
+templates are stored once in `log_dict` and referenced by integer id; a
+message keeps only its variable parts (ids, URLs, numbers):
+
+  "Timeout after 3000 ms calling https://chs/api/x"
+    -> template "Timeout after \\0 ms calling \\0"   (shared, stored once)
+    -> params   "3000\\x1fhttps://chs/api/x"         (per row)
+
+split_message/join_message round-trip exactly; a message that already
+contains one of the separator characters is stored verbatim instead.
+Ids are cached per process (values never change once assigned), so encode
+and decode are dict lookups after warm-up.
+"""
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from app.config import CORRELATION_ID_REGEX, ENDPOINT_REGEX
+
+ENCODED_FIELDS = ("source", "level", "endpoint", "account", "label")
+
+_HOLE = "\x00"   # placeholder for one variable part inside a template
+_SEP = "\x1f"    # separator between variable parts in `params`
+
+# one capturing group, so _VARIABLE.split() alternates literal text / variable part
+_VARIABLE = re.compile(
+    "((?:" + CORRELATION_ID_REGEX.replace("(?i)", "") + ")|" + ENDPOINT_REGEX + r"|\b\d+(?:\.\d+)?\b)",
+    re.IGNORECASE,
+)
+
+
+def split_message(msg: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """message -> (template, params); template None means params is the raw message."""
+    if msg is None:
+        return None, None
+    if _HOLE in msg or _SEP in msg:
+        return None, msg
+    pieces = _VARIABLE.split(msg)
+    if len(pieces) == 1:
+        return msg, None
+    return _HOLE.join(pieces[0::2]), _SEP.join(pieces[1::2])
+
+
+def readable_template(template: Optional[str]) -> Optional[str]:
+    """Template with its variable parts shown as <*> (for API output and prompts)."""
+    return template.replace(_HOLE, "<*>") if template else template
+
+
+def join_message(template: Optional[str], params: Optional[str]) -> Optional[str]:
+    if template is None:
+        return params
+    if params is None:
+        return template
+    pieces = template.split(_HOLE)
+    out = [""] * (2 * len(pieces) - 1)
+    out[0::2] = pieces
+    out[1::2] = params.split(_SEP)
+    return "".join(out)
+
+
+class Dictionary:
+    """
+    (kind, value) <-> id over the log_dict table, cached in memory.
+    `ids` / `values` are the caches themselves (read-only for callers, used
+    directly in the row loops); None maps to None in both.
+    """
+
+    def __init__(self):
+        self.ids: Dict[Tuple[str, Optional[str]], Optional[int]] = {
+            (k, None): None for k in ENCODED_FIELDS + ("template",)
+        }
+        self.values: Dict[Optional[int], Optional[str]] = {None: None}
+        self._lock = threading.Lock()
+
+    def ensure(self, conn: sqlite3.Connection, pairs) -> None:
+        """
+        Assign ids to any (kind, value) pairs not seen yet. The caller commits
+        right away, before using the ids in a row write, so a rolled-back batch
+        can never leave cached ids that do not exist in the table.
+        """
+        ids = self.ids
+        missing = [p for p in set(pairs) if p not in ids]
+        if not missing:
+            return
+        conn.executemany("INSERT OR IGNORE INTO log_dict (kind, value) VALUES (?, ?)", list(missing))
+        for kind in {k for k, _ in missing}:
+            self.ids_for(conn, kind, [v for k, v in missing if k == kind])
+
+    def ids_for(self, conn: sqlite3.Connection, kind: str, values: List[str]) -> List[int]:
+        """Existing ids only (for filters); never inserts."""
+        missing = [v for v in values if (kind, v) not in self.ids]
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            rows = conn.execute(
+                f"SELECT id, value FROM log_dict WHERE kind=? AND value IN ({','.join('?' * len(chunk))})",
+                (kind, *chunk),
+            ).fetchall()
+            with self._lock:
+                for i, v in rows:
+                    self.ids[(kind, v)] = i
+                    self.values[i] = v
+        return [self.ids[(kind, v)] for v in values if (kind, v) in self.ids]
+
+    def decode(self, conn: sqlite3.Connection, ids) -> None:
+        """Make sure every id in `ids` is cached (one query per 500 misses)."""
+        missing = list({i for i in ids if i not in self.values})
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            rows = conn.execute(
+                f"SELECT id, kind, value FROM log_dict WHERE id IN ({','.join('?' * len(chunk))})",
+                tuple(chunk),
+            ).fetchall()
+            with self._lock:
+                for i, kind, v in rows:
+                    self.ids[(kind, v)] = i
+                    self.values[i] = v
+
+    def value(self, i: Optional[int]) -> Optional[str]:
+        return self.values.get(i)
+
+
+dictionary = Dictionary()
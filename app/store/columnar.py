@@ -0,0 +1,285 @@
+# app/store/columnar.py
+"""
+Columnar snapshots of the hot log partitions for aggregate queries.
+
+Each partition is held as one NumPy array per column:
+
+  id        int64
+  ts_ms     int64   epoch milliseconds of the wall-clock ts; NaT_MS if missing
+  source, level, endpoint, account, label, template
+            int32   log_dict ids (0 = NULL), decoded only for the final result
+
+refresh() keeps them in step with SQLite, cheapest way first:
+  - partition unchanged (rows, label_version)  -> nothing to do
+  - only new rows                              -> read rows with id > max id, append
+  - labels changed, or rows went missing       -> reload the partition
+Closed days (before today, UTC) are also written to LOG_COLUMNS_DIR as
+.npy files and memory-mapped, so restarts and other workers skip the
+SQLite read. Dropped or archived partitions disappear on the next refresh;
+the cold tier is not included.
+
+Rows dropped by ingest sampling (db.sampled_counts, per minute) are held
+as one more column set with a `weight` per entry, for days that still have
+a hot partition; window(weighted=True) appends them so totals stay exact.
+
+Interactive lookups (windows, traces, POF) stay on SQLite; this is only
+the read path for /analytics.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app import metrics
+from app.store import db
+
+logger = logging.getLogger(__name__)
+
+REFRESH_SEC = float(os.getenv("ANALYTICS_REFRESH_SEC", "30"))
+
+ID_FIELDS = ("source", "level", "endpoint", "account", "label", "template")
+NaT_MS = np.iinfo(np.int64).min
+
+SNAPSHOT_ROWS = metrics.gauge("triage_columnar_rows", "Rows held in columnar analytics snapshots")
+REFRESHES = metrics.counter("triage_columnar_refresh_total", "Partition snapshot refreshes by kind", ["kind"])
+
+
+def columns_dir() -> Path:
+    configured = os.getenv("LOG_COLUMNS_DIR")
+    if configured:
+        return Path(configured)
+    return Path(db.DB_PATH).resolve().parent / "columns"
+
+
+def to_ms(ts: Optional[str]) -> int:
+    """ISO timestamp -> epoch ms (same reading as the snapshot's ts_ms column)."""
+    return int(_ts_ms([ts])[0])
+
+
+def _ts_ms(values: List[Optional[str]]) -> np.ndarray:
+    # the first 23 chars hold date + time to the millisecond; offsets are dropped,
+    # which matches the lexical ts comparisons the SQLite queries do
+    cut = []
+    for t in values:
+        if not t:
+            cut.append("NaT")
+            continue
+        t = t[:23]
+        for sep in ("+", "-", "Z"):
+            i = t.find(sep, 19)
+            if i >= 0:
+                t = t[:i]
+        cut.append(t)
+    try:
+        return np.array(cut, dtype="datetime64[ms]").astype(np.int64)
+    except ValueError:
+        # a malformed value somewhere: parse one by one, NaT for the bad ones
+        out = np.empty(len(cut), dtype=np.int64)
+        for i, t in enumerate(cut):
+            try:
+                out[i] = np.datetime64(t, "ms").astype(np.int64)
+            except ValueError:
+                out[i] = NaT_MS
+        return out
+
+
+class PartitionColumns:
+    __slots__ = ("name", "day", "rows", "label_version", "max_id", "cols")
+
+    def __init__(self, part: Dict[str, Any], cols: Dict[str, np.ndarray]):
+        self.name = part["name"]
+        self.day = part["day"]
+        self.rows = part["rows"]
+        self.label_version = part.get("label_version") or 0
+        self.cols = cols
+        self.max_id = int(cols["id"][-1]) if len(cols["id"]) else 0
+
+    def __len__(self) -> int:
+        return len(self.cols["id"])
+
+
+def _build(rows: List[tuple]) -> Dict[str, np.ndarray]:
+    if not rows:
+        return {"id": np.empty(0, np.int64), "ts_ms": np.empty(0, np.int64),
+                **{f: np.empty(0, np.int32) for f in ID_FIELDS}}
+    ids, ts, *fields = zip(*rows)
+    cols = {"id": np.array(ids, dtype=np.int64), "ts_ms": _ts_ms(ts)}
+    for f, values in zip(ID_FIELDS, fields):
+        cols[f] = np.array([v or 0 for v in values], dtype=np.int32)
+    return cols
+
+
+def _build_sampled(rows: List[tuple]) -> Dict[str, np.ndarray]:
+    # SAMPLED_COLUMNS tuples -> ts_ms (minute start), the id columns and weight (= dropped)
+    if not rows:
+        return {"ts_ms": np.empty(0, np.int64), "weight": np.empty(0, np.int64),
+                **{f: np.empty(0, np.int32) for f in ID_FIELDS}}
+    minutes, *fields, dropped = zip(*rows)
+    cols = {"ts_ms": _ts_ms(minutes), "weight": np.array(dropped, dtype=np.int64)}
+    for f, values in zip(ID_FIELDS, fields):
+        cols[f] = np.array([v or 0 for v in values], dtype=np.int32)
+    return cols
+
+
+def _append(old: Dict[str, np.ndarray], new: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    return {k: np.concatenate([old[k], new[k]]) for k in old}
+
+
+# ------------------------------- disk cache -----------------------------------
+
+def _stamp(part: Dict[str, Any]) -> Dict[str, Any]:
+    # created_at tells a re-created partition (or another DB file) apart from the cached one
+    return {
+        "created_at": part.get("created_at"),
+        "min_id": part.get("min_id"),
+        "max_id": part.get("max_id"),
+        "rows": part["rows"],
+        "label_version": part.get("label_version") or 0,
+    }
+
+
+def _load_cached(part: Dict[str, Any]) -> Optional[PartitionColumns]:
+    d = columns_dir() / part["name"]
+    try:
+        meta = json.loads((d / "meta.json").read_text())
+    except (OSError, ValueError):
+        return None
+    if meta != _stamp(part):
+        return None
+    cols = {k: np.load(d / f"{k}.npy", mmap_mode="r") for k in ("id", "ts_ms") + ID_FIELDS}
+    return PartitionColumns(part, cols)
+
+
+def _save_cached(part: Dict[str, Any], pc: PartitionColumns) -> None:
+    final = columns_dir() / pc.name
+    tmp = final.with_name(final.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for k, arr in pc.cols.items():
+        np.save(tmp / f"{k}.npy", np.ascontiguousarray(arr))
+    (tmp / "meta.json").write_text(json.dumps(_stamp(part)))
+    shutil.rmtree(final, ignore_errors=True)
+    tmp.rename(final)
+
+
+# -------------------------------- snapshots -----------------------------------
+
+class ColumnStore:
+    def __init__(self):
+        self.parts: Dict[str, PartitionColumns] = {}
+        self.sampled: Dict[str, np.ndarray] = _build_sampled([])
+        self.refreshed_at: Optional[str] = None
+        self._refreshed = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self) -> Dict[str, int]:
+        """Bring every partition snapshot in step with SQLite; returns counts by action."""
+        with self._lock:
+            today = datetime.utcnow().strftime("%Y-%m-%d")
+            done = {"kept": 0, "appended": 0, "loaded": 0, "cached": 0}
+            current = {p["name"]: p for p in db.log_partitions() if p["rows"] > 0}
+            parts = {}
+            for name, part in current.items():
+                pc = self.parts.get(name)
+                same_labels = pc is not None and pc.label_version == (part.get("label_version") or 0)
+                if same_labels and pc.rows == part["rows"]:
+                    parts[name] = pc
+                    done["kept"] += 1
+                    continue
+                if same_labels and part["rows"] > pc.rows:
+                    new = _build(db.partition_columns(part, after_id=pc.max_id))
+                    if len(pc) + len(new["id"]) == part["rows"]:
+                        parts[name] = PartitionColumns(part, _append(pc.cols, new))
+                        done["appended"] += 1
+                        continue
+                sealed = part["day"] < today
+                if sealed and (cached := _load_cached(part)) is not None:
+                    parts[name] = cached
+                    done["cached"] += 1
+                    continue
+                parts[name] = PartitionColumns(part, _build(db.partition_columns(part)))
+                done["loaded"] += 1
+                if sealed:
+                    try:
+                        _save_cached(part, parts[name])
+                    except OSError:
+                        logger.exception("could not cache columns of %s", name)
+            self.parts = parts  # readers keep whatever dict they already hold
+            self.sampled = _build_sampled(db.sampled_counts())
+            self.refreshed_at = datetime.utcnow().isoformat()
+            self._refreshed = time.monotonic()
+            SNAPSHOT_ROWS.set(sum(len(pc) for pc in parts.values()))
+            for kind, n in done.items():
+                if n:
+                    REFRESHES.inc(n, kind=kind)
+            return done
+
+    def ensure_fresh(self) -> "ColumnStore":
+        if time.monotonic() - self._refreshed >= REFRESH_SEC:
+            self.refresh()
+        return self
+
+    def window(self, start_ts: Optional[str] = None, end_ts: Optional[str] = None,
+               fields=ID_FIELDS, weighted: bool = False) -> Dict[str, np.ndarray]:
+        """
+        Concatenated columns (ts_ms + `fields`) of rows with start <= ts <= end.
+        weighted=True adds a `weight` column (1 per stored row) and the
+        sampled-out counts of the same window.
+        """
+        lo = to_ms(start_ts) if start_ts else None
+        hi = to_ms(end_ts) if end_ts else None
+        start_day = (start_ts or "")[:10]
+        end_day = (end_ts or "9999")[:10]
+        keys = ("ts_ms",) + tuple(fields)
+        chunks: Dict[str, List[np.ndarray]] = {k: [] for k in keys + (("weight",) if weighted else ())}
+
+        def take(cols: Dict[str, np.ndarray], mask: np.ndarray) -> None:
+            ts = cols["ts_ms"]
+            mask &= ts != NaT_MS
+            if lo is not None:
+                mask &= ts >= lo
+            if hi is not None:
+                mask &= ts <= hi
+            for k in keys:
+                chunks[k].append(cols[k][mask])
+            if weighted:
+                w = cols.get("weight")
+                chunks["weight"].append(w[mask] if w is not None else np.ones(int(mask.sum()), np.int64))
+
+        parts = list(self.parts.values())
+        for pc in parts:
+            if pc.day != "undated" and pc.name != db.LEGACY_PARTITION and not (start_day <= pc.day <= end_day):
+                continue
+            take(pc.cols, np.ones(len(pc), dtype=bool))
+        sampled = self.sampled
+        if weighted and len(sampled["ts_ms"]):
+            # only days still in the hot tier (archived days are not in the snapshots either)
+            hot_days = np.array(
+                [np.datetime64(pc.day, "D").astype(np.int64) for pc in parts if pc.day[:1].isdigit()], dtype=np.int64
+            )
+            take(sampled, np.isin(sampled["ts_ms"] // 86_400_000, hot_days))
+        return {
+            k: np.concatenate(v) if v else np.empty(0, np.int64 if k in ("ts_ms", "weight") else np.int32)
+            for k, v in chunks.items()
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        parts = list(self.parts.values())
+        return {
+            "partitions": len(parts),
+            "rows": sum(len(pc) for pc in parts),
+            "sampled_out": int(self.sampled["weight"].sum()),
+            "bytes": sum(a.nbytes for pc in parts for a in pc.cols.values()),
+            "refreshed_at": self.refreshed_at,
+            "refresh_sec": REFRESH_SEC,
+        }
+
+
+store = ColumnStore()
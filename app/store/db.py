@@ -1,11 +1,18 @@
 # app/store/db.py
+import heapq
+import re
 import sqlite3
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional, Tuple
 from datetime import datetime
 import uuid
 from typing import Optional, List, Dict, Any 
 
+from app.metrics import timed_db
+from app.store import archive, dedup, sampling, sketches
+from app.store.codec import ENCODED_FIELDS, dictionary, join_message, split_message
+
 # Prefer app.config.DB_PATH if present, else default to local file
 try:
     from app.config import DB_PATH  # type: ignore
@@ -64,20 +71,162 @@ DDL = [
         endpoint TEXT,
         account TEXT
         -- label column added via migration in init()
-    );"""
+    );""",
+    # Day partitions of the log store (see "log partitions" below)
+    """CREATE TABLE IF NOT EXISTS log_partitions (
+        name TEXT PRIMARY KEY,
+        day TEXT NOT NULL,
+        min_ts TEXT,
+        max_ts TEXT,
+        min_id INTEGER,
+        max_id INTEGER,
+        rows INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL
+    );""",
+    # Dictionary for encoded partitions (see app/store/codec.py)
+    """CREATE TABLE IF NOT EXISTS log_dict (
+        id INTEGER PRIMARY KEY,
+        kind TEXT NOT NULL,
+        value TEXT NOT NULL,
+        UNIQUE (kind, value)
+    );""",
+    """CREATE TABLE IF NOT EXISTS log_seq (
+        name TEXT PRIMARY KEY,
+        last_id INTEGER NOT NULL
+    );""",
+    # Per-correlation-id summary + event index, maintained by insert_logs
+    """CREATE TABLE IF NOT EXISTS correlations (
+        correlation_id TEXT PRIMARY KEY,
+        first_ts TEXT,
+        last_ts TEXT,
+        events INTEGER NOT NULL DEFAULT 0,
+        max_severity INTEGER,
+        max_level TEXT
+    );""",
+    """CREATE TABLE IF NOT EXISTS correlation_attrs (
+        correlation_id TEXT NOT NULL,
+        kind TEXT NOT NULL,  -- endpoint | source
+        value TEXT NOT NULL,
+        PRIMARY KEY (correlation_id, kind, value)
+    ) WITHOUT ROWID;""",
+    """CREATE TABLE IF NOT EXISTS correlation_labels (
+        correlation_id TEXT NOT NULL,
+        label TEXT NOT NULL,
+        n INTEGER NOT NULL,
+        PRIMARY KEY (correlation_id, label)
+    ) WITHOUT ROWID;""",
+    """CREATE TABLE IF NOT EXISTS correlation_events (
+        correlation_id TEXT NOT NULL,
+        ts TEXT NOT NULL,  -- '' when the row has no ts
+        log_id INTEGER NOT NULL,
+        part TEXT NOT NULL,
+        label TEXT,
+        PRIMARY KEY (correlation_id, ts, log_id)
+    ) WITHOUT ROWID;""",
+    # events of one partition (archive / retention re-point or delete them)
+    "CREATE INDEX IF NOT EXISTS idx_correlation_events_part ON correlation_events(part, ts);",
+    # Cold-tier segment manifest (see app/store/archive.py)
+    """CREATE TABLE IF NOT EXISTS log_segments (
+        path TEXT PRIMARY KEY,
+        day TEXT NOT NULL,
+        min_ts TEXT,
+        max_ts TEXT,
+        min_id INTEGER,
+        max_id INTEGER,
+        rows INTEGER NOT NULL,
+        bytes INTEGER NOT NULL,
+        created_at TEXT NOT NULL
+    );""",
+    # Content hashes of recently ingested rows (see app/store/dedup.py)
+    # keyed by the row's ts minute first: a batch lands on a few adjacent pages
+    # instead of one random page per row
+    """CREATE TABLE IF NOT EXISTS log_hashes (
+        minute TEXT NOT NULL,
+        hash INTEGER NOT NULL,
+        seen_at INTEGER NOT NULL,
+        PRIMARY KEY (minute, hash)
+    ) WITHOUT ROWID;""",
+    "CREATE INDEX IF NOT EXISTS idx_log_hashes_seen ON log_hashes(seen_at);",
+    # Idempotency-Key of ingested batches (replays return the first result)
+    """CREATE TABLE IF NOT EXISTS ingest_batches (
+        key TEXT PRIMARY KEY,
+        created_at INTEGER NOT NULL,
+        rows INTEGER NOT NULL,
+        duplicates INTEGER NOT NULL,
+        sampled INTEGER NOT NULL DEFAULT 0
+    );""",
+    # Rows dropped by ingest sampling, counted per minute + encoded fields, 0 for NULL
+    # (see app/store/sampling.py)
+    """CREATE TABLE IF NOT EXISTS log_sampled (
+        minute TEXT NOT NULL,
+        source_id INTEGER,
+        level_id INTEGER,
+        endpoint_id INTEGER,
+        account_id INTEGER,
+        label_id INTEGER,
+        template_id INTEGER,
+        dropped INTEGER NOT NULL,
+        PRIMARY KEY (minute, source_id, level_id, endpoint_id, account_id, label_id, template_id)
+    ) WITHOUT ROWID;""",
+    # Background jobs (see app/services/jobs.py); times are epoch seconds
+    """CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        type TEXT NOT NULL,
+        dedup_key TEXT NOT NULL,
+        params TEXT NOT NULL,
+        priority INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        cancel_requested INTEGER NOT NULL DEFAULT 0,
+        result TEXT,
+        error TEXT,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL,
+        heartbeat_at REAL
+    );""",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs(status, priority DESC, id);",
+    # at most one pending (queued or running) job per type + params, across workers
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_pending ON jobs(type, dedup_key) "
+    "WHERE status IN ('queued', 'running');",
+    # Closed sessions indexed for "similar past incidents" (see app/services/similar_incidents.py)
+    """CREATE TABLE IF NOT EXISTS incident_index (
+        session_id TEXT PRIMARY KEY,
+        closed_at TEXT NOT NULL,
+        label TEXT,
+        endpoint TEXT,
+        pof_message TEXT,
+        document TEXT NOT NULL,
+        signature BLOB NOT NULL
+    );""",
 ]
 
+@timed_db
 def init() -> None:
     """
     Initialize DB file and apply light migrations:
       - ensure tables exist
       - add logs.label if missing
       - add sessions.initiator if missing
+      - add sessions.window_start/window_end if missing
+      - index logs.ts
+      - add log_partitions.encoding / label_version if missing
+      - add ingest_batches.sampled if missing
+      - register the legacy logs table as a partition, seed the log id sequence
+      - backfill the correlations index the first time it is created
+      - re-point or delete correlation events of partitions archived or
+        dropped before retention maintained them
     """
     Path(DB_PATH).parent.mkdir(parents=True, exist_ok=True)
     conn = _connect()
     try:
         cur = conn.cursor()
+        had_correlations = bool(_fetchall(
+            conn, "SELECT 1 FROM sqlite_master WHERE type='table' AND name='correlations'"
+        ))
+        had_events_part_index = bool(_fetchall(
+            conn, "SELECT 1 FROM sqlite_master WHERE type='index' AND name='idx_correlation_events_part'"
+        ))
         for stmt in DDL:
             cur.execute(stmt)
 
@@ -86,6 +235,27 @@ def init() -> None:
             cur.execute("ALTER TABLE logs ADD COLUMN label TEXT")
         if not _table_has_column(conn, "sessions", "initiator"):
             cur.execute("ALTER TABLE sessions ADD COLUMN initiator TEXT")
+        for col in ("window_start", "window_end"):
+            if not _table_has_column(conn, "sessions", col):
+                cur.execute(f"ALTER TABLE sessions ADD COLUMN {col} TEXT")
+        # recent/window scans order by ts
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_logs_ts ON logs(ts)")
+        # partitions created before dictionary encoding stay raw
+        if not _table_has_column(conn, "log_partitions", "encoding"):
+            cur.execute("ALTER TABLE log_partitions ADD COLUMN encoding TEXT NOT NULL DEFAULT 'raw'")
+        # bumped whenever labels in a partition change (columnar snapshots reload on it)
+        if not _table_has_column(conn, "log_partitions", "label_version"):
+            cur.execute("ALTER TABLE log_partitions ADD COLUMN label_version INTEGER NOT NULL DEFAULT 0")
+        # replayed Idempotency-Keys answer with the first batch's sampled count too
+        if not _table_has_column(conn, "ingest_batches", "sampled"):
+            cur.execute("ALTER TABLE ingest_batches ADD COLUMN sampled INTEGER NOT NULL DEFAULT 0")
+        # pre-partitioning rows stay queryable; new rows go to day partitions
+        _register_legacy(conn)
+        # correlations table is new: index rows that were ingested before it
+        if not had_correlations:
+            _backfill_correlations(conn)
+        elif not had_events_part_index:
+            _retire_stale_events(conn)
 
         conn.commit()
     finally:
@@ -93,12 +263,14 @@ def init() -> None:
 
 # ----------------------------- session helpers --------------------------------
 
+@timed_db
 def new_session(initiator: Optional[str] = None) -> str:
     """Create a session with generated id and return it."""
     sid = str(uuid.uuid4())
     create_session(sid, initiator=initiator or "")
     return sid
 
+@timed_db
 def create_session(session_id: str, initiator: str = "") -> None:
     conn = _connect()
     try:
@@ -115,6 +287,7 @@ def create_session(session_id: str, initiator: str = "") -> None:
     finally:
         conn.close()
 
+@timed_db
 def get_session(session_id: str) -> Optional[Dict[str, Any]]:
     conn = _connect()
     try:
@@ -123,6 +296,7 @@ def get_session(session_id: str) -> Optional[Dict[str, Any]]:
     finally:
         conn.close()
 
+@timed_db
 def update_step(session_id: str, step: int) -> None:
     conn = _connect()
     try:
@@ -131,6 +305,7 @@ def update_step(session_id: str, step: int) -> None:
     finally:
         conn.close()
 
+@timed_db
 def close_session(session_id: str) -> None:
     conn = _connect()
     try:
@@ -138,13 +313,94 @@ def close_session(session_id: str) -> None:
         conn.commit()
     finally:
         conn.close()
+    _notify_closed(session_id)
+
+# Called with the session id after a close is committed (close_session or a
+# save_turn with closed=True). Listeners must not raise and should hand slow
+# work to their own thread; they run on the request path.
+_close_listeners: List[Callable[[str], None]] = []
+
+def on_session_closed(fn: Callable[[str], None]) -> None:
+    if fn not in _close_listeners:
+        _close_listeners.append(fn)
+
+def _notify_closed(session_id: str) -> None:
+    for fn in _close_listeners:
+        fn(session_id)
+
+@timed_db
+def load_session(session_id: str) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+    """Session row plus its ordered answers, read over a single connection."""
+    conn = _connect()
+    try:
+        rows = _fetchall(conn, "SELECT * FROM sessions WHERE id=?", (session_id,))
+        if not rows:
+            return None
+        answers = _fetchall(
+            conn,
+            "SELECT step, question, answer FROM answers WHERE session_id=? ORDER BY step",
+            (session_id,),
+        )
+        return dict(rows[0]), [dict(r) for r in answers]
+    finally:
+        conn.close()
+
+@timed_db
+def save_turn(
+    session_id: str,
+    answers: List[Dict[str, Any]],
+    step: Optional[int] = None,
+    closed: Optional[bool] = None,
+    create: Optional[Dict[str, Any]] = None,
+    window: Optional[Tuple[Optional[str], Optional[str]]] = None,
+) -> None:
+    """
+    Persist one triage turn in a single transaction:
+      - create: session row to insert first ({created_at, initiator})
+      - answers: rows to upsert ({step, question, answer})
+      - step/closed: session fields to update (None = unchanged)
+      - window: (start, end) applied to the session (None = unchanged)
+    """
+    conn = _connect()
+    try:
+        if create is not None:
+            _exec(
+                conn,
+                "INSERT INTO sessions (id, created_at, step, closed, initiator) VALUES (?, ?, ?, ?, ?)",
+                (session_id, create.get("created_at") or datetime.utcnow().isoformat(),
+                 step or 0, int(bool(closed)), create.get("initiator") or ""),
+            )
+        if answers:
+            conn.executemany(
+                "INSERT OR REPLACE INTO answers (session_id, step, question, answer) VALUES (?, ?, ?, ?)",
+                [(session_id, a["step"], a["question"], a.get("answer")) for a in answers],
+            )
+        if create is None and (step is not None or closed is not None):
+            _exec(
+                conn,
+                "UPDATE sessions SET step=COALESCE(?, step), closed=COALESCE(?, closed) WHERE id=?",
+                (step, None if closed is None else int(bool(closed)), session_id),
+            )
+        if window is not None:
+            _exec(
+                conn,
+                "UPDATE sessions SET window_start=?, window_end=? WHERE id=?",
+                (window[0], window[1], session_id),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+    if closed:
+        _notify_closed(session_id)
 
 # ------------------------------ answers helpers -------------------------------
 
+@timed_db
 def add_answer(session_id: str, step: int, question: str, answer: Optional[str]) -> None:
     """Alias used by dynamic flow."""
     put_answer(session_id, step, question, answer)
 
+@timed_db
 def put_answer(session_id: str, step: int, question: str, answer: Optional[str]) -> None:
     """Back-compat name used in scripted flow."""
     conn = _connect()
@@ -158,6 +414,7 @@ def put_answer(session_id: str, step: int, question: str, answer: Optional[str])
     finally:
         conn.close()
 
+@timed_db
 def get_answers(session_id: str) -> List[Dict[str, Any]]:
     conn = _connect()
     try:
@@ -170,111 +427,818 @@ def get_answers(session_id: str) -> List[Dict[str, Any]]:
     finally:
         conn.close()
 
-# --------------------------- logs: ingest & queries ----------------------------
+# --------------------------- incident index rows -------------------------------
 
-def insert_logs(rows: List[Dict[str, Any]]) -> int:
-    """Bulk insert logs; returns number of inserted rows."""
-    if not rows:
-        return 0
+@timed_db
+def save_incident(row: Dict[str, Any]) -> None:
+    """Upsert one closed session's index row; the new rowid lets other workers pick it up."""
+    conn = _connect()
+    try:
+        _exec(
+            conn,
+            "INSERT OR REPLACE INTO incident_index "
+            "(session_id, closed_at, label, endpoint, pof_message, document, signature) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (row["session_id"], row["closed_at"], row.get("label"), row.get("endpoint"),
+             row.get("pof_message"), row["document"], row["signature"]),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+@timed_db
+def incidents_since(rowid: int, limit: int = 50000) -> List[Dict[str, Any]]:
+    """Index rows written after `rowid`, in rowid order (incremental loads)."""
+    conn = _connect()
+    try:
+        return _fetchall(
+            conn,
+            "SELECT rowid, session_id, closed_at, label, endpoint, pof_message, document, signature "
+            "FROM incident_index WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (rowid, limit),
+        )
+    finally:
+        conn.close()
+
+# ---------------------------------- jobs --------------------------------------
+#
+# State of app/services/jobs.py. A job is claimed with a conditional UPDATE
+# (queued -> running), so with several workers on one DB file each job runs
+# once; idx_jobs_pending keeps one pending job per (type, dedup_key).
+
+JOB_FINAL = ("done", "failed", "cancelled")
+
+@timed_db
+def insert_job(job_type: str, dedup_key: str, params: str, priority: int, now: float) -> Tuple[int, bool]:
+    """(job id, created). An identical queued/running job is returned instead of a new one."""
+    conn = _connect()
+    try:
+        while True:
+            try:
+                cur = conn.execute(
+                    "INSERT INTO jobs (type, dedup_key, params, priority, status, created_at) "
+                    "VALUES (?, ?, ?, ?, 'queued', ?)",
+                    (job_type, dedup_key, params, priority, now),
+                )
+                conn.commit()
+                return cur.lastrowid, True
+            except sqlite3.IntegrityError:
+                conn.rollback()
+            row = _fetchall(
+                conn,
+                "SELECT id FROM jobs WHERE type=? AND dedup_key=? AND status IN ('queued', 'running')",
+                (job_type, dedup_key),
+            )
+            if row:  # otherwise it finished in between: insert again
+                # a higher priority submit raises the pending one
+                conn.execute(
+                    "UPDATE jobs SET priority = MAX(priority, ?) WHERE id=? AND status='queued'",
+                    (priority, row[0]["id"]),
+                )
+                conn.commit()
+                return row[0]["id"], False
+    finally:
+        conn.close()
+
+@timed_db
+def get_job(job_id: int) -> Optional[Dict[str, Any]]:
+    conn = _connect()
+    try:
+        rows = _fetchall(conn, "SELECT * FROM jobs WHERE id=?", (job_id,))
+        return dict(rows[0]) if rows else None
+    finally:
+        conn.close()
+
+@timed_db
+def list_jobs(status: Optional[str] = None, job_type: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+    """Newest first."""
+    where, args = [], []
+    if status:
+        where.append("status=?")
+        args.append(status)
+    if job_type:
+        where.append("type=?")
+        args.append(job_type)
+    sql = "SELECT * FROM jobs" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY id DESC LIMIT ?"
+    conn = _connect()
+    try:
+        return [dict(r) for r in _fetchall(conn, sql, (*args, limit))]
+    finally:
+        conn.close()
+
+@timed_db
+def queued_jobs(types: List[str], limit: int) -> List[Dict[str, Any]]:
+    """Queued jobs of `types`, highest priority first, then oldest."""
+    if not types:
+        return []
+    conn = _connect()
+    try:
+        return [dict(r) for r in _fetchall(
+            conn,
+            f"SELECT id, type, params FROM jobs WHERE status='queued' AND type IN ({','.join('?' * len(types))}) "
+            "ORDER BY priority DESC, id LIMIT ?",
+            (*types, limit),
+        )]
+    finally:
+        conn.close()
+
+@timed_db
+def claim_job(job_id: int, now: float) -> bool:
+    """queued -> running; False if another worker got it first (or it was cancelled)."""
+    conn = _connect()
+    try:
+        cur = conn.execute(
+            "UPDATE jobs SET status='running', started_at=?, heartbeat_at=?, attempts=attempts+1 "
+            "WHERE id=? AND status='queued'",
+            (now, now, job_id),
+        )
+        conn.commit()
+        return cur.rowcount == 1
+    finally:
+        conn.close()
+
+@timed_db
+def finish_job(job_id: int, status: str, result: Optional[str], error: Optional[str], now: float) -> str:
+    """Record the outcome of a running job; a cancel requested meanwhile wins. Returns the final status."""
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE jobs SET status = CASE WHEN cancel_requested THEN 'cancelled' ELSE ? END, "
+            "result=?, error=?, finished_at=? WHERE id=? AND status='running'",
+            (status, result, error, now, job_id),
+        )
+        conn.commit()
+        row = _fetchall(conn, "SELECT status FROM jobs WHERE id=?", (job_id,))
+        return row[0]["status"] if row else status
+    finally:
+        conn.close()
+
+@timed_db
+def cancel_job(job_id: int, now: float) -> Optional[str]:
+    """Queued jobs are cancelled at once, running ones are flagged. Returns the status after, None if unknown."""
+    conn = _connect()
+    try:
+        conn.execute("UPDATE jobs SET status='cancelled', finished_at=? WHERE id=? AND status='queued'", (now, job_id))
+        conn.execute("UPDATE jobs SET cancel_requested=1 WHERE id=? AND status='running'", (job_id,))
+        conn.commit()
+        row = _fetchall(conn, "SELECT status FROM jobs WHERE id=?", (job_id,))
+        return row[0]["status"] if row else None
+    finally:
+        conn.close()
+
+@timed_db
+def job_cancel_requested(job_ids: List[int]) -> List[int]:
+    if not job_ids:
+        return []
+    conn = _connect()
+    try:
+        return [r[0] for r in conn.execute(
+            f"SELECT id FROM jobs WHERE cancel_requested=1 AND id IN ({','.join('?' * len(job_ids))})", job_ids
+        )]
+    finally:
+        conn.close()
+
+@timed_db
+def heartbeat_jobs(job_ids: List[int], now: float) -> None:
+    if not job_ids:
+        return
+    conn = _connect()
+    try:
+        conn.execute(
+            f"UPDATE jobs SET heartbeat_at=? WHERE status='running' AND id IN ({','.join('?' * len(job_ids))})",
+            (now, *job_ids),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+@timed_db
+def requeue_stale_jobs(heartbeat_before: float, max_attempts: int, now: float) -> Tuple[int, int]:
+    """Running jobs whose worker stopped heartbeating: back to the queue, or failed after max_attempts."""
+    conn = _connect()
+    try:
+        failed = conn.execute(
+            "UPDATE jobs SET status='failed', error='worker lost', finished_at=? "
+            "WHERE status='running' AND heartbeat_at < ? AND attempts >= ?",
+            (now, heartbeat_before, max_attempts),
+        ).rowcount
+        requeued = conn.execute(
+            "UPDATE jobs SET status = CASE WHEN cancel_requested THEN 'cancelled' ELSE 'queued' END, "
+            "finished_at = CASE WHEN cancel_requested THEN ? END "
+            "WHERE status='running' AND heartbeat_at < ?",
+            (now, heartbeat_before),
+        ).rowcount
+        conn.commit()
+        return requeued, failed
+    finally:
+        conn.close()
+
+@timed_db
+def prune_jobs(finished_before: float) -> int:
+    conn = _connect()
+    try:
+        n = conn.execute(
+            f"DELETE FROM jobs WHERE status IN ({','.join('?' * len(JOB_FINAL))}) AND finished_at < ?",
+            (*JOB_FINAL, finished_before),
+        ).rowcount
+        conn.commit()
+        return n
+    finally:
+        conn.close()
+
+# ------------------------------ log partitions --------------------------------
+#
+# Logs are stored in one table per UTC day (logs_pYYYYMMDD, routed by the ts
+# prefix; rows without a parseable ts go to logs_pundated). log_partitions
+# keeps each table's ts / id range so queries only touch partitions that can
+# match, and retention is a DROP TABLE instead of a huge DELETE. Ids come
+# from log_seq so they stay unique across partitions. A pre-existing `logs`
+# table is kept and registered as the "legacy" partition.
+#
+# New partitions are dictionary-encoded (encoding='dict', see codec.py):
+# source/level/endpoint/account/label and the message template are ids into
+# log_dict, the message keeps only its variable parts. Older partitions and
+# the legacy table are 'raw'. Every helper returns the same decoded dicts.
+
+PARTITION_PREFIX = "logs_p"
+LEGACY_PARTITION = "logs"
+LOG_COLUMNS = ("id", "source", "ts", "level", "message", "correlation_id", "endpoint", "account", "label")
+_DICT_COLUMNS = "id, ts, correlation_id, source_id, level_id, endpoint_id, account_id, label_id, template_id, params"
+_DAY = re.compile(r"^(\d{4})-(\d{2})-(\d{2})")
+
+def partition_day(ts: Optional[str]) -> str:
+    m = _DAY.match(ts or "")
+    return f"{m.group(1)}-{m.group(2)}-{m.group(3)}" if m else "undated"
+
+def partition_name(day: str) -> str:
+    return PARTITION_PREFIX + day.replace("-", "")
+
+def _ensure_partition(conn: sqlite3.Connection, day: str) -> Tuple[str, str]:
+    """Create the day's table if needed; returns (name, encoding)."""
+    # IF NOT EXISTS every batch: another worker may have created or dropped it
+    name = partition_name(day)
+    conn.execute(
+        "INSERT OR IGNORE INTO log_partitions (name, day, rows, created_at, encoding) VALUES (?, ?, 0, ?, 'dict')",
+        (name, day, datetime.utcnow().isoformat()),
+    )
+    encoding = conn.execute("SELECT encoding FROM log_partitions WHERE name=?", (name,)).fetchone()[0]
+    if encoding == "dict":
+        conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS {name} (
+                id INTEGER PRIMARY KEY,
+                ts TEXT,
+                correlation_id TEXT,
+                source_id INTEGER,
+                level_id INTEGER,
+                endpoint_id INTEGER,
+                account_id INTEGER,
+                label_id INTEGER,
+                template_id INTEGER,
+                params TEXT
+            )"""
+        )
+    else:
+        conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS {name} (
+                id INTEGER PRIMARY KEY,
+                source TEXT,
+                ts TEXT,
+                level TEXT,
+                message TEXT,
+                correlation_id TEXT,
+                endpoint TEXT,
+                account TEXT,
+                label TEXT
+            )"""
+        )
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{name}_ts ON {name}(ts)")
+    return name, encoding
+
+def _partitions(
+    conn: sqlite3.Connection, start_ts: Optional[str] = None, end_ts: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Partitions whose ts range can overlap [start_ts, end_ts], oldest first."""
+    rows = _fetchall(conn, "SELECT * FROM log_partitions WHERE rows > 0 ORDER BY min_ts")
+    out = []
+    for r in rows:
+        if (start_ts or end_ts) and r["min_ts"] is None:
+            continue  # undated rows never satisfy a ts bound
+        if start_ts and r["max_ts"] < start_ts:
+            continue
+        if end_ts and r["min_ts"] > end_ts:
+            continue
+        out.append(dict(r))
+    return out
+
+def _encode_rows(rows: List[Dict[str, Any]], split: Dict[int, Tuple[Optional[str], Optional[str]]]) -> List[tuple]:
+    """Rows -> encoded tuples in _DICT_COLUMNS order (dictionary ids must already exist)."""
+    ids = dictionary.ids
+    out = []
+    for r in rows:
+        template, params = split[r["id"]]
+        get = r.get
+        out.append((
+            r["id"],
+            get("ts"),
+            get("correlation_id"),
+            ids[("source", get("source"))],
+            ids[("level", get("level"))],
+            ids[("endpoint", get("endpoint"))],
+            ids[("account", get("account"))],
+            ids[("label", get("label"))],
+            ids[("template", template)],
+            params,
+        ))
+    return out
+
+def _decode_rows(conn: sqlite3.Connection, rows: List[sqlite3.Row], columns: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    """Encoded partition rows (selected with _DICT_COLUMNS) -> plain dicts with `columns`."""
+    values = dictionary.values
+    try:
+        return _decode_with(values, rows, columns)
+    except KeyError:
+        # ids assigned by another worker since we last looked: fetch them once, retry
+        dictionary.decode(conn, (i for r in rows for i in tuple(r)[3:9]))
+        return _decode_with(values, rows, columns)
+
+def _decode_with(values: Dict[Any, Any], rows: List[sqlite3.Row], columns: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    out = []
+    project = columns != LOG_COLUMNS
+    for (rid, ts, corr, src, lvl, ep, acct, lbl, tpl, params) in rows:
+        full = {
+            "id": rid,
+            "source": values[src],
+            "ts": ts,
+            "level": values[lvl],
+            "message": join_message(values[tpl], params),
+            "correlation_id": corr,
+            "endpoint": values[ep],
+            "account": values[acct],
+            "label": values[lbl],
+        }
+        out.append({c: full[c] for c in columns} if project else full)
+    return out
+
+def _error_filter(conn: sqlite3.Connection, encoding: str) -> str:
+    if encoding != "dict":
+        return "level IN ('ERROR','FATAL','EXCEPTION','CRITICAL')"
+    ids = dictionary.ids_for(conn, "level", list(POF_LEVELS))
+    return f"level_id IN ({','.join(str(i) for i in ids) or 'NULL'})"
+
+def _select(
+    conn: sqlite3.Connection,
+    part: Dict[str, Any],
+    where: str,
+    args: tuple,
+    order: str,
+    limit: int,
+    columns: Tuple[str, ...] = LOG_COLUMNS,
+) -> List[Dict[str, Any]]:
+    """
+    Rows of one partition as plain dicts. `where` may only use ts, id and
+    correlation_id plus an {errors} placeholder (error-level filter), which
+    mean the same thing in raw and encoded tables.
+    """
+    encoding = part.get("encoding") or "raw"
+    cond = where.format(errors=_error_filter(conn, encoding)) if "{errors}" in where else where
+    cols = _DICT_COLUMNS if encoding == "dict" else ", ".join(columns)
+    rows = _fetchall(
+        conn,
+        f"SELECT {cols} FROM {part['name']} WHERE {cond} ORDER BY {order} LIMIT ?",
+        args + (limit,),
+    )
+    if encoding == "dict":
+        return _decode_rows(conn, rows, columns)
+    return [dict(r) for r in rows]
+
+def _query_partitions(
+    conn: sqlite3.Connection,
+    parts: List[Dict[str, Any]],
+    where: str,
+    args: tuple,
+    limit: int,
+    desc: bool = False,
+    columns: Tuple[str, ...] = LOG_COLUMNS,
+) -> List[Dict[str, Any]]:
+    """
+    Run one filtered, ts-ordered query per partition and merge by ts,
+    stopping as soon as the remaining partitions cannot beat the rows
+    already collected.
+    """
+    def key(r):
+        return r["ts"] or ""
+
+    if desc:
+        parts = sorted(parts, key=lambda p: p["max_ts"] or "", reverse=True)
+    out: List[Dict[str, Any]] = []
+    for p in parts:
+        if len(out) >= limit:
+            edge = key(out[limit - 1])
+            if (not desc and (p["min_ts"] or "") > edge) or (desc and (p["max_ts"] or "") < edge):
+                break
+        rows = _select(conn, p, where, args, "ts DESC" if desc else "ts ASC", limit, columns)
+        out = list(islice(heapq.merge(out, rows, key=key, reverse=desc), limit))
+    return out
+
+def read_partition(
+    conn: sqlite3.Connection, part: Dict[str, Any], where: str, args: tuple, order: str, limit: int
+) -> List[Dict[str, Any]]:
+    """Decoded full rows of one partition (used by the archiver)."""
+    return _select(conn, part, where, args, order, limit)
+
+# columns of partition_columns(), every field but id/ts as a log_dict id
+ID_COLUMNS = ("id", "ts", "source_id", "level_id", "endpoint_id", "account_id", "label_id", "template_id")
+
+@timed_db
+def partition_columns(part: Dict[str, Any], after_id: int = 0) -> List[tuple]:
+    """
+    Rows of one partition with id > after_id as ID_COLUMNS tuples, id order
+    (read path of the columnar analytics snapshots). Raw partitions are
+    encoded on the fly, adding any missing dictionary values.
+    """
+    conn = _connect()
+    try:
+        name = part["name"]
+        if part.get("encoding") == "dict":
+            return [
+                tuple(r) for r in conn.execute(
+                    f"SELECT {', '.join(ID_COLUMNS)} FROM {name} WHERE id > ? ORDER BY id", (after_id,)
+                )
+            ]
+        rows = conn.execute(
+            f"SELECT id, ts, source, level, endpoint, account, label, message FROM {name} "
+            "WHERE id > ? ORDER BY id",
+            (after_id,),
+        ).fetchall()
+        templates = [split_message(r["message"])[0] for r in rows]
+        dictionary.ensure(
+            conn,
+            [(f, r[f]) for r in rows for f in ("source", "level", "endpoint", "account", "label")]
+            + [("template", t) for t in templates],
+        )
+        conn.commit()
+        ids = dictionary.ids
+        return [
+            (r["id"], r["ts"], ids[("source", r["source"])], ids[("level", r["level"])],
+             ids[("endpoint", r["endpoint"])], ids[("account", r["account"])], ids[("label", r["label"])],
+             ids[("template", t)])
+            for r, t in zip(rows, templates)
+        ]
+    finally:
+        conn.close()
+
+@timed_db
+def dictionary_ids(kind: str, values: List[str]) -> List[int]:
+    """log_dict ids of existing values of one kind (unknown values are skipped)."""
     conn = _connect()
     try:
-        payload = [
-            (
-                r.get("source"),
-                r.get("ts"),
-                r.get("level"),
-                r.get("message"),
-                r.get("correlation_id"),
-                r.get("endpoint"),
-                r.get("account"),
+        return dictionary.ids_for(conn, kind, values)
+    finally:
+        conn.close()
+
+@timed_db
+def dictionary_values(ids) -> Dict[int, Optional[str]]:
+    """log_dict id -> value for the given ids."""
+    ids = list(ids)
+    conn = _connect()
+    try:
+        dictionary.decode(conn, ids)
+        return {i: dictionary.value(i) for i in ids}
+    finally:
+        conn.close()
+
+# columns of sampled_counts(): minute + the ID_COLUMNS ids (no id/ts) + dropped
+SAMPLED_COLUMNS = ("minute", "source_id", "level_id", "endpoint_id", "account_id", "label_id", "template_id", "dropped")
+
+@timed_db
+def sampled_counts() -> List[tuple]:
+    """Per-minute drop counts of ingest sampling as SAMPLED_COLUMNS tuples."""
+    conn = _connect()
+    try:
+        return [tuple(r) for r in conn.execute(f"SELECT {', '.join(SAMPLED_COLUMNS)} FROM log_sampled WHERE dropped > 0")]
+    finally:
+        conn.close()
+
+@timed_db
+def log_partitions() -> List[Dict[str, Any]]:
+    conn = _connect()
+    try:
+        return [dict(r) for r in _fetchall(conn, "SELECT * FROM log_partitions ORDER BY min_ts")]
+    finally:
+        conn.close()
+
+@timed_db
+def log_ts_bounds() -> Tuple[Optional[str], Optional[str]]:
+    conn = _connect()
+    try:
+        row = _fetchall(conn, "SELECT MIN(min_ts) AS lo, MAX(max_ts) AS hi FROM log_partitions WHERE rows > 0")[0]
+        return row["lo"], row["hi"]
+    finally:
+        conn.close()
+
+@timed_db
+def drop_partitions_before(day: str) -> List[str]:
+    """Retention: drop every day partition older than `day` (YYYY-MM-DD); O(1) per partition."""
+    conn = _connect()
+    try:
+        names = [
+            r["name"] for r in _fetchall(
+                conn,
+                "SELECT name FROM log_partitions WHERE day < ? AND day != 'undated' AND name != ?",
+                (day, LEGACY_PARTITION),
             )
-            for r in rows
         ]
-        conn.executemany(
-            "INSERT INTO logs (source, ts, level, message, correlation_id, endpoint, account) "
-            "VALUES (?, ?, ?, ?, ?, ?, ?)",
-            payload,
+        for name in names:
+            conn.execute("DELETE FROM log_partitions WHERE name=?", (name,))
+            conn.execute(f"DROP TABLE IF EXISTS {name}")
+            _forget_correlation_events(conn, "part = ?", (name,))
+        conn.execute("DELETE FROM log_sampled WHERE minute < ?", (day,))
+        conn.commit()
+        return names
+    finally:
+        conn.close()
+
+def _register_legacy(conn: sqlite3.Connection) -> None:
+    """Expose rows of the pre-partitioning `logs` table as one more partition."""
+    row = _fetchall(
+        conn, "SELECT COUNT(1) AS n, MIN(ts) AS lo, MAX(ts) AS hi, MIN(id) AS a, MAX(id) AS b FROM logs"
+    )[0]
+    if row["n"]:
+        conn.execute(
+            "INSERT OR REPLACE INTO log_partitions (name, day, min_ts, max_ts, min_id, max_id, rows, created_at) "
+            "VALUES (?, 'legacy', ?, ?, ?, ?, ?, ?)",
+            (LEGACY_PARTITION, row["lo"], row["hi"], row["a"], row["b"], row["n"], datetime.utcnow().isoformat()),
         )
+    else:
+        conn.execute("DELETE FROM log_partitions WHERE name=?", (LEGACY_PARTITION,))
+    # continue after every id ever handed out (hot, legacy autoincrement, archived)
+    seq = max(
+        row["b"] or 0,
+        conn.execute("SELECT COALESCE(MAX(max_id), 0) FROM log_partitions").fetchone()[0],
+        conn.execute("SELECT COALESCE(MAX(max_id), 0) FROM log_segments").fetchone()[0],
+        conn.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name='logs'").fetchone()[0],
+    )
+    conn.execute(
+        "INSERT INTO log_seq (name, last_id) VALUES ('logs', ?) "
+        "ON CONFLICT(name) DO UPDATE SET last_id = MAX(last_id, excluded.last_id)",
+        (seq,),
+    )
+
+# --------------------------- logs: ingest & queries ----------------------------
+
+class DuplicateBatch(Exception):
+    """The Idempotency-Key was already used; carries the first batch's result."""
+
+    def __init__(self, key: str, rows: int, duplicates: int, sampled: int = 0):
+        super().__init__(key)
+        self.key = key
+        self.rows = rows
+        self.duplicates = duplicates
+        self.sampled = sampled
+
+WINDOW_COLUMNS = ("id", "ts", "level", "message", "correlation_id", "endpoint")
+POF_LEVELS = ("ERROR", "FATAL", "EXCEPTION", "CRITICAL")
+
+@timed_db
+def insert_logs(rows: List[Dict[str, Any]], idempotency_key: Optional[str] = None,
+                stored: Optional[List[Dict[str, Any]]] = None) -> int:
+    """
+    Bulk insert logs into their day partitions; returns number of inserted rows.
+    Each inserted row dict gets its new ``id`` stamped on it (one contiguous id
+    range per batch, reserved from log_seq inside the same write transaction);
+    rows dropped as duplicates (see app/store/dedup.py) get no id, rows dropped
+    by sampling (app/store/sampling.py) get ``sampled`` instead. Parked rows of
+    earlier batches rescued by sampling are inserted (and counted) too; pass
+    a `stored` list to get every inserted row dict, rescued ones included.
+    With an `idempotency_key` already used by an earlier batch nothing is
+    written and DuplicateBatch is raised.
+    """
+    if not rows and idempotency_key is None:
+        return 0
+    conn = _connect()
+    try:
+        # new dictionary values go in their own short transaction first
+        split = [split_message(r.get("message")) for r in rows]
+        dictionary.ensure(
+            conn,
+            [(f, r.get(f)) for r in rows for f in ENCODED_FIELDS] + [("template", t) for t, _ in split],
+        )
+        conn.commit()
+
+        # the write lock is taken up front, so the whole batch is serialized
+        conn.execute("BEGIN IMMEDIATE")
+        if idempotency_key is not None:
+            prev = conn.execute(
+                "SELECT rows, duplicates, sampled FROM ingest_batches WHERE key=?", (idempotency_key,)
+            ).fetchone()
+            if prev is not None:
+                conn.rollback()
+                raise DuplicateBatch(idempotency_key, prev["rows"], prev["duplicates"], prev["sampled"])
+        split_of = {id(r): parts for r, parts in zip(rows, split)}
+        rows, duplicates = dedup.filter_new(conn, rows)
+        split = [split_of[id(r)] for r in rows]
+        # heavy-hitter sketches count every new row, sampled out or not (after commit)
+        fresh, fresh_templates = rows, [t for t, _ in split]
+        rows, split = sampling.apply(conn, rows, split, SEVERITY)
+        if idempotency_key is not None:
+            conn.execute(
+                "INSERT INTO ingest_batches (key, created_at, rows, duplicates, sampled) VALUES (?, ?, ?, ?, ?)",
+                (idempotency_key, int(datetime.utcnow().timestamp()), len(rows), duplicates,
+                 sum(1 for r in fresh if r.get("sampled"))),
+            )
+        if not rows:
+            conn.commit()
+            sketches.observe(fresh, fresh_templates)
+            return 0
+
+        conn.execute("UPDATE log_seq SET last_id = last_id + ? WHERE name='logs'", (len(rows),))
+        last_id = conn.execute("SELECT last_id FROM log_seq WHERE name='logs'").fetchone()[0]
+        next_id = last_id - len(rows) + 1
+        by_day: Dict[str, List[Dict[str, Any]]] = {}
+        part_of: Dict[int, str] = {}
+        split_by_id: Dict[int, Tuple[Optional[str], Optional[str]]] = {}
+        for r, parts in zip(rows, split):
+            split_by_id[next_id] = parts
+            r["id"] = next_id
+            next_id += 1
+            by_day.setdefault(partition_day(r.get("ts")), []).append(r)
+        for day, day_rows in by_day.items():
+            name, encoding = _ensure_partition(conn, day)
+            for r in day_rows:
+                part_of[r["id"]] = name
+            if encoding == "dict":
+                conn.executemany(
+                    f"INSERT INTO {name} ({_DICT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    _encode_rows(day_rows, split_by_id),
+                )
+            else:
+                conn.executemany(
+                    f"INSERT INTO {name} (id, source, ts, level, message, correlation_id, endpoint, account, label) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (r["id"], r.get("source"), r.get("ts"), r.get("level"), r.get("message"),
+                         r.get("correlation_id"), r.get("endpoint"), r.get("account"), r.get("label"))
+                        for r in day_rows
+                    ],
+                )
+            ts_vals = [r["ts"] for r in day_rows if r.get("ts")]
+            conn.execute(
+                """UPDATE log_partitions SET
+                     rows = rows + :n,
+                     min_ts = CASE WHEN :lo IS NULL THEN min_ts ELSE MIN(COALESCE(min_ts, :lo), :lo) END,
+                     max_ts = CASE WHEN :hi IS NULL THEN max_ts ELSE MAX(COALESCE(max_ts, :hi), :hi) END,
+                     min_id = MIN(COALESCE(min_id, :first), :first),
+                     max_id = MAX(COALESCE(max_id, :last), :last)
+                   WHERE name = :name""",
+                {
+                    "n": len(day_rows),
+                    "lo": min(ts_vals, default=None),
+                    "hi": max(ts_vals, default=None),
+                    "first": day_rows[0]["id"],
+                    "last": day_rows[-1]["id"],
+                    "name": name,
+                },
+            )
+        _record_correlations(conn, rows, part_of)
         conn.commit()
+        sketches.observe(fresh, fresh_templates)
+        if stored is not None:
+            stored.extend(rows)
         return len(rows)
     finally:
         conn.close()
 
+@timed_db
 def upsert_log_label(log_id: int, label: str) -> None:
+    upsert_log_labels([{"id": log_id, "label": label}])
+
+@timed_db
+def upsert_log_labels(items: List[Dict[str, Any]]) -> None:
+    """Set labels for many rows ({id, label}) in one transaction, keeping correlation label counts in step."""
+    if not items:
+        return
     conn = _connect()
     try:
-        _exec(conn, "UPDATE logs SET label=? WHERE id=?", (label, log_id))
+        dictionary.ensure(conn, [("label", i["label"]) for i in items])
+        conn.commit()
+        parts = _fetchall(conn, "SELECT name, encoding, min_id, max_id FROM log_partitions WHERE rows > 0")
+        changed: List[Tuple[int, Optional[str], str]] = []  # (id, corr, new label)
+        touched = set()
+        for item in items:
+            log_id, label = item["id"], item["label"]
+            # id ranges of partitions can overlap (a batch spans days); try each candidate
+            for p in parts:
+                if p["min_id"] is None or not (p["min_id"] <= log_id <= p["max_id"]):
+                    continue
+                if p["encoding"] == "dict":
+                    cur = conn.execute(
+                        f"UPDATE {p['name']} SET label_id=? WHERE id=? RETURNING correlation_id",
+                        (dictionary.ids[("label", label)], log_id),
+                    )
+                else:
+                    cur = conn.execute(
+                        f"UPDATE {p['name']} SET label=? WHERE id=? RETURNING correlation_id", (label, log_id)
+                    )
+                hit = cur.fetchone()
+                if hit is not None:
+                    touched.add(p["name"])
+                    if hit[0]:
+                        changed.append((log_id, hit[0], label))
+                    break
+        _relabel_correlations(conn, changed)
+        conn.executemany(
+            "UPDATE log_partitions SET label_version = label_version + 1 WHERE name=?", [(n,) for n in touched]
+        )
         conn.commit()
     finally:
         conn.close()
+
+@timed_db
 def fetch_logs_window(start_ts: Optional[str], end_ts: Optional[str], limit: int = 200) -> List[Dict[str, Any]]:
     """
     Return logs between start_ts and end_ts (inclusive).
     - If start_ts is None: open-ended from earliest.
     - If end_ts is None: open-ended to latest.
     Timestamps are compared as strings (ISO-8601 expected, which your logs use).
+    Only partitions overlapping the window are read; archived (cold) rows in
+    the window are merged in transparently.
     """
     conn = _connect()
     try:
-        rows = _fetchall(
+        hot = _query_partitions(
             conn,
-            """
-            SELECT id, ts, level, message, correlation_id, endpoint
-            FROM logs
-            WHERE (? IS NULL OR ts >= ?)
-              AND (? IS NULL OR ts <= ?)
-            ORDER BY ts ASC
-            LIMIT ?
-            """,
-            (start_ts, start_ts, end_ts, end_ts, limit),
+            _partitions(conn, start_ts, end_ts),
+            "(? IS NULL OR ts >= ?) AND (? IS NULL OR ts <= ?)",
+            (start_ts, start_ts, end_ts, end_ts),
+            limit,
+            columns=WINDOW_COLUMNS,
         )
-        return [dict(r) for r in rows]
     finally:
         conn.close()
+    if not archive.has_segments():
+        return hot
+    cold = archive.fetch_window(start_ts, end_ts, limit)
+    return archive.merge_rows(hot, cold, limit, WINDOW_COLUMNS)
         
+@timed_db
 def fetch_recent_logs(limit: int = 500) -> List[Dict[str, Any]]:
     """Return recent logs including label (needed by dynamic questioner)."""
     conn = _connect()
     try:
-        rows = _fetchall(
+        return _query_partitions(
             conn,
-            "SELECT id, ts, level, message, correlation_id, endpoint, label "
-            "FROM logs ORDER BY ts DESC LIMIT ?",
-            (limit,),
+            _partitions(conn),
+            "1",
+            (),
+            limit,
+            desc=True,
+            columns=("id", "ts", "level", "message", "correlation_id", "endpoint", "label"),
         )
-        return [dict(r) for r in rows]
     finally:
         conn.close()
 
+@timed_db
 def count_labels() -> Dict[str, int]:
     conn = _connect()
     try:
-        rows = _fetchall(
-            conn,
-            "SELECT COALESCE(label,'other') AS label, COUNT(1) AS cnt FROM logs "
-            "GROUP BY COALESCE(label,'other')"
-        )
-        return {r["label"]: r["cnt"] for r in rows}
+        out: Dict[str, int] = {}
+        for p in _partitions(conn):
+            if p["encoding"] == "dict":
+                rows = _fetchall(conn, f"SELECT label_id, COUNT(1) AS cnt FROM {p['name']} GROUP BY label_id")
+                dictionary.decode(conn, (r["label_id"] for r in rows))
+                counts = [(dictionary.value(r["label_id"]) or "other", r["cnt"]) for r in rows]
+            else:
+                rows = _fetchall(
+                    conn,
+                    f"SELECT COALESCE(label,'other') AS label, COUNT(1) AS cnt FROM {p['name']} "
+                    "GROUP BY COALESCE(label,'other')"
+                )
+                counts = [(r["label"], r["cnt"]) for r in rows]
+            for label, cnt in counts:
+                out[label] = out.get(label, 0) + cnt
+        # rows dropped by ingest sampling still count
+        rows = _fetchall(conn, "SELECT label_id, SUM(dropped) AS cnt FROM log_sampled GROUP BY label_id")
+        dictionary.decode(conn, (r["label_id"] for r in rows))
+        for r in rows:
+            label = dictionary.value(r["label_id"]) or "other"
+            out[label] = out.get(label, 0) + r["cnt"]
+        return out
     finally:
         conn.close()
 
+@timed_db
 def find_recent_errors(limit: int = 20) -> List[Dict[str, Any]]:
     conn = _connect()
     try:
-        rows = _fetchall(
-            conn,
-            "SELECT * FROM logs WHERE level IN ('ERROR','FATAL','EXCEPTION','CRITICAL') "
-            "ORDER BY ts DESC LIMIT ?",
-            (limit,),
-        )
-        return [dict(r) for r in rows]
+        return _query_partitions(conn, _partitions(conn), "{errors}", (), limit, desc=True)
     finally:
         conn.close()
 
+@timed_db
 def find_pof_window(start_ts: Optional[str] = None, end_ts: Optional[str] = None) -> Optional[Dict[str, Any]]:
     conn = _connect()
     try:
-        q = "SELECT * FROM logs WHERE level IN ('ERROR','FATAL','EXCEPTION','CRITICAL')"
+        q = "{errors}"
         params: list[Any] = []
         if start_ts:
             q += " AND ts >= ?"
@@ -282,20 +1246,283 @@ def find_pof_window(start_ts: Optional[str] = None, end_ts: Optional[str] = None
         if end_ts:
             q += " AND ts <= ?"
             params.append(end_ts)
-        q += " ORDER BY ts ASC LIMIT 1"
-        rows = _fetchall(conn, q, tuple(params))
-        return dict(rows[0]) if rows else None
+        rows = _query_partitions(conn, _partitions(conn, start_ts, end_ts), q, tuple(params), 1)
+        hot = rows[0] if rows else None
     finally:
         conn.close()
+    if not archive.has_segments():
+        return hot
+    # the cold tier only matters if it can hold an earlier error than the hot one
+    cold = archive.find_first(start_ts, hot["ts"] if hot else end_ts, lambda r: r.get("level") in POF_LEVELS)
+    if cold and (hot is None or (cold.get("ts") or "") <= (hot.get("ts") or "")):
+        return cold
+    return hot
 
+@timed_db
 def search_correlation(correlation_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+    rows, _ = correlation_timeline(correlation_id, limit)
+    return rows
+
+# ------------------------------- correlations ---------------------------------
+#
+# insert_logs keeps, per correlation id: a `correlations` row (first/last ts,
+# event count, max severity), its endpoints/sources (`correlation_attrs`),
+# label counts (`correlation_labels`, majority = top count) and one
+# `correlation_events` row per event keyed (correlation_id, ts, log_id).
+# All of it is written with blind upserts (no read-modify-write), and a
+# trace is one index range read instead of a scan of every partition.
+# Events of archived partitions are re-pointed to COLD_PART and read back
+# from the segments; retention (hot partitions or cold segments) deletes
+# events together with their rows (_forget_correlation_events).
+
+SEVERITY = {"TRACE": 0, "DEBUG": 1, "INFO": 2, "WARN": 3, "WARNING": 3,
+            "ERROR": 4, "EXCEPTION": 5, "CRITICAL": 6, "FATAL": 7}
+COLD_PART = "cold"  # correlation_events.part for rows that only exist in segments
+
+def _majority(counts: Dict[str, int]) -> Optional[str]:
+    """Most frequent label, preferring anything over "other" (same rule as the labeler)."""
+    if not counts:
+        return None
+    return max(counts.items(), key=lambda kv: (kv[0] != "other", kv[1]))[0]
+
+def _label_counts(conn: sqlite3.Connection, corr_ids: List[str]) -> Dict[str, Dict[str, int]]:
+    out: Dict[str, Dict[str, int]] = {}
+    for start in range(0, len(corr_ids), 500):
+        chunk = corr_ids[start:start + 500]
+        for r in _fetchall(
+            conn,
+            f"SELECT correlation_id, label, n FROM correlation_labels "
+            f"WHERE correlation_id IN ({','.join('?' * len(chunk))}) AND n > 0",
+            tuple(chunk),
+        ):
+            out.setdefault(r["correlation_id"], {})[r["label"]] = r["n"]
+    return out
+
+def _bump_labels(conn: sqlite3.Connection, deltas: Dict[Tuple[str, str], int]) -> None:
+    conn.executemany(
+        "INSERT INTO correlation_labels (correlation_id, label, n) VALUES (?, ?, ?) "
+        "ON CONFLICT(correlation_id, label) DO UPDATE SET n = n + excluded.n",
+        [(cid, label, d) for (cid, label), d in deltas.items() if d],
+    )
+
+def _record_correlations(conn: sqlite3.Connection, rows: List[Dict[str, Any]], part_of: Dict[int, str]) -> None:
+    """Fold one inserted batch into the correlation tables (caller's transaction)."""
+    agg: Dict[str, list] = {}  # cid -> [first_ts, last_ts, events, max_sev, max_level]
+    attrs = set()
+    labels: Dict[Tuple[str, str], int] = {}
+    events = []
+    for r in rows:
+        cid = r.get("correlation_id")
+        if not cid:
+            continue
+        ts = r.get("ts")
+        level = (r.get("level") or "").upper()
+        sev = SEVERITY.get(level)
+        a = agg.get(cid)
+        if a is None:
+            a = agg[cid] = [ts, ts, 0, sev, level if sev is not None else None]
+        else:
+            if ts and (a[0] is None or ts < a[0]):
+                a[0] = ts
+            if ts and (a[1] is None or ts > a[1]):
+                a[1] = ts
+            if sev is not None and (a[3] is None or sev > a[3]):
+                a[3], a[4] = sev, level
+        a[2] += 1
+        if r.get("endpoint"):
+            attrs.add((cid, "endpoint", r["endpoint"]))
+        if r.get("source"):
+            attrs.add((cid, "source", r["source"]))
+        if r.get("label"):
+            labels[(cid, r["label"])] = labels.get((cid, r["label"]), 0) + 1
+        events.append((cid, ts or "", r["id"], part_of.get(r["id"], COLD_PART), r.get("label")))
+    if not agg:
+        return
+    conn.executemany(
+        """INSERT INTO correlations (correlation_id, first_ts, last_ts, events, max_severity, max_level)
+           VALUES (?, ?, ?, ?, ?, ?)
+           ON CONFLICT(correlation_id) DO UPDATE SET
+             first_ts = MIN(COALESCE(first_ts, excluded.first_ts), COALESCE(excluded.first_ts, first_ts)),
+             last_ts = MAX(COALESCE(last_ts, excluded.last_ts), COALESCE(excluded.last_ts, last_ts)),
+             events = events + excluded.events,
+             max_level = CASE WHEN COALESCE(excluded.max_severity, -1) > COALESCE(max_severity, -1)
+                              THEN excluded.max_level ELSE max_level END,
+             max_severity = MAX(COALESCE(max_severity, -1), COALESCE(excluded.max_severity, -1))""",
+        [(cid, *a) for cid, a in agg.items()],
+    )
+    conn.executemany("INSERT OR IGNORE INTO correlation_attrs (correlation_id, kind, value) VALUES (?, ?, ?)", attrs)
+    _bump_labels(conn, labels)
+    conn.executemany(
+        "INSERT OR REPLACE INTO correlation_events (correlation_id, ts, log_id, part, label) VALUES (?, ?, ?, ?, ?)",
+        events,
+    )
+
+def _relabel_correlations(conn: sqlite3.Connection, changed: List[Tuple[int, Optional[str], str]]) -> None:
+    """Move label counts for relabeled rows (caller's transaction)."""
+    deltas: Dict[Tuple[str, str], int] = {}
+    updates = []
+    for log_id, cid, label in changed:
+        row = conn.execute(
+            "SELECT ts, label FROM correlation_events WHERE correlation_id=? AND log_id=?", (cid, log_id)
+        ).fetchone()
+        if row is None or row["label"] == label:
+            continue
+        if row["label"]:
+            deltas[(cid, row["label"])] = deltas.get((cid, row["label"]), 0) - 1
+        deltas[(cid, label)] = deltas.get((cid, label), 0) + 1
+        updates.append((label, cid, row["ts"], log_id))
+    conn.executemany(
+        "UPDATE correlation_events SET label=? WHERE correlation_id=? AND ts=? AND log_id=?", updates
+    )
+    _bump_labels(conn, deltas)
+
+def _backfill_correlations(conn: sqlite3.Connection) -> None:
+    cold = [r for r in archive.iter_rows() if r.get("correlation_id")]
+    for start in range(0, len(cold), 5000):
+        _record_correlations(conn, cold[start:start + 5000], {})
+    for p in _partitions(conn):
+        last_id = -1
+        while True:
+            rows = _select(conn, p, "id > ? AND correlation_id IS NOT NULL", (last_id,), "id", 5000)
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            _record_correlations(conn, rows, {r["id"]: p["name"] for r in rows})
+
+def _forget_correlation_events(conn: sqlite3.Connection, where: str, args: tuple) -> int:
+    """
+    Delete the correlation_events matching `where` (caller's transaction) and
+    bring the summaries of their ids in line: event count, first/last ts and
+    label counts are recomputed from the events left, ids without events are
+    deleted. max_severity and endpoints/sources of the ids that keep events
+    stay as they were (the events do not carry them).
+    """
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS forgotten_correlations (correlation_id TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM forgotten_correlations")
+    conn.execute(
+        f"INSERT OR IGNORE INTO forgotten_correlations SELECT correlation_id FROM correlation_events WHERE {where}", args
+    )
+    n = conn.execute(f"DELETE FROM correlation_events WHERE {where}", args).rowcount
+    if not n:
+        return 0
+    ids = "SELECT correlation_id FROM forgotten_correlations"
+    conn.execute(
+        f"""UPDATE correlations SET
+              events = (SELECT COUNT(1) FROM correlation_events e WHERE e.correlation_id = correlations.correlation_id),
+              first_ts = (SELECT MIN(NULLIF(e.ts, '')) FROM correlation_events e
+                          WHERE e.correlation_id = correlations.correlation_id),
+              last_ts = (SELECT MAX(NULLIF(e.ts, '')) FROM correlation_events e
+                         WHERE e.correlation_id = correlations.correlation_id)
+            WHERE correlation_id IN ({ids})"""
+    )
+    conn.execute(f"DELETE FROM correlations WHERE events = 0 AND correlation_id IN ({ids})")
+    conn.execute(
+        f"DELETE FROM correlation_attrs WHERE correlation_id IN ({ids}) "
+        "AND correlation_id NOT IN (SELECT correlation_id FROM correlations)"
+    )
+    conn.execute(f"DELETE FROM correlation_labels WHERE correlation_id IN ({ids})")
+    conn.execute(
+        f"INSERT INTO correlation_labels (correlation_id, label, n) "
+        f"SELECT correlation_id, label, COUNT(1) FROM correlation_events "
+        f"WHERE correlation_id IN ({ids}) AND label IS NOT NULL GROUP BY correlation_id, label"
+    )
+    return n
+
+def forget_cold_correlation_events(conn: sqlite3.Connection, day: str) -> int:
+    """Cold retention: events of archived rows with ts < `day` (caller's transaction)."""
+    return _forget_correlation_events(conn, "part = ? AND ts < ?", (COLD_PART, day))
+
+def _retire_stale_events(conn: sqlite3.Connection) -> None:
+    # events of partitions archived or dropped before retention kept them in step:
+    # cold if a segment can still hold them, otherwise their rows are gone
+    conn.execute(
+        "UPDATE correlation_events SET part = ? WHERE part != ? AND part NOT IN (SELECT name FROM log_partitions)",
+        (COLD_PART, COLD_PART),
+    )
+    _forget_correlation_events(
+        conn,
+        "part = ? AND NOT EXISTS (SELECT 1 FROM log_segments s "
+        "WHERE correlation_events.ts BETWEEN s.min_ts AND s.max_ts)",
+        (COLD_PART,),
+    )
+
+@timed_db
+def get_correlation(correlation_id: str) -> Optional[Dict[str, Any]]:
+    """Summary for one correlation id: counters, endpoints, sources, label counts and majority label."""
     conn = _connect()
     try:
-        rows = _fetchall(
-            conn,
-            "SELECT * FROM logs WHERE correlation_id=? ORDER BY ts LIMIT ?",
-            (correlation_id, limit),
+        rows = _fetchall(conn, "SELECT * FROM correlations WHERE correlation_id=?", (correlation_id,))
+        if not rows:
+            return None
+        out = dict(rows[0])
+        if out["max_severity"] == -1:
+            out["max_severity"] = None
+        attrs = _fetchall(
+            conn, "SELECT kind, value FROM correlation_attrs WHERE correlation_id=? ORDER BY value", (correlation_id,)
         )
-        return [dict(r) for r in rows]
+        out["endpoints"] = [a["value"] for a in attrs if a["kind"] == "endpoint"]
+        out["sources"] = [a["value"] for a in attrs if a["kind"] == "source"]
+        out["label_counts"] = _label_counts(conn, [correlation_id]).get(correlation_id, {})
+        out["majority_label"] = _majority(out["label_counts"])
+        return out
+    finally:
+        conn.close()
+
+@timed_db
+def correlation_majorities(corr_ids: List[str]) -> Dict[str, Optional[str]]:
+    """Majority label per correlation id (one indexed read per id, no row scans)."""
+    conn = _connect()
+    try:
+        return {cid: _majority(counts) for cid, counts in _label_counts(conn, list(set(corr_ids))).items()}
+    finally:
+        conn.close()
+
+@timed_db
+def correlation_timeline(
+    correlation_id: str, limit: int = 100, after: Optional[Tuple[str, int]] = None
+) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, int]]]:
+    """
+    Events of one correlation id ordered by (ts, id), `limit` at a time.
+    `after` is the (ts, id) of the last event of the previous page; returns
+    (rows, cursor for the next page or None).
+    """
+    conn = _connect()
+    try:
+        if after is None:
+            events = _fetchall(
+                conn,
+                "SELECT ts, log_id, part FROM correlation_events WHERE correlation_id=? "
+                "ORDER BY ts, log_id LIMIT ?",
+                (correlation_id, limit + 1),
+            )
+        else:
+            events = _fetchall(
+                conn,
+                "SELECT ts, log_id, part FROM correlation_events WHERE correlation_id=? "
+                "AND (ts, log_id) > (?, ?) ORDER BY ts, log_id LIMIT ?",
+                (correlation_id, after[0] or "", after[1], limit + 1),
+            )
+        more = len(events) > limit
+        events = events[:limit]
+        live = {p["name"]: p for p in _partitions(conn)}
+        by_id: Dict[int, Dict[str, Any]] = {}
+        cold_needed = False
+        wanted: Dict[str, List[int]] = {}
+        for e in events:
+            wanted.setdefault(e["part"], []).append(e["log_id"])
+        for part, ids in wanted.items():
+            p = live.get(part)
+            if p is None:
+                cold_needed = True
+                continue
+            for r in _select(conn, p, f"id IN ({','.join(str(int(i)) for i in ids)})", (), "id", len(ids)):
+                by_id[r["id"]] = r
     finally:
         conn.close()
+    if cold_needed and archive.has_segments():
+        missing = [(e["ts"], e["log_id"]) for e in events if e["log_id"] not in by_id]
+        for r in archive.fetch_rows(correlation_id, missing):
+            by_id[r["id"]] = r
+    rows = [by_id[e["log_id"]] for e in events if e["log_id"] in by_id]
+    cursor = (events[-1]["ts"], events[-1]["log_id"]) if more and events else None
+    return rows, cursor
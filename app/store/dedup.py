@@ -0,0 +1,149 @@
+# app/store/dedup.py
+"""
+Duplicate suppression for ingest (shippers retry whole batches on timeout).
+
+Every parsed row with a timestamp gets a stable 64-bit content hash over
+its fields. db.insert_logs keeps only rows whose hash was not stored in the
+last INGEST_DEDUP_WINDOW_SEC:
+
+  - an in-process Bloom filter (two rotating generations, so it only
+    remembers roughly one to two windows) says which hashes are certainly
+    new; those are upserted into `log_hashes` with one executemany
+  - hashes the filter might have seen, or a bulk upsert that came up short
+    (another worker stored some of them), are resolved row by row against
+    the `log_hashes` primary key, which is the source of truth (keyed by
+    the row's ts minute first, so one batch touches a few adjacent pages)
+
+Rows without a timestamp are never deduplicated: two identical messages
+with no time on them may well be two events. Whole batches can also carry
+an Idempotency-Key (`ingest_batches` in db); keys are kept for the same
+window.
+"""
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEDUP_WINDOW_SEC = float(os.getenv("INGEST_DEDUP_WINDOW_SEC", "3600"))  # 0 disables row dedup
+BLOOM_BITS = int(os.getenv("INGEST_DEDUP_BLOOM_BITS", str(1 << 24)))  # per generation (2 MB)
+BLOOM_HASHES = 4
+PRUNE_EVERY_SEC = 60.0
+
+def row_hash(r: Dict[str, Any]) -> Optional[int]:
+    """Signed 64-bit content hash (fits an SQLite INTEGER key); None for rows without ts."""
+    if not r.get("ts"):
+        return None
+    g = r.get
+    key = f"{g('source')}\x1f{g('ts')}\x1f{g('level')}\x1f{g('message')}\x1f{g('correlation_id')}\x1f{g('endpoint')}\x1f{g('account')}"
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little", signed=True)
+
+
+class RecentHashes:
+    """Time-bounded Bloom filter: adds go to the current generation, lookups check both."""
+
+    def __init__(self, bits: int = BLOOM_BITS, window_sec: float = DEDUP_WINDOW_SEC):
+        self.m = np.uint64(bits)
+        self.window_sec = window_sec
+        self._cur = np.zeros(bits // 8 + 1, dtype=np.uint8)
+        self._prev = np.zeros_like(self._cur)
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _positions(self, hashes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        h = hashes.view(np.uint64)
+        h1 = h & np.uint64(0xFFFFFFFF)
+        h2 = (h >> np.uint64(32)) | np.uint64(1)
+        pos = (h1[:, None] + np.arange(BLOOM_HASHES, dtype=np.uint64) * h2[:, None]) % self.m
+        return (pos >> np.uint64(3)).astype(np.int64), (np.uint8(1) << (pos & np.uint64(7)).astype(np.uint8))
+
+    def _rotate_locked(self) -> None:
+        if time.monotonic() - self._started >= self.window_sec:
+            self._prev, self._cur = self._cur, self._prev
+            self._cur[:] = 0
+            self._started = time.monotonic()
+
+    def might_contain(self, hashes: np.ndarray) -> np.ndarray:
+        byte, bit = self._positions(hashes)
+        with self._lock:
+            self._rotate_locked()
+            cur = ((self._cur[byte] & bit) != 0).all(axis=1)
+            prev = ((self._prev[byte] & bit) != 0).all(axis=1)
+        return cur | prev
+
+    def add(self, hashes: np.ndarray) -> None:
+        byte, bit = self._positions(hashes)
+        with self._lock:
+            np.bitwise_or.at(self._cur, byte.ravel(), bit.ravel())
+
+
+recent = RecentHashes()
+_last_prune = 0.0
+
+_INSERT = "INSERT OR IGNORE INTO log_hashes (minute, hash, seen_at) VALUES (?, ?, ?)"
+# re-arms an expired hash (seen_at before the cutoff); 0 changes means duplicate
+_UPSERT = (
+    "INSERT INTO log_hashes (minute, hash, seen_at) VALUES (?, ?, ?) "
+    "ON CONFLICT(minute, hash) DO UPDATE SET seen_at = excluded.seen_at WHERE seen_at < ?"
+)
+
+
+def filter_new(conn, rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    (rows to insert, duplicates dropped). Must run inside the caller's write
+    transaction, so the stored hashes commit or roll back with the rows.
+    """
+    global _last_prune
+    if DEDUP_WINDOW_SEC <= 0:
+        return rows, 0
+    total = len(rows)
+    now = int(time.time())
+    cutoff = now - int(DEDUP_WINDOW_SEC)
+
+    # first copy of each hash within the batch (repeats inside the batch are duplicates too)
+    first: Dict[int, Tuple[int, str]] = {}
+    repeats = False
+    for i, r in enumerate(rows):
+        h = row_hash(r)
+        if h is None:
+            continue
+        if h in first:
+            repeats = True
+        else:
+            first[h] = (i, r["ts"][:16])
+    if not first:
+        return rows, 0
+    keys = np.fromiter(first, dtype=np.int64, count=len(first))
+    maybe = recent.might_contain(keys)
+    suspects = keys[maybe].tolist()
+    fresh = [(first[h][1], h, now) for h in keys[~maybe].tolist()]
+
+    if fresh:
+        conn.execute("SAVEPOINT dedup")
+        before = conn.total_changes
+        conn.executemany(_INSERT, fresh)
+        if conn.total_changes - before != len(fresh):
+            # stored by another worker, or expired but not pruned yet: go row by row
+            conn.execute("ROLLBACK TO dedup")
+            suspects += [h for _, h, _ in fresh]
+        conn.execute("RELEASE dedup")
+
+    dups = set()
+    for h in suspects:
+        if not conn.execute(_UPSERT, (first[h][1], h, now, cutoff)).rowcount:
+            dups.add(h)
+    recent.add(keys)
+
+    if dups or repeats:
+        keep = {i for h, (i, _) in first.items() if h not in dups}
+        # rows without ts were never hashed and always stay
+        rows = [r for i, r in enumerate(rows) if i in keep or not r.get("ts")]
+
+    if time.monotonic() - _last_prune >= PRUNE_EVERY_SEC:
+        _last_prune = time.monotonic()
+        conn.execute("DELETE FROM log_hashes WHERE seen_at < ?", (cutoff,))
+        conn.execute("DELETE FROM ingest_batches WHERE created_at < ?", (cutoff,))
+    return rows, total - len(rows)
+
@@ -0,0 +1,194 @@
+# app/store/sampling.py
+"""
+Adaptive sampling of low-severity rows at ingest (opt-in: INGEST_SAMPLE_PER_MIN).
+
+db.insert_logs calls apply() after dedup, inside its write transaction.
+Rows at INGEST_SAMPLE_LEVELS (INFO/DEBUG/TRACE by default) are kept at about
+INGEST_SAMPLE_PER_MIN per message template per minute of ingest (wall
+clock, so a backfill is thinned like live traffic). The stride adapts
+to the template's volume in the previous minute, so kept rows spread over
+the minute instead of being the first N. Every other row is kept:
+
+  - rows at other levels (WARN and errors)
+  - rows without a ts, and rows whose correlation id already has an error
+    (in this batch, or in the `correlations` table)
+
+Dropped rows are counted in `log_sampled` per (ts minute, source, level,
+endpoint, account, label, template), so count_labels and /analytics still
+see every event. Dropped rows that carry a correlation id are parked in
+memory for INGEST_SAMPLE_PARK_SEC. When an error with that id arrives
+within that time, they are inserted with the error's batch and their drop
+counts are taken back. The park is per process: with several workers, only
+the worker that parked a row can rescue it.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app import metrics
+from app.store.codec import dictionary
+
+TARGET_PER_MIN = int(os.getenv("INGEST_SAMPLE_PER_MIN", "0"))  # 0 disables sampling
+SAMPLE_LEVELS = {l.strip().upper() for l in os.getenv("INGEST_SAMPLE_LEVELS", "INFO,DEBUG,TRACE").split(",") if l.strip()}
+PARK_SEC = float(os.getenv("INGEST_SAMPLE_PARK_SEC", "300"))
+PARK_MAX = int(os.getenv("INGEST_SAMPLE_PARK_MAX", "50000"))  # parked rows, all correlation ids
+ERROR_SEVERITY = 4  # db.SEVERITY["ERROR"]; errors and above end the parking of their correlation
+
+SAMPLED = metrics.counter("triage_ingest_sampled_total", "Low-severity rows by sampling outcome", ["outcome"])
+
+Split = Tuple[Optional[str], Optional[str]]
+
+
+class _Rate:
+    __slots__ = ("minute", "seen", "kept", "prev_seen")
+
+    def __init__(self, minute: int):
+        self.minute, self.seen, self.kept, self.prev_seen = minute, 0, 0, 0
+
+
+class Sampler:
+    def __init__(self, target: int = TARGET_PER_MIN):
+        self.target = target
+        self._rates: Dict[str, _Rate] = {}
+        # correlation id -> [(parked_at, row, split)], least recently parked id first
+        self._park: "OrderedDict[str, list]" = OrderedDict()
+        self._parked = 0
+        self._lock = threading.Lock()
+
+    def keep(self, template: str, now: float) -> bool:
+        minute = int(now // 60)
+        rate = self._rates.get(template)
+        if rate is None:
+            rate = self._rates[template] = _Rate(minute)
+        elif rate.minute != minute:
+            rate.prev_seen = rate.seen if rate.minute == minute - 1 else 0
+            rate.minute, rate.seen, rate.kept = minute, 0, 0
+        rate.seen += 1
+        if rate.kept >= self.target:
+            return False
+        stride = max(1, rate.prev_seen // self.target)
+        if (rate.seen - 1) % stride:
+            return False
+        rate.kept += 1
+        return True
+
+    def park(self, cid: str, row: Dict[str, Any], split: Split, now: float) -> None:
+        entries = self._park.get(cid)
+        if entries is None:
+            entries = self._park[cid] = []
+        else:
+            self._park.move_to_end(cid)
+        entries.append((now, row, split))
+        self._parked += 1
+        self._expire(now)
+
+    def _expire(self, now: float) -> None:
+        while self._park:
+            cid, entries = next(iter(self._park.items()))
+            if self._parked <= PARK_MAX and now - entries[-1][0] < PARK_SEC:
+                break
+            self._park.popitem(last=False)
+            self._parked -= len(entries)
+            SAMPLED.inc(len(entries), outcome="park_expired")
+
+    def rescue(self, cids, now: float) -> List[Tuple[Dict[str, Any], Split]]:
+        out = []
+        for cid in cids:
+            entries = self._park.pop(cid, None)
+            if entries:
+                self._parked -= len(entries)
+                out.extend((row, split) for parked_at, row, split in entries if now - parked_at < PARK_SEC)
+        return out
+
+
+sampler = Sampler()
+
+_UPSERT = (
+    "INSERT INTO log_sampled (minute, source_id, level_id, endpoint_id, account_id, label_id, template_id, dropped) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(minute, source_id, level_id, endpoint_id, account_id, label_id, template_id) "
+    "DO UPDATE SET dropped = dropped + excluded.dropped"
+)
+
+
+def _drop_key(r: Dict[str, Any], template: Optional[str]) -> tuple:
+    # NULL fields are stored as id 0 (primary key columns cannot be NULL)
+    ids, get = dictionary.ids, r.get
+    return (
+        r["ts"][:16],
+        ids[("source", get("source"))] or 0,
+        ids[("level", get("level"))] or 0,
+        ids[("endpoint", get("endpoint"))] or 0,
+        ids[("account", get("account"))] or 0,
+        ids[("label", get("label"))] or 0,
+        ids[("template", template)] or 0,
+    )
+
+
+def apply(conn, rows: List[Dict[str, Any]], split: List[Split], severity: Dict[str, int]) -> Tuple[List[Dict[str, Any]], List[Split]]:
+    """
+    (rows to store, their splits). Dropped rows get r["sampled"] = True; rows
+    rescued from the park are appended. Runs in the caller's write transaction.
+    """
+    if TARGET_PER_MIN <= 0 or not rows:
+        return rows, split
+    now = time.time()
+    errored = {
+        r["correlation_id"] for r in rows
+        if r.get("correlation_id") and severity.get((r.get("level") or "").upper(), -1) >= ERROR_SEVERITY
+    }
+    candidates = [
+        i for i, r in enumerate(rows)
+        if r.get("ts") and (r.get("level") or "").upper() in SAMPLE_LEVELS and r.get("correlation_id") not in errored
+    ]
+    if not candidates and not errored:
+        return rows, split
+    # correlations that already had an error in an earlier batch
+    cids = list({rows[i]["correlation_id"] for i in candidates if rows[i].get("correlation_id")})
+    for start in range(0, len(cids), 500):
+        chunk = cids[start:start + 500]
+        errored.update(
+            r[0] for r in conn.execute(
+                f"SELECT correlation_id FROM correlations WHERE correlation_id IN ({','.join('?' * len(chunk))}) "
+                "AND max_severity >= ?",
+                (*chunk, ERROR_SEVERITY),
+            )
+        )
+
+    drops: Dict[tuple, int] = {}
+    dropped = set()
+    with sampler._lock:
+        for i in candidates:
+            r = rows[i]
+            cid = r.get("correlation_id")
+            if cid in errored:
+                continue
+            if sampler.keep(split[i][0] or "", now):
+                continue
+            dropped.add(i)
+            r["sampled"] = True
+            key = _drop_key(r, split[i][0])
+            drops[key] = drops.get(key, 0) + 1
+            if cid:
+                sampler.park(cid, r, split[i], now)
+        rescued = sampler.rescue(errored, now) if errored else []
+
+    for r, parts in rescued:
+        r.pop("sampled", None)
+        key = _drop_key(r, parts[0])
+        drops[key] = drops.get(key, 0) - 1
+    if drops:
+        conn.executemany(_UPSERT, [(*k, n) for k, n in drops.items() if n])
+    if dropped:
+        SAMPLED.inc(len(dropped), outcome="dropped")
+    if rescued:
+        SAMPLED.inc(len(rescued), outcome="rescued")
+    if not dropped and not rescued:
+        return rows, split
+    keep = [i for i in range(len(rows)) if i not in dropped]
+    return (
+        [rows[i] for i in keep] + [r for r, _ in rescued],
+        [split[i] for i in keep] + [parts for _, parts in rescued],
+    )
@@ -0,0 +1,176 @@
+# app/store/session_cache.py
+"""
+In-memory cache of active triage sessions and their transcripts.
+
+Routers mutate a SessionState during a turn and call commit() once at the
+end; all pending changes go to SQLite in one transaction (db.save_turn).
+Entries are evicted LRU-first beyond SESSION_CACHE_SIZE and after
+SESSION_IDLE_SEC without access; evicted sessions reload from the DB.
+The cache is per process, so multi-worker deployments should keep a
+session on one worker (sticky routing).
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.metrics import track_cache
+from app.store import db
+
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1000"))
+SESSION_IDLE_SEC = float(os.getenv("SESSION_IDLE_SEC", "1800"))
+
+
+class SessionState:
+    __slots__ = (
+        "id", "created_at", "initiator", "step", "closed", "answers",
+        "window_start", "window_end",
+        "version", "touched", "lock", "_new", "_dirty_steps", "_dirty_session", "_dirty_window",
+    )
+
+    def __init__(self, row: Dict[str, Any], answers: List[Dict[str, Any]], new: bool = False):
+        self.id = row["id"]
+        self.created_at = row.get("created_at")
+        self.initiator = row.get("initiator")
+        self.step = row.get("step") or 0
+        self.closed = bool(row.get("closed"))
+        self.answers = answers
+        self.window_start = row.get("window_start")
+        self.window_end = row.get("window_end")
+        self.version = 0          # bumped on every mutation (cache keys can use it)
+        self.touched = time.monotonic()
+        self.lock = threading.RLock()  # serializes turns on the same session
+        self._new = new
+        self._dirty_steps: set = set()
+        self._dirty_session = False
+        self._dirty_window = False
+
+    # ---- reads ----
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "created_at": self.created_at,
+            "step": self.step,
+            "closed": int(self.closed),
+            "initiator": self.initiator,
+            "window_start": self.window_start,
+            "window_end": self.window_end,
+        }
+
+    def get_answers(self) -> List[Dict[str, Any]]:
+        """Copies, same shape as db.get_answers."""
+        return [dict(a) for a in self.answers]
+
+    # ---- writes (buffered until commit) ----
+    def put_answer(self, step: int, question: str, answer: Optional[str]) -> None:
+        row = {"step": step, "question": question, "answer": answer}
+        for i, a in enumerate(self.answers):
+            if a["step"] == step:
+                self.answers[i] = row
+                break
+        else:
+            self.answers.append(row)
+            if len(self.answers) > 1 and self.answers[-2]["step"] > step:
+                self.answers.sort(key=lambda a: a["step"])
+        self._dirty_steps.add(step)
+        self.version += 1
+
+    def set_step(self, step: int) -> None:
+        self.step = step
+        self._dirty_session = True
+        self.version += 1
+
+    def set_window(self, start: Optional[str], end: Optional[str]) -> None:
+        self.window_start, self.window_end = start, end
+        self._dirty_window = True
+        self.version += 1
+
+    def close(self) -> None:
+        self.closed = True
+        self._dirty_session = True
+        self.version += 1
+
+
+_lock = threading.Lock()
+_cache: "OrderedDict[str, SessionState]" = OrderedDict()
+
+
+def _evict_locked(now: float) -> None:
+    while _cache:
+        sid, oldest = next(iter(_cache.items()))
+        if len(_cache) > SESSION_CACHE_SIZE or now - oldest.touched > SESSION_IDLE_SEC:
+            # commit() runs at the end of every turn, so evicted entries are clean
+            del _cache[sid]
+        else:
+            break
+
+
+def _remember(state: SessionState) -> None:
+    now = time.monotonic()
+    state.touched = now
+    with _lock:
+        _cache[state.id] = state
+        _cache.move_to_end(state.id)
+        _evict_locked(now)
+
+
+def create(initiator: str = "", session_id: Optional[str] = None) -> SessionState:
+    """New session; its row is inserted by the first commit()."""
+    row = {
+        "id": session_id or str(uuid.uuid4()),
+        "created_at": datetime.utcnow().isoformat(),
+        "initiator": initiator,
+        "step": 0,
+        "closed": 0,
+    }
+    state = SessionState(row, [], new=True)
+    _remember(state)
+    return state
+
+
+def get(session_id: str) -> Optional[SessionState]:
+    """Cached session, loading it (session + answers, one connection) on a miss."""
+    with _lock:
+        state = _cache.get(session_id)
+    track_cache("session", state is not None)
+    if state is None:
+        loaded = db.load_session(session_id)
+        if loaded is None:
+            return None
+        row, answers = loaded
+        state = SessionState(row, answers)
+    _remember(state)
+    return state
+
+
+def commit(state: SessionState) -> None:
+    """Write all buffered changes of this turn in one transaction."""
+    with state.lock:
+        if not (state._new or state._dirty_steps or state._dirty_session or state._dirty_window):
+            return
+        dirty = [a for a in state.answers if a["step"] in state._dirty_steps]
+        try:
+            db.save_turn(
+                state.id,
+                dirty,
+                step=state.step if (state._dirty_session or state._new) else None,
+                closed=state.closed if (state._dirty_session or state._new) else None,
+                create={"created_at": state.created_at, "initiator": state.initiator} if state._new else None,
+                window=(state.window_start, state.window_end) if state._dirty_window else None,
+            )
+        except Exception:
+            # memory is now ahead of the DB; drop it so the next get() reloads
+            discard(state.id)
+            raise
+        state._new = False
+        state._dirty_steps.clear()
+        state._dirty_session = False
+        state._dirty_window = False
+
+
+def discard(session_id: str) -> None:
+    with _lock:
+        _cache.pop(session_id, None)
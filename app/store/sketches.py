@@ -0,0 +1,288 @@
+# app/store/sketches.py
+"""
+Streaming heavy hitters of freshly ingested logs ("top failing endpoints
+right now") without a GROUP BY.
+
+Three dimensions are tracked: endpoint, message template and correlation id.
+Each is counted per slice: every row ("*"), its level ("level:ERROR") and
+its label at ingest ("label:db_error"; rows waiting for the LLM count
+under the provisional "other"). Time is a ring of SKETCH_BUCKETS buckets of
+SKETCH_BUCKET_SEC of ingest wall clock (a backfill counts as "now"); a
+query merges the buckets of its last `minutes`.
+
+Per bucket:
+  - a Space-Saving summary of SKETCH_TOPK_CAPACITY entries per
+    (dimension, slice): the top-k candidates with lower/upper count bounds
+  - a count-min sketch (SKETCH_CMS_DEPTH x SKETCH_CMS_WIDTH int32) per
+    dimension, keyed by slice + value: point estimates for any value, also
+    used to tighten the Space-Saving counts
+
+Memory is fixed by those settings (defaults: 60 x 1 minute buckets, about
+6 MB of count-min arrays plus at most 64 entries per summary; at most
+SKETCH_MAX_SLICES level/label slices, later ones only count in "*").
+db.insert_logs calls observe() once per batch with the rows that survived
+dedup (sampled-out rows included), after its commit. A batch is first
+collapsed with Counter, so the per-row cost is a few C-level tuple counts;
+the sketches are then updated once per distinct value.
+The sketches are per process: with several workers, each one answers for
+the batches it ingested.
+"""
+import heapq
+import os
+import threading
+import time
+from collections import Counter
+from itertools import compress
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app import metrics
+from app.store.codec import readable_template, split_message
+
+ENABLED = os.getenv("SKETCHES_ENABLED", "1").lower() in ("1", "true", "yes")
+BUCKET_SEC = int(os.getenv("SKETCH_BUCKET_SEC", "60"))
+BUCKETS = int(os.getenv("SKETCH_BUCKETS", "60"))
+CAPACITY = int(os.getenv("SKETCH_TOPK_CAPACITY", "64"))
+CMS_WIDTH = int(os.getenv("SKETCH_CMS_WIDTH", "2048"))
+CMS_DEPTH = int(os.getenv("SKETCH_CMS_DEPTH", "4"))
+MAX_SLICES = int(os.getenv("SKETCH_MAX_SLICES", "32"))
+
+DIMENSIONS = ("endpoint", "template", "correlation_id")
+ALL = "*"
+
+SKETCH_UPDATE = metrics.histogram(
+    "triage_sketch_update_seconds", "Heavy-hitter sketch update time per ingest batch",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1),
+)
+
+
+class SpaceSaving:
+    """
+    Space-Saving top-k counters, updated a batch at a time in its Misra-Gries
+    form: add the batch's exact counts, and when more than 2 * `capacity`
+    values are held, subtract the (capacity+1)-th largest count from all and
+    drop what reaches 0. `slack` sums the subtractions, so a held value's true
+    count is in [count, count + slack], any other value's is <= slack.
+    """
+    __slots__ = ("capacity", "counts", "slack")
+
+    def __init__(self, capacity: int = CAPACITY):
+        self.capacity = capacity
+        self.counts: Dict[Any, int] = {}
+        self.slack = 0
+
+    def add(self, batch: Dict[Any, int]) -> None:
+        """Add a batch of exact counts; the batch dict may be reused as storage."""
+        counts = self.counts
+        if len(batch) > len(counts):
+            counts, batch = batch, counts
+        get = counts.get
+        for value, n in batch.items():
+            counts[value] = get(value, 0) + n
+        self.counts = counts
+        # pruned only past twice the capacity, so a prune pays for many batches
+        if len(counts) > 2 * self.capacity:
+            cut = heapq.nlargest(self.capacity + 1, counts.values())[-1]
+            self.slack += cut
+            self.counts = {v: c - cut for v, c in counts.items() if c > cut}
+
+
+class _Bucket:
+    __slots__ = ("slot", "tops", "cms", "totals")
+
+    def __init__(self):
+        self.slot = -1
+        self.tops: Dict[Tuple[str, str], SpaceSaving] = {}
+        self.cms = np.zeros((len(DIMENSIONS), CMS_DEPTH, CMS_WIDTH), dtype=np.int32)
+        self.totals: Counter = Counter()  # rows per slice
+
+    def reset(self, slot: int) -> None:
+        self.slot = slot
+        self.tops = {}
+        self.cms.fill(0)
+        self.totals = Counter()
+
+
+_ROWS = np.arange(CMS_DEPTH, dtype=np.uint64)[:, None]
+_ROW_IDX = _ROWS.astype(np.intp)
+_DIM = {d: i for i, d in enumerate(DIMENSIONS)}
+
+
+def _salt(dim: str, slice_: str) -> int:
+    return hash((dim, slice_)) & 0xFFFFFFFFFFFFFFFF
+
+
+def _cms_index(hashes: np.ndarray, salts: np.ndarray) -> np.ndarray:
+    # CMS_DEPTH positions per value: its hash mixed with its (dim, slice) salt,
+    # then h1 + i * h2. Python's hash is per process, like the sketches, and
+    # cached on str objects
+    x = hashes.view(np.uint64) ^ salts
+    x = x * np.uint64(0x9E3779B97F4A7C15)
+    x ^= x >> np.uint64(29)
+    h1, h2 = x & np.uint64(0xFFFFFFFF), (x >> np.uint64(32)) | np.uint64(1)
+    return ((h1[None, :] + _ROWS * h2[None, :]) % np.uint64(CMS_WIDTH)).astype(np.intp)
+
+
+def _hashes(values) -> np.ndarray:
+    return np.fromiter(map(hash, values), dtype=np.int64, count=len(values))
+
+
+class Sketches:
+    def __init__(self):
+        self.buckets = [_Bucket() for _ in range(BUCKETS)]
+        self.slices = {ALL}
+        self._lock = threading.Lock()
+
+    def _bucket(self, slot: int) -> _Bucket:
+        b = self.buckets[slot % BUCKETS]
+        if b.slot != slot:
+            b.reset(slot)
+        return b
+
+    def _slice(self, kind: str, value: Any) -> Optional[str]:
+        if value is None or value == "":
+            return None
+        name = f"level:{str(value).upper()}" if kind == "level" else f"label:{value}"
+        if name not in self.slices and len(self.slices) <= MAX_SLICES:
+            self.slices.add(name)
+        return name if name in self.slices else None
+
+    def observe(self, rows: List[Dict[str, Any]], templates: Iterable[Optional[str]], now: Optional[float] = None) -> None:
+        """Count one batch (templates: the codec template of each row's message)."""
+        if not rows:
+            return
+        t0 = time.perf_counter()
+        columns = {
+            "endpoint": [r.get("endpoint") for r in rows],
+            "template": list(templates),
+            "correlation_id": [r.get("correlation_id") for r in rows],
+        }
+        with self._lock:
+            b = self._bucket(int((now or time.time()) // BUCKET_SEC))
+            # row masks per slice: a handful of levels and labels per batch
+            masks: Dict[str, List[bool]] = {}
+            b.totals[ALL] += len(rows)
+            for kind in ("level", "label"):
+                col = [r.get(kind) for r in rows]
+                for value in set(col):
+                    name = self._slice(kind, value)
+                    if name is None:
+                        continue
+                    mask = [x == value for x in col]
+                    prev = masks.get(name)
+                    masks[name] = mask if prev is None else [p or m for p, m in zip(prev, mask)]
+            for name, mask in masks.items():
+                b.totals[name] += sum(mask)
+            hashes, weights, salts, dims, sizes = [], [], [], [], []
+            for dim, values in columns.items():
+                per_slice = {ALL: Counter(values)}
+                for name, mask in masks.items():
+                    per_slice[name] = Counter(compress(values, mask))
+                for name, batch in per_slice.items():
+                    batch.pop(None, None)
+                    if not batch:
+                        continue
+                    n = len(batch)
+                    hashes.append(_hashes(batch))
+                    weights.append(np.fromiter(batch.values(), dtype=np.int32, count=n))
+                    salts.append(_salt(dim, name))
+                    dims.append(_DIM[dim])
+                    sizes.append(n)
+                    ss = b.tops.get((dim, name))
+                    if ss is None:
+                        ss = b.tops[(dim, name)] = SpaceSaving()
+                    ss.add(batch)
+            if hashes:
+                # one scatter-add into the (dimension, depth, width) counters of the bucket
+                cols = _cms_index(np.concatenate(hashes), np.repeat(np.array(salts, dtype=np.uint64), sizes))
+                dim_of = np.repeat(np.array(dims, dtype=np.intp), sizes)
+                flat = (dim_of[None, :] * CMS_DEPTH + _ROW_IDX) * CMS_WIDTH + cols
+                w = np.concatenate(weights)
+                np.add.at(b.cms.reshape(-1), flat.reshape(-1), np.broadcast_to(w, flat.shape).reshape(-1))
+        SKETCH_UPDATE.observe(time.perf_counter() - t0)
+
+    # --------------------------------- queries --------------------------------
+
+    def _window(self, minutes: float, now: Optional[float]) -> List[_Bucket]:
+        last = int((now or time.time()) // BUCKET_SEC)
+        n = min(BUCKETS, max(1, int(np.ceil(minutes * 60 / BUCKET_SEC))))
+        return [b for b in self.buckets if last - n < b.slot <= last]
+
+    def _estimate(self, buckets: List[_Bucket], dim: str, slices: List[str], values: List[str]) -> np.ndarray:
+        """Count-min estimates of `values`, summed over buckets and slices."""
+        out = np.zeros(len(values), dtype=np.int64)
+        hashes = _hashes(values)
+        for s in slices:
+            cols = _cms_index(hashes, np.uint64(_salt(dim, s)))
+            for b in buckets:
+                out += b.cms[_DIM[dim]][_ROW_IDX, cols].min(axis=0)
+        return out
+
+    def top(self, dim: str, levels: Sequence[str] = (), labels: Sequence[str] = (), minutes: float = 15,
+            k: int = 10, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Heaviest `dim` values of the last `minutes` among rows at any of
+        `levels` (or with any of `labels`; neither = every row). `count` is
+        an upper bound (Space-Saving bound, tightened by count-min),
+        `min_count` a lower bound of the true count.
+        """
+        slices = [f"level:{l.upper()}" for l in levels] + [f"label:{l}" for l in labels] or [ALL]
+        with self._lock:
+            buckets = self._window(minutes, now)
+            counts: Counter = Counter()
+            slack = 0
+            for b in buckets:
+                for s in slices:
+                    ss = b.tops.get((dim, s))
+                    if ss is not None:
+                        counts.update(ss.counts)
+                        slack += ss.slack
+            candidates = [v for v, _ in counts.most_common(k * 4)]
+            upper = self._estimate(buckets, dim, slices, candidates) if candidates else np.zeros(0, np.int64)
+            total = sum(b.totals[s] for b in buckets for s in slices)
+        items = [
+            {
+                "value": readable_template(v) if dim == "template" else v,
+                "count": int(min(counts[v] + slack, est)),
+                "min_count": counts[v],
+            }
+            for v, est in zip(candidates, upper)
+        ]
+        items.sort(key=lambda it: (-it["count"], -it["min_count"]))
+        return {
+            "by": dim,
+            "slices": slices,
+            "minutes": minutes,
+            "rows": total,
+            "tracked": ALL in slices or all(s in self.slices for s in slices),
+            "items": items[:k],
+        }
+
+    def estimate(self, dim: str, value: str, levels: Sequence[str] = (), labels: Sequence[str] = (),
+                 minutes: float = 15, now: Optional[float] = None) -> int:
+        """Count-min upper bound of one value's count (a template: as shown by top(), or a raw message)."""
+        if dim == "template":
+            value = split_message(value.replace("<*>", "0"))[0] or value
+        slices = [f"level:{l.upper()}" for l in levels] + [f"label:{l}" for l in labels] or [ALL]
+        with self._lock:
+            return int(self._estimate(self._window(minutes, now), dim, slices, [value])[0])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "bucket_sec": BUCKET_SEC,
+            "buckets": BUCKETS,
+            "window_minutes": BUCKETS * BUCKET_SEC / 60,
+            "capacity": CAPACITY,
+            "cms": [CMS_DEPTH, CMS_WIDTH],
+            "slices": sorted(self.slices),
+            "bytes_cms": sum(b.cms.nbytes for b in self.buckets),
+        }
+
+
+sketches = Sketches()
+
+
+def observe(rows: List[Dict[str, Any]], templates: Iterable[Optional[str]]) -> None:
+    if ENABLED:
+        sketches.observe(rows, templates)
@@ -0,0 +1,21 @@
+"""Shared fixtures: every test runs against its own temporary SQLite database."""
+import pytest
+
+from app.store import archive, db, dedup
+from app.store.codec import Dictionary, dictionary
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "triage.db"))
+    # per-process caches that would otherwise point into the previous test's database
+    empty = Dictionary()
+    monkeypatch.setattr(dictionary, "ids", empty.ids)
+    monkeypatch.setattr(dictionary, "values", empty.values)
+    monkeypatch.setattr(dedup, "recent", dedup.RecentHashes(bits=1 << 16))
+    # segments live next to the database; forget the open ones and the cached manifest
+    monkeypatch.delenv("LOG_ARCHIVE_DIR", raising=False)
+    monkeypatch.setattr(archive, "_segments", {})
+    monkeypatch.setattr(archive, "_manifest", [])
+    monkeypatch.setattr(archive, "_loaded_at", 0.0)
+    db.init()
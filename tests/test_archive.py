@@ -0,0 +1,97 @@
+"""Hot -> cold tiering (app.store.archive): moving whole day partitions into segments and retention."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.store import archive, db
+
+# two whole days well in the past, so run_once's cutoffs (relative to now) can fall between them
+DAY1 = (datetime.now(timezone.utc) - timedelta(days=20)).replace(hour=0, minute=0, second=0, microsecond=0)
+DAY2 = DAY1 + timedelta(days=1)
+
+
+def records(day, n=300, offset=0):
+    return [
+        {
+            "source": "api",
+            "ts": (day + timedelta(hours=1, minutes=3 * i)).isoformat(),
+            "level": "ERROR" if i % 10 == 0 else "INFO",
+            "message": f"Timeout after {3000 + i} ms calling https://chs:8443/api/x",
+            "correlation_id": f"c-{(i + offset) % 7}",
+            "endpoint": "https://chs:8443/api/x",
+            "account": None,
+            "label": "network_timeout" if i % 2 else None,
+        }
+        for i in range(n)
+    ]
+
+
+def timeline(cid, page=40):
+    rows, cursor = db.correlation_timeline(cid, page)
+    pages = [rows]
+    while cursor:
+        rows, cursor = db.correlation_timeline(cid, page, cursor)
+        pages.append(rows)
+    return pages
+
+
+def snapshot():
+    return (
+        db.fetch_logs_window(None, None, 10_000),
+        db.fetch_logs_window(DAY1.isoformat(), (DAY1 + timedelta(hours=6)).isoformat(), 10_000),
+        [db.search_correlation(f"c-{i}", 1000) for i in range(7)],
+        [timeline(f"c-{i}") for i in range(7)],
+    )
+
+
+def cold_events():
+    conn = db._connect()
+    try:
+        return conn.execute("SELECT COUNT(1) FROM correlation_events WHERE part=?", (db.COLD_PART,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def two_days():
+    db.insert_logs(records(DAY1) + records(DAY2, offset=3))
+
+
+def test_archived_day_reads_back_identically(two_days):
+    before = snapshot()
+    out = archive.archive_before(DAY2.isoformat())
+    assert out["rows"] == 300
+    assert [p["day"] for p in db.log_partitions()] == [DAY2.date().isoformat()]
+    assert archive.stats()["rows"] == 300
+    assert snapshot() == before
+    assert cold_events() == 300
+
+
+def test_late_row_is_archived_on_the_next_run(two_days):
+    archive.archive_before(DAY2.isoformat())
+    late = records(DAY1, n=1)
+    late[0].update(ts=(DAY1 + timedelta(hours=23)).isoformat(), message="late row", correlation_id="c-late")
+    assert db.insert_logs(late) == 1
+    assert DAY1.date().isoformat() in [p["day"] for p in db.log_partitions()]
+
+    after_days = (datetime.now(timezone.utc) - DAY2).total_seconds() / 86400
+    out = archive.run_once(after_days=after_days, retention_days=0, hot_retention_days=0)
+    assert out["rows"] == 1
+    assert [p["day"] for p in db.log_partitions()] == [DAY2.date().isoformat()]
+    assert [r["message"] for r in db.search_correlation("c-late")] == ["late row"]
+
+
+def test_segment_retention_drops_rows_and_cold_events(two_days):
+    archive.archive_before(DAY2.isoformat())
+    hot = db.fetch_logs_window(DAY2.isoformat(), None, 10_000)
+    summary = db.get_correlation("c-0")
+
+    assert archive.drop_segments_before(DAY2.date().isoformat()) == 1
+    assert archive.stats()["rows"] == 0
+    assert db.fetch_logs_window(None, None, 10_000) == hot
+    assert cold_events() == 0
+    remaining = db.search_correlation("c-0", 1000)
+    assert remaining and all(r["ts"] >= DAY2.isoformat() for r in remaining)
+    after = db.get_correlation("c-0")
+    assert after["events"] == len(remaining) < summary["events"]
+    assert after["first_ts"] == remaining[0]["ts"]
@@ -0,0 +1,65 @@
+"""Dictionary encoding of log partitions: app.store.codec and what db hands back after decoding."""
+from operator import itemgetter
+
+import pytest
+
+from app.store import codec, db
+
+MESSAGES = [
+    "Timeout after 3000 ms calling https://chs/api/x",
+    "order 3f2b8c1e-9a4d-4e6f-8b7a-1c2d3e4f5a6b failed for 7d0e5f9a-1b2c-4d3e-8f4a-5b6c7d8e9f0a",
+    "GET http://10.0.0.12:8443/api/cart?id=42 returned 502",
+    "latency 12.75s over 0.5 budget, ratio 25.5",
+    "retry 3/5 after 250ms",
+    "ids 12 34 56 7.8.9",
+    "no variable parts here",
+    "42",
+    "",
+    None,
+]
+
+
+@pytest.mark.parametrize("msg", MESSAGES)
+def test_split_join_round_trip(msg):
+    assert codec.join_message(*codec.split_message(msg)) == msg
+
+
+def test_variable_parts_become_holes():
+    template, params = codec.split_message("Timeout after 3000 ms calling https://chs:8443/api/x")
+    assert codec.readable_template(template) == "Timeout after <*> ms calling <*>"
+    assert params.split("\x1f") == ["3000", "https://chs:8443/api/x"]
+
+
+@pytest.mark.parametrize("msg", ["bad \x00 byte 12", "unit\x1fsep 3.5", "\x00"])
+def test_separator_characters_fall_back_to_raw(msg):
+    assert codec.split_message(msg) == (None, msg)
+    assert codec.join_message(None, msg) == msg
+
+
+def test_fetch_returns_the_rows_as_sent():
+    sent = [
+        {
+            "source": "api",
+            "ts": f"2025-10-20T09:30:0{i}+00:00",
+            "level": level,
+            "message": msg,
+            "correlation_id": cid,
+            "endpoint": endpoint,
+            "account": None,
+            "label": None,
+        }
+        for i, (level, msg, cid, endpoint) in enumerate([
+            ("ERROR", MESSAGES[0], "c-1", "https://chs/api/x"),
+            ("WARN", MESSAGES[2], "c-1", None),
+            ("INFO", "raw \x1f message 7", None, "https://chs/api/y"),
+            ("ERROR", None, None, None),
+        ])
+    ]
+    assert db.insert_logs([dict(r) for r in sent]) == len(sent)
+    got = db.fetch_logs_window(None, None, 100)
+    assert all(tuple(r) == db.WINDOW_COLUMNS for r in got)
+    assert all(isinstance(r["id"], int) for r in got)
+    key = itemgetter("ts")
+    assert [{k: v for k, v in r.items() if k != "id"} for r in sorted(got, key=key)] == [
+        {k: r[k] for k in db.WINDOW_COLUMNS if k != "id"} for r in sorted(sent, key=key)
+    ]
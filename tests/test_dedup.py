@@ -0,0 +1,65 @@
+"""Duplicate suppression at ingest: app.store.dedup and the Idempotency-Key path of db.insert_logs."""
+import pytest
+
+from app.store import db, dedup
+
+
+def batch(n=3, ts="2025-10-20T09:30:00+00:00", **fields):
+    # insert_logs stamps ids on the dicts, so every call builds new ones
+    return [
+        {
+            "source": "api",
+            "ts": ts,
+            "level": "ERROR",
+            "message": f"Timeout after {3000 + i} ms calling https://chs/api/x",
+            "correlation_id": f"c-{i}",
+            "endpoint": "https://chs/api/x",
+            "account": None,
+            "label": "network_timeout",
+            **fields,
+        }
+        for i in range(n)
+    ]
+
+
+def stored():
+    return len(db.fetch_logs_window(None, None, 1000))
+
+
+@pytest.mark.parametrize("other_worker", [False, True], ids=["same-worker", "other-worker"])
+def test_resend_within_window_is_dropped(monkeypatch, other_worker):
+    assert db.insert_logs(batch()) == 3
+    if other_worker:
+        # nothing in this process's filter: log_hashes alone has to catch the resend
+        monkeypatch.setattr(dedup, "recent", dedup.RecentHashes(bits=1 << 16))
+    resent = batch()
+    assert db.insert_logs(resent) == 0
+    assert all("id" not in r for r in resent)
+    assert stored() == 3
+
+
+def test_repeat_inside_one_batch_is_dropped():
+    rows = batch(2) + batch(2)
+    assert db.insert_logs(rows) == 2
+    assert stored() == 2
+
+
+def test_same_content_at_another_ts_is_kept():
+    assert db.insert_logs(batch()) == 3
+    assert db.insert_logs(batch(ts="2025-10-20T09:30:01+00:00")) == 3
+    assert stored() == 6
+
+
+def test_idempotency_key_replay_returns_first_result():
+    first = batch(2) + batch(1)  # one in-batch duplicate
+    assert db.insert_logs(first, idempotency_key="k-1") == 2
+    with pytest.raises(db.DuplicateBatch) as replay:
+        db.insert_logs(batch(5, ts="2025-10-20T10:00:00+00:00"), idempotency_key="k-1")
+    assert (replay.value.rows, replay.value.duplicates) == (2, 1)
+    assert stored() == 2  # the replayed batch wrote nothing, even with new rows in it
+
+
+def test_rows_without_ts_bypass_dedup():
+    assert db.insert_logs(batch(1, ts=None) + batch(1, ts=None)) == 2
+    assert db.insert_logs(batch(1, ts=None)) == 1
+    assert stored() == 3
@@ -0,0 +1,85 @@
+"""Adaptive ingest sampling (app.store.sampling) through log_ingestor.ingest_batch."""
+import pytest
+
+from app.services import analytics, labeler, log_ingestor, recent_logs
+from app.store import columnar, db, sampling
+
+
+@pytest.fixture(autouse=True)
+def sampling_on(monkeypatch):
+    # one kept INFO row per template and minute
+    monkeypatch.setattr(sampling, "TARGET_PER_MIN", 1)
+    monkeypatch.setattr(sampling, "sampler", sampling.Sampler(1))
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    queued = []
+    monkeypatch.setattr(labeler, "submit", queued.extend)
+    return queued
+
+
+def records(n, level="INFO", cid=None, message="cart refreshed for session {i}"):
+    return [
+        {
+            "ts": f"2025-10-20T09:30:{i % 60:02d}+00:00",
+            "level": level,
+            "message": message.format(i=i),
+            "correlation_id": cid,
+            "endpoint": "https://chs/api/cart",
+            "account": "acc-1",
+        }
+        for i in range(n)
+    ]
+
+
+def dropped():
+    return sum(r[-1] for r in db.sampled_counts())
+
+
+def test_errors_are_always_kept():
+    sent = records(20, level="ERROR", message="Upstream call failed with {i}") + records(20, level="FATAL")
+    out = log_ingestor.ingest_batch(sent)
+    assert (out["ingested"], out["sampled"]) == (40, 0)
+
+
+def test_info_rows_are_thinned_and_counted():
+    out = log_ingestor.ingest_batch(records(30))
+    assert out["sampled"] > 0
+    assert out["ingested"] + out["sampled"] == 30
+    assert dropped() == out["sampled"]
+
+
+def test_parked_row_is_stored_when_its_correlation_errors(submitted):
+    first = log_ingestor.ingest_batch(records(5, cid="c-1"))
+    assert first["sampled"] > 0
+    assert dropped() == first["sampled"]
+    submitted.clear()
+
+    second = log_ingestor.ingest_batch(records(1, level="ERROR", cid="c-1", message="Upstream call failed with {i}"))
+    assert second["ingested"] == 1 + first["sampled"]
+    trace = db.search_correlation("c-1", 100)
+    assert len(trace) == 6
+    rescued = [r for r in submitted if r.get("level") == "INFO"]
+    assert len(rescued) == first["sampled"]
+    assert all(r.get("id") is not None for r in rescued)
+    assert {r["id"] for r in rescued} <= {r["id"] for r in recent_logs.recent(limit=100)}
+    # drop counts are taken back for rescued rows
+    assert dropped() == 0
+
+
+def test_weighted_totals_count_every_row_sent(monkeypatch):
+    monkeypatch.setattr(analytics, "store", columnar.ColumnStore())
+    out = log_ingestor.ingest_batch(records(50) + records(5, level="ERROR", message="Upstream call failed with {i}"))
+    assert out["sampled"] > 0
+    analytics.store.refresh()
+    totals = analytics.error_rate(None, None, by="endpoint")
+    assert totals["rows"] == 55
+    assert totals["errors"] == 5
+    assert totals["groups"][0]["total"] == 55
+
+
+def test_replayed_batch_reports_the_first_sampled_count():
+    first = log_ingestor.ingest_batch(records(10), idempotency_key="k-1")
+    replay = log_ingestor.ingest_batch(records(10), idempotency_key="k-1")
+    assert replay == {**first, "replayed": True}
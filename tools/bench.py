@@ -0,0 +1,377 @@
+"""
+Offline benchmark suite for the triage service.
+
+  python tools/bench.py                               # all benchmarks, JSON to stdout
+  python tools/bench.py --only ingest,window --rows 500000 --out bench.json
+  python tools/bench.py --only parse                  # payload parsing only: records/sec, bytes per record
+  python tools/bench.py --compare baseline.json --tolerance 10
+  python tools/bench.py --only import_time --import-budget-ms 1200   # cold-start gate
+
+Runs against a throwaway SQLite file (TRIAGE_DB_PATH) filled by
+tools/gen_logs.py and the fake LLM backend (LLM_BACKEND=fake) with fixed
+latency, so results are repeatable and need no network or API key. With --compare, metrics that
+got worse than the baseline by more than --tolerance percent are reported
+and the exit code is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+BENCHMARKS = ["import_time", "parse", "ingest", "window", "labeling", "triage_turn"]
+NEEDS_DATA = {"window", "labeling", "triage_turn"}
+
+
+# ------------------------------- helpers -------------------------------------
+
+def _pcts(samples_ms: List[float]) -> Dict[str, float]:
+    s = sorted(samples_ms)
+    if not s:
+        return {}
+    def pct(p: float) -> float:
+        return round(s[min(len(s) - 1, int(p * len(s)))], 3)
+    return {
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "mean_ms": round(statistics.fmean(s), 3),
+    }
+
+
+def _timed(fn: Callable[[], Any]) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1000.0
+
+
+# ------------------------------ benchmarks -----------------------------------
+
+def bench_import_time(args) -> Dict[str, Any]:
+    """Cold `import app.main` per APP_PROFILE, in fresh interpreters (best of N)."""
+    import subprocess
+
+    snippet = "import time; t = time.perf_counter(); import app.main; print((time.perf_counter() - t) * 1000)"
+    out: Dict[str, Any] = {}
+    for profile in ("full", "ingest"):
+        env = dict(os.environ, APP_PROFILE=profile, PYTHONWARNINGS="ignore")
+        runs = []
+        for _ in range(args.import_runs):
+            res = subprocess.run(
+                [sys.executable, "-c", snippet], cwd=str(ROOT), env=env,
+                capture_output=True, text=True, check=True,
+            )
+            runs.append(float(res.stdout.strip().splitlines()[-1]))
+        out[f"{profile}_ms"] = round(min(runs), 1)
+    if args.import_budget_ms:
+        out["budget_ms"] = args.import_budget_ms
+        out["over_budget"] = [k for k, v in out.items() if k.endswith("_ms") and k != "budget_ms" and v > args.import_budget_ms]
+    return out
+
+
+def _parse_run(fn: Callable[[], List[Any]], rows: int) -> Dict[str, Any]:
+    """records/sec (best of 3) plus peak traced bytes and live blocks per record of one run."""
+    import gc
+    import tracemalloc
+
+    best = min(_timed(fn) for _ in range(3))
+    gc.collect()
+    blocks0 = sys.getallocatedblocks()
+    tracemalloc.start()
+    out = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sys.getallocatedblocks() - blocks0
+    del out
+    return {
+        "rows_per_sec": round(rows / (best / 1000.0), 1),
+        "row_peak_bytes": round(peak / rows, 1),
+        "row_live_blocks": round(blocks / rows, 2),
+    }
+
+
+def bench_parse(args) -> Dict[str, Any]:
+    """Payload -> parsed rows only (no DB): JSONL body, validated `logs` list, raw bulk body."""
+    import gen_logs
+    from app.models import IngestRequest
+    from app.services import log_parser
+
+    n = min(args.rows, 20_000)
+    raw = list(gen_logs.generate(rows=n, scenario=args.scenario, seed=args.seed))
+    jsonl = "\n".join(json.dumps(r) for r in raw)
+    body = json.dumps({"logs": raw})
+    out = {
+        "rows": n,
+        "jsonl": _parse_run(lambda: log_parser.parse_payload(jsonl), n),
+        "logs_model": _parse_run(
+            lambda: log_parser.parse_payload([l.model_dump() for l in IngestRequest.model_validate_json(body).logs]), n
+        ),
+    }
+    if hasattr(log_parser, "parse_rows"):
+        bulk = jsonl.encode()
+        out["bulk_rows"] = _parse_run(lambda: log_parser.parse_rows(bulk), n)
+    return out
+
+
+def bench_ingest(args) -> Dict[str, Any]:
+    import gen_logs
+    from app.services import log_ingestor
+
+    rows = gen_logs.generate(rows=args.rows, scenario=args.scenario, seed=args.seed)
+    batch: List[str] = []
+    batches_ms: List[float] = []
+    total = 0
+    t0 = time.perf_counter()
+    for r in rows:
+        batch.append(json.dumps(r))
+        if len(batch) >= args.batch:
+            payload = "\n".join(batch)
+            batches_ms.append(_timed(lambda: log_ingestor.ingest(payload)))
+            total += len(batch)
+            batch = []
+    if batch:
+        payload = "\n".join(batch)
+        batches_ms.append(_timed(lambda: log_ingestor.ingest(payload)))
+        total += len(batch)
+    elapsed = time.perf_counter() - t0
+    return {
+        "rows": total,
+        "batch_size": args.batch,
+        "elapsed_s": round(elapsed, 3),
+        "rows_per_sec": round(total / elapsed, 1) if elapsed else None,
+        "batch": _pcts(batches_ms),
+        "db_bytes": os.path.getsize(os.environ["TRIAGE_DB_PATH"]),
+    }
+
+
+def _ensure_data(args) -> None:
+    """Seed the DB (untimed) when ingest is not part of this run."""
+    import gen_logs
+    from app.services import log_ingestor
+
+    lo, _ = _ts_bounds()
+    if lo:
+        return
+    batch: List[str] = []
+    for r in gen_logs.generate(rows=args.rows, scenario=args.scenario, seed=args.seed):
+        batch.append(json.dumps(r))
+        if len(batch) >= args.batch:
+            log_ingestor.ingest("\n".join(batch))
+            batch = []
+    if batch:
+        log_ingestor.ingest("\n".join(batch))
+
+
+def _ts_bounds():
+    from app.store import db
+    return db.log_ts_bounds()
+
+
+def bench_window(args) -> Dict[str, Any]:
+    from datetime import datetime, timedelta
+    from app.routers import logs as logs_router
+
+    lo, hi = _ts_bounds()
+    t_lo, t_hi = datetime.fromisoformat(lo), datetime.fromisoformat(hi)
+    span = max((t_hi - t_lo).total_seconds() - args.window_minutes * 60, 1)
+    rnd = random.Random(args.seed)
+    samples = []
+    for _ in range(args.queries):
+        start = t_lo + timedelta(seconds=rnd.uniform(0, span))
+        end = start + timedelta(minutes=args.window_minutes)
+        samples.append(_timed(lambda: logs_router.get_logs_window(start.isoformat(), end.isoformat(), 200, False)))
+    return {"queries": args.queries, "window_minutes": args.window_minutes, **_pcts(samples)}
+
+
+def bench_labeling(args, model) -> Dict[str, Any]:
+    from app.services import labeler
+
+    labeler._LABEL_CACHE.clear()
+    calls0 = model.stats()["calls"]
+    t0 = time.perf_counter()
+    out = labeler.label_recent_logs(args.label_limit)
+    elapsed = time.perf_counter() - t0
+    return {
+        "rows": len(out),
+        "elapsed_s": round(elapsed, 3),
+        "rows_per_sec": round(len(out) / elapsed, 1) if elapsed else None,
+        "llm_calls": model.stats()["calls"] - calls0,
+    }
+
+
+def bench_triage_turn(args, model) -> Dict[str, Any]:
+    from app.routers import triage_dyn
+
+    tokens_by_turn: Dict[int, List[int]] = {}
+    real_propose = triage_dyn.propose_next_question
+    turn_idx = [0]
+
+    def recording_propose(session_id, answers=None):
+        q = real_propose(session_id, answers=answers)
+        tokens_by_turn.setdefault(turn_idx[0], []).append(q.get("prompt_tokens") or 0)
+        return q
+
+    triage_dyn.propose_next_question = recording_propose
+    try:
+        by_turn: Dict[int, List[float]] = {}
+        for s in range(args.sessions):
+            sid = triage_dyn.start_dyn(triage_dyn.StartBody(initiator="bench"))["session_id"]
+            for t in range(args.turns):
+                turn_idx[0] = t
+                body = triage_dyn.AnswerBody(answer=f"bench answer {s}-{t} with some extra detail")
+                by_turn.setdefault(t, []).append(_timed(lambda: triage_dyn.answer_dyn(sid, body)))
+    finally:
+        triage_dyn.propose_next_question = real_propose
+
+    all_ms = [ms for v in by_turn.values() for ms in v]
+    head = [ms for t in range(min(5, args.turns)) for ms in by_turn[t]]
+    tail = [ms for t in range(max(0, args.turns - 5), args.turns) for ms in by_turn[t]]
+    tok_head = [x for t in range(min(5, args.turns)) for x in tokens_by_turn.get(t, [])]
+    tok_tail = [x for t in range(max(0, args.turns - 5), args.turns) for x in tokens_by_turn.get(t, [])]
+    return {
+        "sessions": args.sessions,
+        "turns": args.turns,
+        "llm_latency_ms": args.llm_latency_ms,
+        **_pcts(all_ms),
+        "first5_mean_ms": round(statistics.fmean(head), 3) if head else None,
+        "last5_mean_ms": round(statistics.fmean(tail), 3) if tail else None,
+        "first5_prompt_tokens": round(statistics.fmean(tok_head), 1) if tok_head else None,
+        "last5_prompt_tokens": round(statistics.fmean(tok_tail), 1) if tok_tail else None,
+    }
+
+
+# ------------------------------ comparison -----------------------------------
+
+def _flatten(d: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for k, v in d.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            out.update(_flatten(v, key + "."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = float(v)
+    return out
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance_pct: float) -> List[Dict[str, Any]]:
+    """Regressions: *_per_sec lower, or *_ms / *_bytes / *_tokens higher, by more than tolerance."""
+    cur, base = _flatten(current["results"]), _flatten(baseline["results"])
+    regressions = []
+    for key, b in base.items():
+        c = cur.get(key)
+        if c is None or b == 0:
+            continue
+        change = (c - b) / b * 100.0
+        leaf = key.rsplit(".", 1)[-1]
+        if leaf.endswith("_per_sec"):
+            worse = -change
+        elif leaf.endswith(("_ms", "_bytes", "_tokens")):
+            worse = change
+        else:
+            continue
+        if worse > tolerance_pct:
+            regressions.append({"metric": key, "baseline": b, "current": c, "worse_pct": round(worse, 1)})
+    return regressions
+
+
+# --------------------------------- main --------------------------------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark ingest, window queries, labeling and triage turns")
+    ap.add_argument("--only", default=",".join(BENCHMARKS), help=f"comma list of {BENCHMARKS}")
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--batch", type=int, default=500)
+    ap.add_argument("--scenario", default="burst")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--window-minutes", type=int, default=10)
+    ap.add_argument("--label-limit", type=int, default=2000)
+    ap.add_argument("--sessions", type=int, default=3)
+    ap.add_argument("--turns", type=int, default=30)
+    ap.add_argument("--llm-latency-ms", type=float, default=5.0)
+    ap.add_argument("--import-runs", type=int, default=3)
+    ap.add_argument("--import-budget-ms", type=float, default=None,
+                    help="fail (exit 1) if cold import of app.main exceeds this")
+    ap.add_argument("--db", default=None, help="SQLite path (default: fresh temp file)")
+    ap.add_argument("--out", default=None, help="write JSON here instead of stdout")
+    ap.add_argument("--compare", default=None, help="baseline JSON from a previous run")
+    ap.add_argument("--tolerance", type=float, default=10.0, help="allowed regression in percent")
+    args = ap.parse_args(argv)
+
+    tmpdir = None
+    if args.db is None:
+        tmpdir = tempfile.TemporaryDirectory(prefix="triage-bench-")
+        args.db = os.path.join(tmpdir.name, "bench.db")
+    os.environ["TRIAGE_DB_PATH"] = args.db
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ["FAKE_LLM_LATENCY_SIGMA"] = "0"  # fixed latency keeps runs comparable
+
+    from app.store import db
+    from app.services import llm_client
+
+    db.DB_PATH = args.db
+    db.init()
+    model = llm_client._init_model()
+
+    selected = [b.strip() for b in args.only.split(",") if b.strip()]
+    if "ingest" not in selected and NEEDS_DATA.intersection(selected):
+        _ensure_data(args)
+    results: Dict[str, Any] = {}
+    for name in BENCHMARKS:
+        if name not in selected:
+            continue
+        if name == "import_time":
+            results[name] = bench_import_time(args)
+        elif name == "parse":
+            results[name] = bench_parse(args)
+        elif name == "ingest":
+            results[name] = bench_ingest(args)
+        elif name == "window":
+            results[name] = bench_window(args)
+        elif name == "labeling":
+            results[name] = bench_labeling(args, model)
+        elif name == "triage_turn":
+            results[name] = bench_triage_turn(args, model)
+        print(f"[bench] {name}: done", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "db")},
+        },
+        "results": results,
+    }
+
+    status = 0
+    if results.get("import_time", {}).get("over_budget"):
+        status = 1
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        report["regressions"] = compare(report, baseline, args.tolerance)
+        status = 1 if report["regressions"] else status
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+    else:
+        print(text)
+    if tmpdir is not None:
+        tmpdir.cleanup()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
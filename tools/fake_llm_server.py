@@ -0,0 +1,89 @@
+"""
+Local HTTP stand-in for the Gemini REST API (generateContent), backed by the
+deterministic FakeBackend from app/services/llm_backends.py.
+
+  FAKE_LLM_LATENCY_MS=120 FAKE_LLM_429_RATE=0.05 python tools/fake_llm_server.py --port 8089
+  GEMINI_API_BASE=http://127.0.0.1:8089 uvicorn app.main:app
+
+Injected 429s and errors come back with the matching HTTP status, so the
+REST path sees them exactly like a real provider failure.
+"""
+import argparse
+import json
+import re
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.llm_backends import FakeBackend, LLMError, RateLimitError  # noqa: E402
+
+ROUTE = re.compile(r"^/v1beta/models/(?P<model>[^/:]+):generateContent")
+
+backend = FakeBackend.from_env()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoint
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def _send(self, status: int, body: dict) -> None:
+        raw = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_POST(self):
+        if not ROUTE.match(self.path):
+            return self._send(404, {"error": {"code": 404, "message": "not found"}})
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            req = json.loads(self.rfile.read(length) or b"{}")
+            prompt = "".join(
+                p.get("text", "") for c in req.get("contents", []) for p in c.get("parts", [])
+            )
+        except Exception:
+            return self._send(400, {"error": {"code": 400, "message": "invalid JSON"}})
+        try:
+            resp = backend.generate_content(prompt)
+        except RateLimitError as e:
+            return self._send(429, {"error": {"code": 429, "message": str(e), "status": "RESOURCE_EXHAUSTED"}})
+        except LLMError as e:
+            return self._send(500, {"error": {"code": 500, "message": str(e), "status": "INTERNAL"}})
+        u = resp.usage_metadata
+        self._send(200, {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": resp.text}]}, "finishReason": "STOP"}],
+            "usageMetadata": {
+                "promptTokenCount": u.prompt_token_count,
+                "candidatesTokenCount": u.candidates_token_count,
+                "totalTokenCount": u.total_token_count,
+            },
+        })
+
+    def do_GET(self):
+        if self.path == "/stats":
+            return self._send(200, backend.stats())
+        self._send(404, {"error": {"code": 404, "message": "not found"}})
+
+    def log_message(self, fmt, *args):  # quiet by default
+        pass
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Fake Gemini REST server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8089)
+    args = ap.parse_args()
+    srv = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"fake LLM listening on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
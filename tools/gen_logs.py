@@ -1,8 +1,23 @@
+"""
+Synthetic log generator.
+
+  python tools/gen_logs.py                                  # 200 rows, like before
+  python tools/gen_logs.py --rows 2000000 --scenario burst --bursts 3 --out big.jsonl
+
+Rows are streamed to disk, so millions of rows need no extra memory.
+Templates, endpoints and correlation ids follow a Zipf-like skew (a few hot
+keys carry most of the traffic), and the `burst`/`outage` scenarios inject
+error spikes focused on one endpoint + label. `generate()` is importable
+(see tools/bench.py).
+"""
+import argparse
 import json
 import random
-from datetime import datetime, timedelta
 import uuid
+from datetime import datetime, timedelta
+from itertools import accumulate
 from pathlib import Path
+from typing import Dict, Iterator, List, Optional
 
 LEVELS = ["INFO", "WARN", "ERROR", "FATAL"]
 LABELS = [
@@ -13,63 +28,161 @@ ENDPOINTS = [
     "/v1/payments", "/v1/transfer", "/v1/login", "/v1/logout", "/v1/report",
     "/v1/cache/refresh", "/v1/db/query", "/v1/settings/update"
 ]
+SOURCES = ["app.log", "gateway.log", "worker.log", "auth.log"]
+
+# {cid}, {endpoint} and {n} are filled per row
+MESSAGE_TEMPLATES = {
+    "auth_failure": [
+        "Auth token expired for session {cid}",
+        "Invalid credentials on endpoint {endpoint}",
+    ],
+    "network_timeout": [
+        "Upstream timeout contacting {endpoint}",
+        "Socket timeout connecting to {endpoint} after {n} ms",
+    ],
+    "database_error": [
+        "DB deadlock detected in transaction for {endpoint}",
+        "SQL error: constraint violation at {endpoint}",
+    ],
+    "cache_error": [
+        "Redis unavailable while accessing cache for {endpoint}",
+        "Cache key missing for {endpoint}",
+    ],
+    "null_pointer": [
+        "NullPointerException in {endpoint}",
+        "TypeError: Cannot read property 'status' of undefined in {endpoint}",
+    ],
+    "api_throttle": [
+        "429 Too Many Requests at {endpoint}",
+        "API rate limit exceeded for {endpoint}",
+    ],
+    "config_error": [
+        "Invalid configuration found in service {endpoint}",
+        "Missing env variable for {endpoint}",
+    ],
+    "other": [
+        "General warning from {endpoint}",
+        "Unexpected error pattern seen in {endpoint}",
+    ],
+}
+# Chatter that dominates real traffic (label "other", low severity)
+INFO_TEMPLATES = [
+    "Request completed in {n} ms for {endpoint}",
+    "Health check ok for {endpoint}",
+    "Cache hit for {endpoint} key user:{n}",
+    "User session refreshed for {cid}",
+]
+
+SCENARIOS = ["steady", "burst", "outage"]
+
+
+def _zipf_cum(n: int, s: float) -> List[float]:
+    return list(accumulate(1.0 / (i + 1) ** s for i in range(n)))
+
+
+def generate(
+    rows: int = 200,
+    scenario: str = "steady",
+    seed: Optional[int] = None,
+    start: Optional[datetime] = None,
+    span_minutes: int = 1440,
+    error_rate: float = 0.1,
+    bursts: int = 2,
+    burst_minutes: int = 10,
+    burst_error_rate: float = 0.7,
+    skew: float = 1.1,
+    corr_pool: int = 5000,
+) -> Iterator[Dict[str, object]]:
+    """Yield `rows` log dicts in timestamp order."""
+    rnd = random.Random(seed)
+    start = start or (datetime.utcnow() - timedelta(minutes=span_minutes))
+    step = span_minutes * 60.0 / max(rows, 1)
+
+    endpoint_cum = _zipf_cum(len(ENDPOINTS), skew)
+    label_cum = _zipf_cum(len(LABELS), skew)
+    info_cum = _zipf_cum(len(INFO_TEMPLATES), skew)
+    cids = [str(uuid.UUID(int=rnd.getrandbits(128), version=4)) for _ in range(corr_pool)]
+    cid_cum = _zipf_cum(corr_pool, skew)
+
+    # error bursts: (start_offset_sec, end_offset_sec, endpoint, label)
+    windows = []
+    if scenario in ("burst", "outage"):
+        count = 1 if scenario == "outage" else bursts
+        length = burst_minutes * (6 if scenario == "outage" else 1) * 60
+        for _ in range(count):
+            off = rnd.uniform(0, max(span_minutes * 60 - length, 0))
+            windows.append((off, off + length, rnd.choice(ENDPOINTS), rnd.choice(LABELS[:-1])))
+    rate_in_burst = 0.95 if scenario == "outage" else burst_error_rate
+
+    for i in range(rows):
+        offset = i * step + rnd.uniform(0, step)
+        ts = start + timedelta(seconds=offset)
+        burst = next((w for w in windows if w[0] <= offset < w[1]), None)
+        cid = rnd.choices(cids, cum_weights=cid_cum)[0]
+        n = rnd.randint(1, 30000)
+
+        if burst and rnd.random() < rate_in_burst:
+            endpoint, label = burst[2], burst[3]
+            level = "FATAL" if rnd.random() < 0.1 else "ERROR"
+            template = rnd.choice(MESSAGE_TEMPLATES[label])
+        elif rnd.random() < error_rate:
+            endpoint = rnd.choices(ENDPOINTS, cum_weights=endpoint_cum)[0]
+            label = rnd.choices(LABELS, cum_weights=label_cum)[0]
+            level = rnd.choices(LEVELS[1:], weights=[2, 8, 1])[0]
+            template = rnd.choice(MESSAGE_TEMPLATES[label])
+        else:
+            endpoint = rnd.choices(ENDPOINTS, cum_weights=endpoint_cum)[0]
+            label = "other"
+            level = "DEBUG" if rnd.random() < 0.3 else "INFO"
+            template = rnd.choices(INFO_TEMPLATES, cum_weights=info_cum)[0]
+
+        yield {
+            "source": rnd.choice(SOURCES),
+            "ts": ts.isoformat(),
+            "level": level,
+            "message": template.format(cid=cid, endpoint=endpoint, n=n),
+            "correlation_id": cid,
+            "endpoint": endpoint,
+            "account": rnd.choice(["personal", "corporate"]),
+            "label": label,
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Generate synthetic JSONL logs")
+    ap.add_argument("--rows", type=int, default=200)
+    ap.add_argument("--out", default="synthetic_bulk_extended.jsonl")
+    ap.add_argument("--scenario", choices=SCENARIOS, default="steady")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--span-minutes", type=int, default=1440, help="time range covered (default: last 24h)")
+    ap.add_argument("--error-rate", type=float, default=0.1)
+    ap.add_argument("--bursts", type=int, default=2)
+    ap.add_argument("--burst-minutes", type=int, default=10)
+    ap.add_argument("--burst-error-rate", type=float, default=0.7)
+    ap.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for endpoints/labels/correlation ids")
+    ap.add_argument("--corr-pool", type=int, default=5000, help="distinct correlation ids")
+    args = ap.parse_args(argv)
+
+    out = Path(args.out)
+    written = 0
+    with out.open("w", encoding="utf-8") as f:
+        for row in generate(
+            rows=args.rows,
+            scenario=args.scenario,
+            seed=args.seed,
+            span_minutes=args.span_minutes,
+            error_rate=args.error_rate,
+            bursts=args.bursts,
+            burst_minutes=args.burst_minutes,
+            burst_error_rate=args.burst_error_rate,
+            skew=args.skew,
+            corr_pool=args.corr_pool,
+        ):
+            f.write(json.dumps(row))
+            f.write("\n")
+            written += 1
+    print(f"✅ Generated {written} {args.scenario} dummy logs -> {out.resolve()}")
+
 
-# 🔢 Generate dummy logs
-logs = []
-now = datetime.utcnow()
-for i in range(200):
-    ts = now - timedelta(minutes=random.randint(1, 1440))  # last 24 hours
-    label = random.choice(LABELS)
-    endpoint = random.choice(ENDPOINTS)
-    level = random.choices(LEVELS, weights=[3, 2, 8, 1])[0]
-    cid = str(uuid.uuid4())
-
-    message_templates = {
-        "auth_failure": [
-            f"Auth token expired for session {cid}",
-            f"Invalid credentials on endpoint {endpoint}",
-        ],
-        "network_timeout": [
-            f"Upstream timeout contacting {endpoint}",
-            f"Socket timeout connecting to {endpoint}",
-        ],
-        "database_error": [
-            f"DB deadlock detected in transaction for {endpoint}",
-            f"SQL error: constraint violation at {endpoint}",
-        ],
-        "cache_error": [
-            f"Redis unavailable while accessing cache for {endpoint}",
-            f"Cache key missing for {endpoint}",
-        ],
-        "null_pointer": [
-            f"NullPointerException in {endpoint}",
-            f"TypeError: Cannot read property 'status' of undefined in {endpoint}",
-        ],
-        "api_throttle": [
-            f"429 Too Many Requests at {endpoint}",
-            f"API rate limit exceeded for {endpoint}",
-        ],
-        "config_error": [
-            f"Invalid configuration found in service {endpoint}",
-            f"Missing env variable for {endpoint}",
-        ],
-        "other": [
-            f"General warning from {endpoint}",
-            f"Unexpected error pattern seen in {endpoint}",
-        ],
-    }
-
-    logs.append({
-        "source": "app.log",
-        "ts": ts.isoformat(),
-        "level": level,
-        "message": random.choice(message_templates[label]),
-        "correlation_id": cid,
-        "endpoint": endpoint,
-        "account": random.choice(["personal", "corporate"]),
-        "label": label,
-    })
-
-out = Path("synthetic_bulk_extended.jsonl")
-out.write_text("\n".join(json.dumps(l) for l in logs))
-print(f"✅ Generated {len(logs)} extended dummy logs -> {out.resolve()}")
+if __name__ == "__main__":
+    main()